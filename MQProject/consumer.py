@@ -1,9 +1,23 @@
 # coding=utf-8
 ### 消费者
 
+import os
+import sys
+import time
+
 import pika
 import threading
 
+# 获取项目根目录并加入Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MQProject.latency import LatencyTracker
+from MQProject.mq import subscribe
+
+# 按摄像头统计端到端延迟，每隔一段时间输出一次；安全事件通道单独统计
+latency_tracker = LatencyTracker()
+critical_latency_tracker = LatencyTracker()
+LATENCY_REPORT_INTERVAL = 60
+last_report_time = time.time()
 
 user_info = pika.PlainCredentials('guest', 'guest')
 connection = pika.BlockingConnection(pika.ConnectionParameters('localhost', 5672, '/', user_info))
@@ -17,6 +31,20 @@ channel.queue_declare(queue='predicate')
 def callback(ch, method, properties, body):
     print('消费者收到:{}'.format(body))
 
+
+def predicate_callback(ch, method, properties, body):
+    global last_report_time
+    callback(ch, method, properties, body)
+    try:
+        latency_ms = latency_tracker.record(body)
+        if latency_ms is not None:
+            print('端到端延迟: {:.1f} ms'.format(latency_ms))
+    except ValueError:
+        pass  # 非JSON消息不统计
+    if time.time() - last_report_time >= LATENCY_REPORT_INTERVAL:
+        latency_tracker.log_summary()
+        last_report_time = time.time()
+
 # channel: 包含channel的一切属性和方法
 # method: 包含 consumer_tag, delivery_tag, exchange, redelivered, routing_key
 # properties: basic_publish 通过 properties 传入的参数
@@ -25,11 +53,45 @@ def callback(ch, method, properties, body):
 def consume_predicate():
     channel.basic_consume(queue='predicate',  # 接收指定queue的消息
                           auto_ack=True,  # 指定为True，表示消息接收到后自动给消息发送方回复确认，已收到消息
-                          on_message_callback=callback  # 设置收到消息的回调函数
+                          on_message_callback=predicate_callback  # 设置收到消息的回调函数
                           )
     print('Waiting for messages. To exit press CTRL+C')
     channel.start_consuming()
 
+def critical_callback(ch, method, properties, body):
+    callback(ch, method, properties, body)
+    try:
+        latency_ms = critical_latency_tracker.record(body)
+        if latency_ms is not None:
+            print('安全事件端到端延迟: {:.1f} ms'.format(latency_ms))
+    except ValueError:
+        pass
+
+
+def consume_critical():
+    # 安全事件使用独立连接和队列，不受 predicate 队列积压和回调耗时影响
+    connection_critical = pika.BlockingConnection(pika.ConnectionParameters('localhost', 5672, '/', user_info))
+    channel_critical = connection_critical.channel()
+    channel_critical.queue_declare(queue='predicate_critical')
+    channel_critical.basic_consume(queue='predicate_critical', on_message_callback=critical_callback, auto_ack=True)
+    print('Waiting for critical messages. To exit press CTRL+C')
+    channel_critical.start_consuming()
+
+def topic_callback(ch, method, properties, body):
+    # 路由键和消息头已包含摄像头和事件类型，不需要解析消息体即可分发
+    headers = properties.headers or {}
+    print('消费者收到 {} (camera={}, event={}): {}'.format(method.routing_key, headers.get('camera_id'),
+                                                       headers.get('event_name'), body))
+
+
+def consume_topic(patterns):
+    # 按模式订阅事件主题交换机，只接收需要的摄像头/事件类型
+    connection_topic = pika.BlockingConnection(pika.ConnectionParameters('localhost', 5672, '/', user_info))
+    channel_topic = connection_topic.channel()
+    queue_name = subscribe(channel_topic, patterns, topic_callback)
+    print('Waiting for {} on {}. To exit press CTRL+C'.format(patterns, queue_name))
+    channel_topic.start_consuming()
+
 def consume_heartbeat():
     connection_heartbeat = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
     channel_heartbeat = connection_heartbeat.channel()
@@ -38,6 +100,12 @@ def consume_heartbeat():
     print('Waiting for heartbeats. To exit press CTRL+C')
     channel_heartbeat.start_consuming()
 
-# 创建并启动两个线程
-threading.Thread(target=consume_predicate).start()
+# 创建并启动消费线程
+# 指定订阅模式时只接收匹配的事件，例如: python consumer.py 'hangar.*.safety' 'hangar.1.#'
+topic_patterns = sys.argv[1:]
+if topic_patterns:
+    threading.Thread(target=consume_topic, args=(topic_patterns,)).start()
+else:
+    threading.Thread(target=consume_predicate).start()
+    threading.Thread(target=consume_critical).start()
 threading.Thread(target=consume_heartbeat).start()
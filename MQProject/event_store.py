@@ -0,0 +1,273 @@
+# coding=utf-8
+### 本地事件存储：SQLite(WAL) + 批量事务写入，支持按摄像头/事件类型/时间查询
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from log.unified_log import get_mq_logger
+
+_logger = get_mq_logger()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera_id TEXT NOT NULL,
+    event_type INTEGER NOT NULL,
+    message_time TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events (camera_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events (event_type, ts);
+CREATE INDEX IF NOT EXISTS idx_events_camera_type_ts ON events (camera_id, event_type, ts);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE TABLE IF NOT EXISTS camera_state (
+    camera_id TEXT NOT NULL,
+    event_type INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (camera_id, event_type)
+);
+"""
+
+_INSERT_EVENT = "INSERT INTO events (ts, camera_id, event_type, message_time, payload) VALUES (?, ?, ?, ?, ?)"
+# 只有时间更新的记录才覆盖当前状态，保证乱序写入时状态正确
+_UPSERT_STATE = """
+INSERT INTO camera_state (camera_id, event_type, ts, payload) VALUES (?, ?, ?, ?)
+ON CONFLICT (camera_id, event_type) DO UPDATE SET ts = excluded.ts, payload = excluded.payload
+WHERE excluded.ts >= camera_state.ts
+"""
+
+
+class EventStore:
+    """事件存储，写入由后台线程批量提交，查询可在任意线程并发执行"""
+
+    def __init__(self, db_path='events.db', batch_size=1000, flush_interval=0.5, max_pending=100000):
+        self.db_path = db_path
+        self.batch_size = batch_size  # 单个事务最多写入的事件数
+        self.flush_interval = flush_interval  # 未攒满一批时最长等待时间（秒）
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread_local = threading.local()  # 每个查询线程独立的只读连接
+        self._readers = []  # 所有查询连接，close() 时统一关闭
+        self._lock = threading.Lock()
+        self._closed = False
+        self.dropped_count = 0  # 队列满时丢弃的事件数
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name='event-store-writer')
+        self._writer.daemon = True
+        self._writer.start()
+        _logger.info(f"EventStore opened: {db_path}")
+
+    def _connect(self):
+        """创建WAL模式的SQLite连接"""
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # WAL下NORMAL即可保证一致性，写入快很多
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def _reader(self):
+        """获取当前线程的查询连接；关闭后不再创建新连接"""
+        if self._closed:
+            raise sqlite3.ProgrammingError(f"EventStore is closed: {self.db_path}")
+        conn = getattr(self._thread_local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            with self._lock:
+                if self._closed:
+                    conn.close()
+                    raise sqlite3.ProgrammingError(f"EventStore is closed: {self.db_path}")
+                self._readers.append(conn)
+            self._thread_local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------ 写入
+
+    def add(self, message, ts=None):
+        """添加一条事件，message可以是Message对象、字典或JSON字符串；非阻塞，已关闭或队列满时返回False"""
+        if isinstance(message, str):
+            data = json.loads(message)
+        elif isinstance(message, dict):
+            data = message
+        else:
+            data = json.loads(message.to_json())
+        if ts is None:
+            ts = data.get('capture_time') or time.time()
+        row = (float(ts), str(data.get('camera_id', '')), int(data.get('event_type', 0) or 0),
+               data.get('message_time'), json.dumps(data, ensure_ascii=False))
+        with self._lock:
+            if self._closed:
+                _logger.warning(f"EventStore closed, event dropped: {row[1]}/{row[2]}")
+                return False
+            try:
+                self._queue.put_nowait(row)
+                return True
+            except queue.Full:
+                self.dropped_count += 1
+                _logger.warning(f"EventStore queue full, event dropped: {row[1]}/{row[2]}")
+                return False
+
+    def add_many(self, messages):
+        """批量添加事件"""
+        for message in messages:
+            self.add(message)
+
+    def flush(self, timeout=None):
+        """等待队列中已提交的事件全部写入数据库；已关闭时剩余事件已在 close() 中写入"""
+        done = threading.Event()
+        with self._lock:
+            if self._closed:
+                return True
+            self._queue.put(done)
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        """后台写线程：攒批后在一个事务中写入"""
+        conn = self._connect()
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    self._write_batch(conn, batch)
+                    for waiter in waiters:
+                        waiter.set()
+                    conn.close()
+                    return
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write_batch(conn, batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_batch(self, conn, batch):
+        """在单个事务中写入一批事件并更新每个摄像头的当前状态"""
+        if not batch:
+            return
+        try:
+            with conn:
+                conn.executemany(_INSERT_EVENT, batch)
+                conn.executemany(_UPSERT_STATE, [(row[1], row[2], row[0], row[4]) for row in batch])
+        except sqlite3.Error as e:
+            _logger.error(f"EventStore failed to write {len(batch)} events: {e}")
+
+    # ------------------------------------------------------------------ 查询
+
+    def query(self, camera_id=None, event_type=None, start=None, end=None, limit=1000, order='asc', **fields):
+        """按时间范围查询事件
+
+        Args:
+            camera_id: 摄像头编号
+            event_type: 事件类型：1飞机，2人员，3车辆，4安全事件
+            start, end: 时间范围（epoch秒），左闭右开
+            limit: 最多返回条数
+            order: 'asc' 或 'desc'，按时间排序
+            fields: 消息字段过滤，例如 plane_sliding_status=1
+
+        Returns:
+            list: (ts, 消息字典) 列表
+        """
+        clauses, params = [], []
+        if camera_id is not None:
+            clauses.append('camera_id = ?')
+            params.append(str(camera_id))
+        if event_type is not None:
+            clauses.append('event_type = ?')
+            params.append(int(event_type))
+        if start is not None:
+            clauses.append('ts >= ?')
+            params.append(float(start))
+        if end is not None:
+            clauses.append('ts < ?')
+            params.append(float(end))
+        for name, value in fields.items():
+            # 字段名拼接进JSON路径，只允许（点分隔的）标识符
+            if not all(part.isidentifier() for part in name.split('.')):
+                raise ValueError(f"Invalid field name: {name!r}")
+            clauses.append(f"json_extract(payload, '$.{name}') = ?")
+            params.append(value)
+        sql = 'SELECT ts, payload FROM events'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += f" ORDER BY ts {'DESC' if order == 'desc' else 'ASC'} LIMIT ?"
+        params.append(int(limit))
+        rows = self._reader().execute(sql, params).fetchall()
+        return [(row['ts'], json.loads(row['payload'])) for row in rows]
+
+    def last_event(self, camera_id=None, event_type=None, before=None, **fields):
+        """查询最近一次满足条件的事件，没有则返回None"""
+        rows = self.query(camera_id, event_type, end=before, limit=1, order='desc', **fields)
+        return rows[0] if rows else None
+
+    def count(self, camera_id=None, event_type=None, start=None, end=None):
+        """统计时间范围内的事件数量"""
+        clauses, params = [], []
+        for clause, value in (('camera_id = ?', None if camera_id is None else str(camera_id)),
+                              ('event_type = ?', event_type),
+                              ('ts >= ?', start),
+                              ('ts < ?', end)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        sql = 'SELECT COUNT(*) FROM events'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return self._reader().execute(sql, params).fetchone()[0]
+
+    def latest_state(self, camera_id=None):
+        """查询摄像头当前状态
+
+        Returns:
+            dict: {camera_id: {event_type: (ts, 消息字典)}}
+        """
+        sql = 'SELECT camera_id, event_type, ts, payload FROM camera_state'
+        params = []
+        if camera_id is not None:
+            sql += ' WHERE camera_id = ?'
+            params.append(str(camera_id))
+        state = {}
+        for row in self._reader().execute(sql, params):
+            state.setdefault(row['camera_id'], {})[row['event_type']] = (row['ts'], json.loads(row['payload']))
+        return state
+
+    def close(self):
+        """写入剩余事件并关闭，包括各查询线程的连接"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._writer.join()
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._thread_local.conn = None
+        _logger.info(f"EventStore closed: {self.db_path}")
+
+
+# 使用示例：上周2号机库飞机入库的时间
+# if __name__ == "__main__":
+#     store = EventStore('events.db')
+#     week_ago = time.time() - 7 * 24 * 3600
+#     for ts, event in store.query(camera_id='2', event_type=1, start=week_ago, plane_sliding_status=1):
+#         print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)), event)
@@ -0,0 +1,105 @@
+# coding=utf-8
+### 端到端延迟统计：按摄像头聚合 采集 -> 消费 的延迟直方图及各阶段耗时
+
+import bisect
+import json
+import threading
+import time
+
+from log.unified_log import get_mq_logger
+
+_logger = get_mq_logger()
+
+# 对数分桶上界（毫秒）：0.1ms ~ 约100s，每个数量级10个桶
+BUCKET_BOUNDS = [round(0.1 * 10 ** (i / 10), 4) for i in range(61)]
+
+
+class LatencyHistogram:
+    """固定分桶直方图，记录O(log n)、内存恒定"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value_ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, p):
+        """返回第p百分位所在桶的上界（毫秒）"""
+        if self.count == 0:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(BUCKET_BOUNDS[index], round(self.max, 3)) if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': round(self.max, 3),
+        }
+
+
+class LatencyTracker:
+    """消费端延迟统计，按摄像头分别记录端到端延迟和每个处理阶段的耗时"""
+
+    def __init__(self, same_host=False):
+        # 同机部署时用单调时钟计算，不受系统时间调整影响；跨机器只能用墙上时钟（需NTP同步）
+        self.same_host = same_host
+        self.cameras = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, camera_id, name):
+        camera = self.cameras.setdefault(camera_id, {})
+        histogram = camera.get(name)
+        if histogram is None:
+            histogram = camera[name] = LatencyHistogram()
+        return histogram
+
+    def record(self, message, receive_time=None, receive_monotonic=None):
+        """记录一条消息，message为JSON字符串/bytes或字典；返回端到端延迟（毫秒），消息没有采集时间时返回None"""
+        if isinstance(message, (str, bytes, bytearray, memoryview)):
+            message = json.loads(bytes(message) if isinstance(message, memoryview) else message)
+        if message.get('capture_time') is None:
+            return None
+        if receive_time is None:
+            receive_time = time.time()
+        if self.same_host and message.get('capture_monotonic') is not None:
+            now = receive_monotonic if receive_monotonic is not None else time.monotonic()
+            latency_ms = (now - message['capture_monotonic']) * 1000
+        else:
+            latency_ms = (receive_time - message['capture_time']) * 1000
+        camera_id = str(message.get('camera_id'))
+        trace = message.get('trace') or {}
+        with self._lock:
+            self._histogram(camera_id, 'end_to_end').record(latency_ms)
+            for stage, elapsed_ms in trace.get('stages', {}).items():
+                self._histogram(camera_id, stage).record(elapsed_ms)
+            if trace.get('sent_time') is not None:
+                # 发送到接收的传输耗时
+                self._histogram(camera_id, 'transport').record((receive_time - trace['sent_time']) * 1000)
+        return latency_ms
+
+    def summary(self):
+        """返回 {camera_id: {阶段: 统计}}"""
+        with self._lock:
+            return {camera_id: {name: histogram.summary() for name, histogram in stages.items()}
+                    for camera_id, stages in self.cameras.items()}
+
+    def log_summary(self):
+        for camera_id, stages in self.summary().items():
+            for name, stats in stages.items():
+                _logger.info(f"camera {camera_id} {name}: {stats}")
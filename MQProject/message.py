@@ -10,6 +10,24 @@ class Message:
         self.message_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
         self.camera_id = camera_id  # 摄像头编号
         self.event_type = event_type  # 事件类型：0 无效 ，1飞机，2人员，3车辆，4安全事件
+        self.capture_time = None  # 帧采集时刻（墙上时钟，秒，高精度）
+        self.capture_monotonic = None  # 帧采集时刻（单调时钟，同机跨进程可比）
+        self.frame_seq = None  # 帧序号
+        self.trace = None  # 可选的链路追踪：{'stages': {阶段: 毫秒}, 'sent_time': 发送时刻}
+        self.zones = None  # 可选的固定区域占用：{区域名: 是否有目标}
+
+    def stamp_capture(self, capture_time, capture_monotonic, frame_seq):
+        """记录帧的采集时间和序号，并清空上一帧的追踪信息"""
+        self.capture_time = capture_time
+        self.capture_monotonic = capture_monotonic
+        self.frame_seq = frame_seq
+        self.trace = None
+
+    def add_trace(self, stage, elapsed_ms):
+        """记录某个处理阶段的耗时（毫秒）"""
+        if self.trace is None:
+            self.trace = {'stages': {}}
+        self.trace['stages'][stage] = round(elapsed_ms, 3)
 
     def to_json(self):
         message_dict = {
@@ -18,6 +36,14 @@ class Message:
             'camera_id': self.camera_id,
             'event_type': self.event_type
         }
+        if self.capture_time is not None:
+            message_dict['capture_time'] = self.capture_time
+            message_dict['capture_monotonic'] = self.capture_monotonic
+            message_dict['frame_seq'] = self.frame_seq
+        if self.trace is not None:
+            message_dict['trace'] = self.trace
+        if self.zones is not None:
+            message_dict['zones'] = self.zones
         return json.dumps(message_dict, ensure_ascii=False)
 
 
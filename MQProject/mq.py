@@ -8,26 +8,72 @@ import time
 from message import Message
 from log.unified_log import get_mq_logger  # 导入统一日志模块
 
-from ultralytics import YOLO
-
 # 获取MQ模块的日志记录器
 _logger = get_mq_logger()
 
+# 事件主题交换机，路由键为 hangar.<camera_id>.<事件名>，消费者可按模式订阅：
+#   hangar.*.safety  所有摄像头的安全事件     hangar.3.#  3号摄像头的全部事件
+EVENT_EXCHANGE = 'hangar.events'
+EVENT_TYPE_NAMES = {0: 'invalid', 1: 'aircraft', 2: 'personnel', 3: 'vehicle', 4: 'safety'}
+# 兼容原有消费者：predicate 队列接收非安全事件，predicate_critical 队列接收安全事件
+LEGACY_BINDINGS = {
+    'predicate': ['hangar.*.invalid', 'hangar.*.aircraft', 'hangar.*.personnel', 'hangar.*.vehicle'],
+    'predicate_critical': ['hangar.*.safety'],
+}
+
+
+def event_route(message):
+    """返回消息的 (路由键, 消息头)"""
+    camera_id = str(message.camera_id).replace('.', '_')  # "." 是路由键分隔符
+    event_name = EVENT_TYPE_NAMES.get(message.event_type, str(message.event_type))
+    headers = {'camera_id': str(message.camera_id), 'event_type': message.event_type, 'event_name': event_name}
+    if getattr(message, 'capture_time', None) is not None:
+        # AMQP 头不支持浮点数（pika 编码时报 UnsupportedAMQPFieldException），用整数毫秒；精确值在消息体 capture_time 中
+        headers['capture_time_ms'] = int(message.capture_time * 1000)
+    return f"hangar.{camera_id}.{event_name}", headers
+
+
+def bind_event_queues(channel, exchange=EVENT_EXCHANGE, bindings=None):
+    """声明主题交换机，并把队列按模式绑定上去（默认为兼容原有消费者的绑定）"""
+    channel.exchange_declare(exchange=exchange, exchange_type='topic', durable=True)
+    for queue_name, patterns in (bindings or LEGACY_BINDINGS).items():
+        channel.queue_declare(queue=queue_name)
+        for pattern in patterns:
+            channel.queue_bind(queue=queue_name, exchange=exchange, routing_key=pattern)
+
+
+def subscribe(channel, patterns, callback, queue_name='', exchange=EVENT_EXCHANGE, auto_ack=True):
+    """消费端按模式订阅事件，例如 subscribe(channel, ['hangar.*.safety'], callback)
+    queue_name为空时使用broker生成的独占队列（断开即删除），返回实际队列名"""
+    channel.exchange_declare(exchange=exchange, exchange_type='topic', durable=True)
+    queue_name = channel.queue_declare(queue=queue_name, exclusive=not queue_name).method.queue
+    for pattern in patterns:
+        channel.queue_bind(queue=queue_name, exchange=exchange, routing_key=pattern)
+    channel.basic_consume(queue=queue_name, on_message_callback=callback, auto_ack=auto_ack)
+    return queue_name
+
 
 class RabbitMQ:
     _instance = None
     _lock = threading.Lock()
-    _channel_lock = threading.Lock()  # 添加通道操作的锁
 
-    def __new__(cls, *args, **kwargs):
+    def __new__(cls, *args, shared=True, **kwargs):
+        # shared=False 时创建独立实例（独立连接和锁），用于不能被其他发送阻塞的通道（如安全事件）
+        if not shared:
+            return super(RabbitMQ, cls).__new__(cls)
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(RabbitMQ, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, host='localhost', port=5672, username='guest', password='guest', hear_time=500):
+    def __init__(self, host='localhost', port=5672, username='guest', password='guest', hear_time=500,
+                 event_exchange=EVENT_EXCHANGE, shared=True):
         if hasattr(self, 'initialized'):
             return
+        # 连接和通道锁按实例持有：独立实例重连、重试时不会阻塞共享实例，反之亦然
+        self._lock = threading.RLock()
+        self._channel_lock = threading.Lock()  # 添加通道操作的锁
+        self.event_exchange = event_exchange  # 主题交换机名称，None表示只使用默认交换机直接发到队列
         self.host = host
         self.port = port
         self.username = username
@@ -55,6 +101,9 @@ class RabbitMQ:
                     _logger.info("Successfully connected to RabbitMQ")
                     # 声明常用队列
                     self.channel.queue_declare(queue='predicate')
+                    self.channel.queue_declare(queue='predicate_critical')  # 安全事件的独立队列（PriorityPublisher）
+                    if self.event_exchange:
+                        bind_event_queues(self.channel, self.event_exchange)
                     self.channel.queue_declare(queue='heartbeat')
         except Exception as e:
             self.is_connected = False
@@ -102,8 +151,22 @@ class RabbitMQ:
 
     def send_message(self, queue_name, message):
         """发送消息到指定队列"""
+        return self.publish('', queue_name, message, declare_queue=True)
+
+    def send_event(self, message, body=None, queue_name='predicate'):
+        """按摄像头和事件类型发布到主题交换机；未启用交换机时按原方式发送到队列"""
+        if body is None:
+            body = message.to_json()
+        if not self.event_exchange:
+            return self.send_message(queue_name, body)
+        routing_key, headers = event_route(message)
+        return self.publish(self.event_exchange, routing_key, body, headers)
+
+    def publish(self, exchange, routing_key, message, headers=None, declare_queue=False):
+        """发布消息，exchange为空字符串时routing_key即队列名；headers供消费者不解析消息体即可过滤"""
         retry_count = 0
         max_retries = 3
+        properties = pika.BasicProperties(content_type='application/json', headers=headers) if headers else None
         
         while retry_count < max_retries:
             try:
@@ -113,11 +176,12 @@ class RabbitMQ:
                         raise Exception("No channel available")
                     
                     # 确保队列存在
-                    channel.queue_declare(queue=queue_name, passive=True)
+                    if declare_queue:
+                        channel.queue_declare(queue=routing_key, passive=True)
                     
                     # 发送消息
-                    channel.basic_publish(exchange='', routing_key=queue_name, body=message)
-                    _logger.info(f"Message sent to {queue_name}: {message}")
+                    channel.basic_publish(exchange=exchange, routing_key=routing_key, body=message, properties=properties)
+                    _logger.info(f"Message sent to {exchange or 'default'}/{routing_key}: {message}")
                     return True
             except pika.exceptions.ChannelClosedByBroker:
                 # 通道被代理关闭，重新创建
@@ -200,6 +264,9 @@ def send_message():
 # 处理YOLO结果生成消息并发送到RabbitMQ
 
 def parse_yolo_reslut():
+    # 只有示例用到模型，延迟导入，发布端不依赖ultralytics
+    from ultralytics import YOLO
+
     # Load a model
     model = YOLO("yolo11n.pt")
     results = model("https://ultralytics.com/images/bus.jpg")
@@ -0,0 +1,156 @@
+# coding=utf-8
+### 分级发布：安全类消息（着火等）走独立的高优先级通道，不会排在例行状态消息的积压后面
+
+import copy
+import threading
+import time
+from collections import deque
+
+from MQProject.latency import LatencyHistogram
+from MQProject.transport import Transport
+from log.unified_log import get_mq_logger
+
+_logger = get_mq_logger()
+
+CRITICAL = 'critical'
+ROUTINE = 'routine'
+LANES = (CRITICAL, ROUTINE)
+
+# 事件类型 4 为安全事件（SafetyMessage）
+CRITICAL_EVENT_TYPES = {4}
+
+
+def lane_for(message):
+    """按消息类型选择通道：安全事件走critical，其余走routine"""
+    return CRITICAL if getattr(message, 'event_type', None) in CRITICAL_EVENT_TYPES else ROUTINE
+
+
+class PriorityPublisher(Transport):
+    """包装任意传输层，按通道排队后由各通道自己的发布线程发送
+
+    - 每个通道一个进程内队列和一个发布线程，routine 发送重试、重连时 critical 线程照常发送
+    - critical_transport 为 critical 通道的独立传输层（如 RabbitMQ(shared=False) 的独立连接）；
+      不传时两个线程共用同一传输层，底层连接的锁和重试仍可能让 critical 等待
+    - critical消息发往独立的队列（queue_name + critical_suffix），broker端的routine积压也不会挡住它；
+      critical_suffix=None 时与routine共用队列
+    - routine队列有界，满时丢弃最旧的状态消息（每秒都会有新的状态覆盖）；critical队列不丢弃
+    - 每个通道记录 入队 -> 发送完成 的延迟直方图
+    """
+
+    _publishers = {}
+    _publishers_lock = threading.Lock()
+
+    def __init__(self, transport, critical_suffix='_critical', max_routine=1000, critical_transport=None):
+        self.transport = transport
+        self.critical_transport = critical_transport
+        self.transports = {CRITICAL: critical_transport or transport, ROUTINE: transport}
+        self.critical_suffix = critical_suffix
+        self.max_routine = max_routine
+        self.queues = {CRITICAL: deque(), ROUTINE: deque()}
+        self.latency = {lane: LatencyHistogram() for lane in LANES}
+        self.stats = {lane: {'sent': 0, 'failed': 0, 'dropped': 0} for lane in LANES}
+        self._condition = threading.Condition()
+        self._running = True
+        self._sending = {lane: False for lane in LANES}
+        self._threads = [threading.Thread(target=self._dispatch, args=(lane,), name=f'priority-publisher-{lane}',
+                                          daemon=True) for lane in LANES]
+        for thread in self._threads:
+            thread.start()
+
+    @classmethod
+    def for_transport(cls, transport, critical_factory=None, **kwargs):
+        """同一个底层传输层只创建一组发布线程，多个摄像头共享
+        critical_factory() 创建 critical 通道的独立传输层，只在新建发布器时调用，已有发布器时不会多开连接"""
+        with cls._publishers_lock:
+            publisher = cls._publishers.get(id(transport))
+            if publisher is None:
+                critical_transport = critical_factory() if critical_factory is not None else None
+                publisher = cls._publishers[id(transport)] = cls(transport, critical_transport=critical_transport,
+                                                                 **kwargs)
+            return publisher
+
+    def target_queue(self, queue_name, lane):
+        if lane == CRITICAL and self.critical_suffix:
+            return queue_name + self.critical_suffix
+        return queue_name
+
+    def create_queue(self, queue_name):
+        self.transport.create_queue(queue_name)
+        if self.critical_suffix:
+            self.transports[CRITICAL].create_queue(queue_name + self.critical_suffix)
+
+    def send_message(self, queue_name, message, lane=ROUTINE):
+        """入队后立即返回；发送结果体现在 stats 中"""
+        return self._enqueue(lane, queue_name, message, None)
+
+    def send_event(self, message, body=None, queue_name='predicate'):
+        """按消息类型选择通道，发送时交给底层传输层的 send_event（RabbitMQ按摄像头/事件类型路由）"""
+        if body is None:
+            body = message.to_json()
+        # 摄像头线程会复用并修改同一个消息对象，路由信息按入队时的快照计算
+        return self._enqueue(lane_for(message), queue_name, body, copy.copy(message))
+
+    def _enqueue(self, lane, queue_name, body, event):
+        with self._condition:
+            queue = self.queues[lane]
+            if lane == ROUTINE and len(queue) >= self.max_routine:
+                queue.popleft()
+                self.stats[ROUTINE]['dropped'] += 1
+            queue.append((time.perf_counter(), queue_name, body, event))
+            self._condition.notify_all()
+        return True
+
+    def _dispatch(self, lane):
+        queue = self.queues[lane]
+        transport = self.transports[lane]
+        while True:
+            with self._condition:
+                while self._running and not queue:
+                    self._condition.wait()
+                if not self._running and not queue:
+                    return
+                enqueued, queue_name, body, event = queue.popleft()
+                self._sending[lane] = True
+            try:
+                if event is not None:
+                    ok = transport.send_event(event, body, self.target_queue(queue_name, lane))
+                else:
+                    ok = transport.send_message(self.target_queue(queue_name, lane), body)
+            except Exception as e:
+                _logger.error(f"Priority publisher {lane} send failed: {e}")
+                ok = False
+            self.latency[lane].record((time.perf_counter() - enqueued) * 1000)
+            self.stats[lane]['sent' if ok else 'failed'] += 1
+            with self._condition:
+                self._sending[lane] = False
+
+    def pending(self):
+        with self._condition:
+            return {lane: len(queue) for lane, queue in self.queues.items()}
+
+    def summary(self):
+        return {lane: dict(self.stats[lane], **self.latency[lane].summary()) for lane in LANES}
+
+    def log_summary(self):
+        for lane, stats in self.summary().items():
+            _logger.info(f"lane {lane}: {stats}")
+
+    def flush(self, timeout=None):
+        """等待队列发送完毕，超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(self.pending().values()) or any(self._sending.values()):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close_connection(self):
+        self.flush(timeout=5)
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self.transport.close_connection()
+        if self.critical_transport is not None:
+            self.critical_transport.close_connection()
@@ -0,0 +1,168 @@
+import cv2
+import os
+import shutil
+
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def dhash(image, hash_size=8):
+    """差值哈希：缩放到 (hash_size+1) x hash_size 灰度图，比较相邻像素，返回64位整数"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def phash(image, hash_size=8, highfreq_factor=4):
+    """感知哈希：32x32灰度图做DCT，取左上角低频系数与中值比较，返回64位整数"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    size = hash_size * highfreq_factor
+    small = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size]
+    bits = (low > np.median(low.ravel()[1:])).ravel()  # 中值不含直流分量
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+HASH_FUNCTIONS = {'dhash': dhash, 'phash': phash}
+
+
+def hamming_distance(hash1, hash2):
+    return (hash1 ^ hash2).bit_count()
+
+
+class MultiIndexHashTable:
+    """多索引哈希表：按鸽巢原理把64位哈希切成 max_distance+1 段，
+    距离不超过 max_distance 的两个哈希至少有一段完全相同，只需比较同段桶里的候选"""
+
+    def __init__(self, max_distance=4, hash_bits=64):
+        self.max_distance = max_distance
+        self.hash_bits = hash_bits
+        chunks = max_distance + 1
+        widths = [hash_bits // chunks + (1 if i < hash_bits % chunks else 0) for i in range(chunks)]
+        self.chunks = []  # (偏移, 掩码)
+        offset = 0
+        for width in widths:
+            self.chunks.append((offset, (1 << width) - 1))
+            offset += width
+        self.tables = [{} for _ in self.chunks]
+        self.values = {}  # 哈希 -> 关联数据（如文件名）
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, hash_value, value=None):
+        if hash_value in self.values:
+            return
+        self.values[hash_value] = value
+        for (offset, mask), table in zip(self.chunks, self.tables):
+            table.setdefault((hash_value >> offset) & mask, []).append(hash_value)
+
+    def remove(self, hash_value):
+        if hash_value not in self.values:
+            return
+        del self.values[hash_value]
+        for (offset, mask), table in zip(self.chunks, self.tables):
+            key = (hash_value >> offset) & mask
+            bucket = table[key]
+            bucket.remove(hash_value)
+            if not bucket:
+                del table[key]
+
+    def oldest(self):
+        """最早加入的哈希，空表返回None"""
+        return next(iter(self.values), None)
+
+    def find(self, hash_value, max_distance=None):
+        """返回距离最近且不超过 max_distance 的 (哈希, 距离, 关联数据)，没有则返回None
+        max_distance 不能超过建表时的值，否则分段后不再保证找全"""
+        if max_distance is None:
+            max_distance = self.max_distance
+        elif max_distance > self.max_distance:
+            raise ValueError(f"max_distance {max_distance} exceeds the index distance {self.max_distance}")
+        if hash_value in self.values:
+            return hash_value, 0, self.values[hash_value]
+        best, best_distance = None, max_distance + 1
+        for (offset, mask), table in zip(self.chunks, self.tables):
+            for candidate in table.get((hash_value >> offset) & mask, ()):
+                distance = (candidate ^ hash_value).bit_count()
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        if best is None:
+            return None
+        return best, best_distance, self.values[best]
+
+
+class FrameDeduplicator:
+    """帧去重：计算感知哈希，与已保留的帧比较，在汉明距离阈值内视为重复
+    max_entries 限制只与最近保留的若干帧比较（超出时淘汰最早的），长时间运行的视频流需要设置，
+    否则索引无限增长，且场景回到很久以前的样子时新帧也会被判为重复"""
+
+    def __init__(self, max_distance=4, method='dhash', max_entries=None):
+        if method not in HASH_FUNCTIONS:
+            raise ValueError(f"Unsupported hash method: {method}")
+        self.hash_function = HASH_FUNCTIONS[method]
+        self.index = MultiIndexHashTable(max_distance)
+        self.max_entries = max_entries
+        self.kept_count = 0
+        self.duplicate_count = 0
+
+    def check(self, image, value=None):
+        """检查并登记一帧，返回 (是否重复, 哈希, 匹配到的关联数据)"""
+        hash_value = self.hash_function(image)
+        match = self.index.find(hash_value)
+        if match is not None:
+            self.duplicate_count += 1
+            return True, hash_value, match[2]
+        self.index.add(hash_value, value)
+        if self.max_entries is not None and len(self.index) > self.max_entries:
+            self.index.remove(self.index.oldest())
+        self.kept_count += 1
+        return False, hash_value, None
+
+    def is_duplicate(self, image, value=None):
+        return self.check(image, value)[0]
+
+
+def dedup_folder(folder, max_distance=4, method='dhash', duplicate_folder=None, delete=False):
+    """批量去重已有图片目录（递归），按文件名顺序保留第一张
+
+    Args:
+        duplicate_folder: 重复图片移动到该目录（保持相对路径）
+        delete: 为True时直接删除重复图片；两者都不设置时只统计
+
+    Returns:
+        list: (重复图片路径, 保留的图片路径) 列表
+    """
+    deduplicator = FrameDeduplicator(max_distance, method)
+    duplicates = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            # 缩小解码，哈希只需要低分辨率
+            image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+            if image is None:
+                continue
+            is_duplicate, _, kept_path = deduplicator.check(image, path)
+            if not is_duplicate:
+                continue
+            duplicates.append((path, kept_path))
+            if duplicate_folder:
+                target = os.path.join(duplicate_folder, os.path.relpath(path, folder))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            elif delete:
+                os.remove(path)
+    return duplicates
+
+
+
+if __name__ == "__main__":
+
+    # 统计 video/output/<camera_id> 中的近重复图片，移动到 duplicates 目录
+    duplicates = dedup_folder('path/to/video/output/1', max_distance=4, duplicate_folder='path/to/duplicates')
+    print(f"Found {len(duplicates)} near-duplicate frames")
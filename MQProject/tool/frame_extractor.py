@@ -1,5 +1,17 @@
 import cv2
+import io
+import json
+import math
 import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+MANIFEST_NAME = 'manifest.json'
+# 距离下一个采样点超过该秒数时重新seek，而不是逐帧grab
+SEEK_THRESHOLD = 5.0
+
 
 def ensure_folder_exists(folder_path):
     if not os.path.exists(folder_path):
@@ -12,35 +24,248 @@ def calculate_end_frame(cap, end_time):
         end_time = frame_count / frame_rate
     return int(end_time * cap.get(cv2.CAP_PROP_FPS))
 
-def extract_frames(video_path, output_folder, start_time=0, end_time=None):
-    ensure_folder_exists(output_folder)
-
+def get_video_info(video_path):
+    """读取视频的帧率、帧数、时长和分辨率"""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise FileNotFoundError(f"Video file not found: {video_path}")
+    frame_rate = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    info = {
+        'fps': frame_rate,
+        'frame_count': frame_count,
+        'duration': frame_count / frame_rate if frame_rate else 0,
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    cap.release()
+    return info
+
+def split_segments(start_time, end_time, interval, segment_seconds):
+    """按采样点把 [start_time, end_time] 切分成若干段，返回 (段号, 首个采样序号, 采样数) 列表"""
+    total = int(math.floor((end_time - start_time) / interval)) + 1
+    per_segment = max(1, int(segment_seconds / interval))
+    return [(index, first, min(per_segment, total - first))
+            for index, first in enumerate(range(0, total, per_segment))]
+
+
+# 分片写入器：jpg目录 / tar包 / numpy memmap
+class JpegShardWriter:
+    def __init__(self, path, jpeg_quality):
+        self.path = path
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        ensure_folder_exists(path)
+
+    def write(self, slot, frame_no, frame):
+        cv2.imwrite(os.path.join(self.path, f"frame_{frame_no}.jpg"), frame, self.params)
+
+    def close(self):
+        pass
+
+
+class TarShardWriter:
+    def __init__(self, path, jpeg_quality):
+        self.path = path
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.tar = tarfile.open(path + '.tmp', 'w')
+
+    def write(self, slot, frame_no, frame):
+        ok, buf = cv2.imencode('.jpg', frame, self.params)
+        if not ok:
+            return
+        data = buf.tobytes()
+        info = tarfile.TarInfo(f"frame_{frame_no}.jpg")
+        info.size = len(data)
+        self.tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.tar.close()
+        os.replace(self.path + '.tmp', self.path)  # 写完再改名，中断时不会留下半个分片
+
+
+class NpyShardWriter:
+    def __init__(self, path, count, height, width):
+        self.path = path
+        self.array = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=np.uint8,
+                                               shape=(count, height, width, 3))
+
+    def write(self, slot, frame_no, frame):
+        self.array[slot] = frame
+
+    def close(self):
+        self.array.flush()
+        del self.array
+        os.replace(self.path + '.tmp', self.path)
+
 
+def _open_writer(output_folder, output_format, segment_index, count, height, width, jpeg_quality):
+    name = f"shard_{segment_index:05d}"
+    if output_format == 'jpg':
+        return JpegShardWriter(os.path.join(output_folder, name), jpeg_quality), name
+    if output_format == 'tar':
+        return TarShardWriter(os.path.join(output_folder, name + '.tar'), jpeg_quality), name + '.tar'
+    if output_format == 'npy':
+        return NpyShardWriter(os.path.join(output_folder, name + '.npy'), count, height, width), name + '.npy'
+    raise ValueError(f"Unsupported output format: {output_format}")
+
+def _resize(frame, resize_width):
+    if not resize_width or frame.shape[1] == resize_width:
+        return frame
+    height = int(frame.shape[0] * resize_width / frame.shape[1])
+    return cv2.resize(frame, (resize_width, height))
+
+def _decode_samples(video_path, sample_times):
+    """用OpenCV按采样时间取帧：先seek到最近关键帧，之后只grab不retrieve，到采样点才解码输出"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Video file not found: {video_path}")
     frame_rate = cap.get(cv2.CAP_PROP_FPS)
-    start_frame = int(start_time * frame_rate)
-    end_frame = calculate_end_frame(cap, end_time)
+    # 部分文件报告的帧率为0：取不早于采样时间的第一帧，帧号改用解码器的帧位置
+    half_frame = 0.5 / frame_rate if frame_rate else 0.0
+    position = None  # 最近一次grab到的帧时间（秒）
+    try:
+        for slot, sample_time in enumerate(sample_times):
+            if position is None or sample_time - position > SEEK_THRESHOLD or sample_time < position:
+                cap.set(cv2.CAP_PROP_POS_MSEC, sample_time * 1000)
+                position = None
+            while position is None or position < sample_time - half_frame:
+                if not cap.grab():
+                    return
+                position = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            ret, frame = cap.retrieve()
+            if ret:
+                frame_no = int(round(position * frame_rate)) if frame_rate else int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+                yield slot, frame_no, frame
+    finally:
+        cap.release()
+
+def _decode_keyframes(video_path, sample_times, interval):
+    """只解码关键帧（需要PyAV），每个采样间隔内取第一个关键帧"""
+    try:
+        import av
+    except ImportError:
+        raise ImportError("keyframes_only requires PyAV: pip install av")
+    first, last = sample_times[0], sample_times[-1] + interval
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = 'NONKEY'
+        frame_rate = float(stream.average_rate or 0)
+        container.seek(int(first / stream.time_base), stream=stream, backward=True)
+        seen = set()
+        for frame in container.decode(stream):
+            if frame.time is None or frame.time < first:
+                continue
+            if frame.time >= last:
+                break
+            slot = int((frame.time - first) / interval)
+            if slot in seen or slot >= len(sample_times):
+                continue
+            seen.add(slot)
+            yield slot, int(round(frame.time * frame_rate)), frame.to_ndarray(format='bgr24')
+
+def _extract_segment(video_path, output_folder, segment, start_time, interval, output_format,
+                     keyframes_only, resize_width, jpeg_quality, height, width):
+    """工作进程：处理一个时间段并写入自己的分片"""
+    cv2.setNumThreads(1)  # 并行由进程完成，避免每个进程再开满核的线程池
+    segment_index, first_sample, count = segment
+    sample_times = [start_time + (first_sample + i) * interval for i in range(count)]
+    writer, shard = _open_writer(output_folder, output_format, segment_index, count, height, width, jpeg_quality)
+    frames = 0
+    try:
+        if keyframes_only:
+            decoded = _decode_keyframes(video_path, sample_times, interval)
+        else:
+            decoded = _decode_samples(video_path, sample_times)
+        for slot, frame_no, frame in decoded:
+            writer.write(slot, frame_no, _resize(frame, resize_width))
+            frames += 1
+    finally:
+        writer.close()
+    return segment_index, {'status': 'done', 'shard': shard, 'first_sample': first_sample,
+                           'samples': count, 'frames': frames}
+
+def _load_manifest(path, params):
+    if not os.path.exists(path):
+        return {'params': params, 'segments': {}}
+    with open(path, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+    if manifest.get('params') != params:
+        raise ValueError(f"Existing manifest {path} was created with different parameters")
+    return manifest
+
+def _save_manifest(path, manifest):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def extract_frames_parallel(video_path, output_folder, start_time=0, end_time=None, interval=1.0,
+                            segment_seconds=600, workers=None, output_format='jpg',
+                            keyframes_only=False, resize_width=None, jpeg_quality=95):
+    """把视频按时间切段，多进程并行抽帧，写入分片输出，可断点续跑
 
-    count = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    Args:
+        interval: 采样间隔（秒）
+        segment_seconds: 每段时长，每段对应一个分片
+        workers: 进程数，默认CPU核数
+        output_format: 'jpg' 目录分片 / 'tar' 包分片 / 'npy' memmap分片
+        keyframes_only: 只解码关键帧（需要PyAV），速度最快但采样点落在关键帧上
+        resize_width: 输出宽度，None保持原尺寸（npy格式所有帧尺寸一致）
 
-        if count >= start_frame and count <= end_frame:
-            if count % int(frame_rate) == 0:
-                frame_path = os.path.join(output_folder, f"frame_{count}.jpg")
-                cv2.imwrite(frame_path, frame)
+    Returns:
+        dict: 清单，记录每段的分片名和帧数
+    """
+    ensure_folder_exists(output_folder)
+    info = get_video_info(video_path)
+    if end_time is None or end_time > info['duration']:
+        end_time = info['duration']
+    width = resize_width or info['width']
+    height = int(info['height'] * width / info['width']) if resize_width else info['height']
+
+    params = {'video_path': os.path.abspath(video_path), 'start_time': start_time, 'end_time': end_time,
+              'interval': interval, 'segment_seconds': segment_seconds, 'output_format': output_format,
+              'keyframes_only': keyframes_only, 'resize_width': resize_width}
+    manifest_path = os.path.join(output_folder, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path, params)
+    manifest['video'] = info
 
-        if count > end_frame:
-            break
+    segments = [segment for segment in split_segments(start_time, end_time, interval, segment_seconds)
+                if manifest['segments'].get(str(segment[0]), {}).get('status') != 'done']
+    if not segments:
+        return manifest
 
-        count += 1
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(_extract_segment, video_path, output_folder, segment, start_time, interval,
+                                   output_format, keyframes_only, resize_width, jpeg_quality, height, width)
+                   for segment in segments]
+        for future in as_completed(futures):
+            segment_index, result = future.result()
+            manifest['segments'][str(segment_index)] = result
+            _save_manifest(manifest_path, manifest)  # 每完成一段就落盘，中断后从未完成的段继续
+    return manifest
 
+def extract_frames(video_path, output_folder, start_time=0, end_time=None, interval=1.0):
+    ensure_folder_exists(output_folder)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+    frame_rate = cap.get(cv2.CAP_PROP_FPS)
+    if frame_rate:
+        end_time = calculate_end_frame(cap, end_time) / frame_rate
+    elif end_time is None:
+        end_time = 0  # 帧率为0时无法由帧数得出时长，与 get_video_info 一致按0处理，只取起点一帧
     cap.release()
 
+    # 直接seek到start_time，只解码采样点上的帧
+    if end_time < start_time:
+        return
+    count = int(math.floor((end_time - start_time) / interval)) + 1
+    sample_times = [start_time + i * interval for i in range(count)]
+    for _, frame_no, frame in _decode_samples(video_path, sample_times):
+        frame_path = os.path.join(output_folder, f"frame_{frame_no}.jpg")
+        cv2.imwrite(frame_path, frame)
+
 
 
 if __name__ == "__main__":
@@ -51,4 +276,7 @@ if __name__ == "__main__":
     output_folder = 'path/to/output/folder'
 
     # 调用函数提取帧
-    extract_frames(video_path, output_folder, start_time=10, end_time=20)
\ No newline at end of file
+    extract_frames(video_path, output_folder, start_time=10, end_time=20)
+
+    # 多进程分段抽帧，输出tar分片，可断点续跑
+    # extract_frames_parallel(video_path, output_folder, interval=1.0, segment_seconds=600, output_format='tar')
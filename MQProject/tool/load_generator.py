@@ -0,0 +1,345 @@
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+import pika
+
+# 获取项目根目录并加入Python路径（mq.py 以 "from message import" 方式导入，同时加入MQProject目录）
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'MQProject'))
+
+from MQProject.latency import LatencyHistogram
+from MQProject.message import AircraftMessage, PersonnelMessage
+from MQProject.mq import RabbitMQ
+
+'''合成负载压测
+    模拟N个摄像头按生产逻辑发送 AircraftMessage / PersonnelMessage（含突发和状态切换），
+    通过生产代码 RabbitMQ.send_event 发布到本地替身broker（或真实RabbitMQ），
+    替身broker按主题交换机绑定路由，并像pika一样编码消息属性（消息头类型不受支持时发布失败），
+    按阶段逐步加压，报告发布吞吐、端到端延迟分位数、内存，以及开始出现背压/丢失的负载点
+'''
+
+
+class StandInBroker:
+    """进程内替身broker：有界队列 + 限速消费者，用于模拟broker容量与背压
+
+    overflow='block'  队列满时阻塞发布方（类似RabbitMQ内存告警时阻塞连接）
+    overflow='drop'   队列满时丢弃新消息（类似 x-overflow=reject-publish）
+    """
+    def __init__(self, max_queue=10000, service_rate=0, overflow='block', block_timeout=5):
+        self.max_queue = max_queue
+        self.service_rate = service_rate  # 消费速率（条/秒），0表示不限
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.queues = {}
+        self.bindings = []  # (正则, 队列名)，模拟主题交换机
+        self.condition = threading.Condition()
+        self.published = 0
+        self.dropped = 0
+        self.blocked_time = 0.0
+        self.max_depth = 0
+        self.on_deliver = None  # 回调 on_deliver(queue_name, body)
+        self._running = True
+        self._consumer = threading.Thread(target=self._consume, name='stand-in-consumer', daemon=True)
+        self._consumer.start()
+
+    def declare(self, queue_name, passive=False):
+        with self.condition:
+            if queue_name not in self.queues:
+                if passive:
+                    raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue_name}'")
+                self.queues[queue_name] = deque()
+
+    def bind(self, queue_name, pattern):
+        """主题绑定：* 匹配一个单词，# 匹配零个或多个单词"""
+        words = [{'*': r'[^.]+', '#': r'.*'}.get(word, re.escape(word)) for word in pattern.split('.')]
+        with self.condition:
+            self.bindings.append((re.compile(r'\.'.join(words).replace(r'\..*', r'(\..*)?') + '$'), queue_name))
+
+    def route(self, routing_key):
+        return [queue_name for regex, queue_name in self.bindings if regex.match(routing_key)]
+
+    def publish(self, queue_name, body):
+        with self.condition:
+            q = self.queues[queue_name]
+            if len(q) >= self.max_queue:
+                if self.overflow == 'drop':
+                    self.dropped += 1
+                    return
+                start = time.perf_counter()
+                if not self.condition.wait_for(lambda: len(q) < self.max_queue, self.block_timeout):
+                    self.dropped += 1
+                    return
+                self.blocked_time += time.perf_counter() - start
+            q.append(body)
+            self.published += 1
+            if len(q) > self.max_depth:
+                self.max_depth = len(q)
+            self.condition.notify_all()
+
+    def depth(self):
+        with self.condition:
+            return sum(len(q) for q in self.queues.values())
+
+    def _consume(self):
+        next_time = time.perf_counter()
+        while self._running:
+            with self.condition:
+                self.condition.wait_for(lambda: not self._running or any(self.queues.values()), 0.1)
+                item = None
+                for queue_name, q in self.queues.items():
+                    if q:
+                        item = (queue_name, q.popleft())
+                        self.condition.notify_all()
+                        break
+            if item is None:
+                continue
+            if self.on_deliver is not None:
+                self.on_deliver(*item)
+            if self.service_rate:
+                next_time += 1 / self.service_rate
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.perf_counter()
+
+    def close(self):
+        self._running = False
+        with self.condition:
+            self.condition.notify_all()
+
+
+class _StandInChannel:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+
+    def queue_declare(self, queue, passive=False, **kwargs):
+        self.broker.declare(queue, passive)
+
+    def exchange_declare(self, exchange, exchange_type='direct', **kwargs):
+        pass
+
+    def queue_bind(self, queue, exchange, routing_key=None, **kwargs):
+        self.broker.bind(queue, routing_key)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if properties is not None:
+            properties.encode()  # 与 pika 发送前的编码相同，不支持的消息头类型在这里报错
+        for queue_name in (self.broker.route(routing_key) if exchange else [routing_key]):
+            self.broker.publish(queue_name, body)
+
+
+class _StandInConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+
+    def channel(self):
+        return _StandInChannel(self.broker)
+
+    def close(self):
+        self.is_open = False
+
+
+class StandInRabbitMQ(RabbitMQ):
+    """只替换连接，send_event/通道/锁/重试均走生产代码"""
+    broker = None
+
+    def create_connection(self):
+        return _StandInConnection(self.broker)
+
+
+class CameraSimulator:
+    """单个摄像头的消息流：每次处理帧发送人员状态，飞机进出库/登机等状态切换时发送飞机消息，偶尔出现检测抖动造成的突发"""
+    def __init__(self, camera_id, rate, burst_probability, burst_size, rng):
+        self.camera_id = str(camera_id)
+        self.rate = rate
+        self.burst_probability = burst_probability
+        self.burst_size = burst_size
+        self.rng = rng
+        self.frame_seq = 0
+        self.plane_in_hangar = rng.random() < 0.5
+        self.pilot_present = False
+        self.cabin_cover = 2
+
+    def next_messages(self):
+        self.frame_seq += 1
+        now, now_monotonic = time.time(), time.monotonic()
+        messages = []
+        personnel = PersonnelMessage(camera_id=self.camera_id, personnel=2 if self.pilot_present else 0,
+                                     area_occupied=1 if self.pilot_present else 2)
+        messages.append(personnel)
+        transition = self.rng.random()
+        if transition < 0.01:
+            self.plane_in_hangar = not self.plane_in_hangar
+            messages.append(AircraftMessage(camera_id=self.camera_id, plane_sliding_status=1 if self.plane_in_hangar else 2))
+        elif transition < 0.03 and self.plane_in_hangar:
+            self.pilot_present = not self.pilot_present
+            self.cabin_cover = 1 if self.cabin_cover == 2 else 2
+            messages.append(AircraftMessage(camera_id=self.camera_id, Pilot_boarding_status=1 if self.pilot_present else 2,
+                                            pilot_in_the_hangar=1 if self.pilot_present else 2, cabin_cover=self.cabin_cover))
+        if self.rng.random() < self.burst_probability:
+            # 检测框抖动导致的状态反复切换
+            for i in range(self.burst_size):
+                messages.append(AircraftMessage(camera_id=self.camera_id, cabin_cover=1 + i % 2))
+        for message in messages:
+            message.timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+            message.stamp_capture(now, now_monotonic, self.frame_seq)
+        return messages
+
+
+class StepStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.received = 0
+        self.publish_latency = LatencyHistogram()
+        self.end_to_end = LatencyHistogram()
+
+    def record_publish(self, ok, elapsed_ms):
+        with self.lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.publish_latency.record(elapsed_ms)
+
+    def record_receive(self, latency_ms):
+        with self.lock:
+            self.received += 1
+            self.end_to_end.record(latency_ms)
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_camera(rabbit_mq, simulator, stats, stop_event):
+    interval = 1 / simulator.rate
+    next_time = time.perf_counter() + simulator.rng.random() * interval  # 错开各摄像头的发送时刻
+    while not stop_event.is_set():
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        next_time += interval
+        for message in simulator.next_messages():
+            start = time.perf_counter()
+            ok = rabbit_mq.send_event(message)
+            stats.record_publish(ok, (time.perf_counter() - start) * 1000)
+
+
+def run_step(rabbit_mq, broker, cameras, rate, duration, args, rng):
+    stats = StepStats()
+    stop_event = threading.Event()
+
+    def on_deliver(queue_name, body):
+        if queue_name == 'predicate':
+            stats.record_receive((time.time() - json.loads(body)['capture_time']) * 1000)
+
+    if broker is not None:
+        broker.on_deliver = on_deliver
+        broker.max_depth = 0
+        dropped_before = broker.dropped
+    simulators = [CameraSimulator(camera_id, rate, args.burst_probability, args.burst_size, random.Random(rng.random()))
+                  for camera_id in range(1, cameras + 1)]
+    threads = [threading.Thread(target=run_camera, args=(rabbit_mq, simulator, stats, stop_event), daemon=True)
+               for simulator in simulators]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    # 等待积压消费完（最多5秒），剩余视为积压
+    drain_deadline = time.monotonic() + 5
+    while broker is not None and broker.depth() and time.monotonic() < drain_deadline:
+        time.sleep(0.05)
+
+    offered = cameras * rate
+    result = {
+        'cameras': cameras,
+        'offered_frames_per_s': offered,
+        'publish_msg_per_s': round(stats.sent / elapsed, 1),
+        'publish_ms_p50': stats.publish_latency.percentile(50),
+        'publish_ms_p99': stats.publish_latency.percentile(99),
+        'e2e_ms_p50': stats.end_to_end.percentile(50),
+        'e2e_ms_p99': stats.end_to_end.percentile(99),
+        'e2e_ms_max': round(stats.end_to_end.max, 3),
+        'sent': stats.sent,
+        'failed': stats.failed,
+        'rss_mb': round(rss_mb(), 1),
+    }
+    if broker is not None:
+        result.update({
+            'received': stats.received,
+            'dropped': broker.dropped - dropped_before,
+            'backlog': broker.depth(),
+            'max_queue_depth': broker.max_depth,
+        })
+    return result
+
+
+def saturated(result, args):
+    """判断本阶段是否出现背压或丢失"""
+    lost = result['failed'] + result.get('dropped', 0) + result.get('backlog', 0)
+    return lost > 0 or result['publish_ms_p99'] > args.publish_slo_ms or result['e2e_ms_p99'] > args.e2e_slo_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='模拟多摄像头消息流，压测 RabbitMQ.send_event 与消费者')
+    parser.add_argument('--cameras', default='50,100,200,400', help='逐级加压的摄像头数量')
+    parser.add_argument('--rate', type=float, default=1.0, help='每个摄像头每秒处理帧数')
+    parser.add_argument('--step-seconds', type=float, default=10)
+    parser.add_argument('--burst-probability', type=float, default=0.02)
+    parser.add_argument('--burst-size', type=int, default=10)
+    parser.add_argument('--broker', choices=['stand-in', 'amqp'], default='stand-in')
+    parser.add_argument('--amqp-host', default='localhost')
+    parser.add_argument('--max-queue', type=int, default=10000, help='替身broker队列上限')
+    parser.add_argument('--service-rate', type=float, default=2000, help='替身broker消费速率（条/秒），0不限')
+    parser.add_argument('--overflow', choices=['block', 'drop'], default='block')
+    parser.add_argument('--publish-slo-ms', type=float, default=50)
+    parser.add_argument('--e2e-slo-ms', type=float, default=1000)
+    parser.add_argument('--log-level', default='WARNING', help='mq日志级别，INFO时每条消息都会写日志（与生产一致）')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.getLogger('mq').setLevel(args.log_level)
+    rng = random.Random(args.seed)
+    broker = None
+    if args.broker == 'stand-in':
+        broker = StandInBroker(args.max_queue, args.service_rate, args.overflow)
+        StandInRabbitMQ.broker = broker
+        rabbit_mq = StandInRabbitMQ()
+    else:
+        rabbit_mq = RabbitMQ(args.amqp_host)
+
+    saturation_point = None
+    for cameras in [int(value) for value in args.cameras.split(',')]:
+        result = run_step(rabbit_mq, broker, cameras, args.rate, args.step_seconds, args, rng)
+        print(json.dumps(result, ensure_ascii=False))
+        if saturation_point is None and saturated(result, args):
+            saturation_point = cameras
+    if saturation_point is None:
+        print("No backpressure or loss observed at any step")
+    else:
+        print(f"Backpressure/loss begins at {saturation_point} cameras ({saturation_point * args.rate:.0f} frames/s)")
+    if broker is not None:
+        broker.close()
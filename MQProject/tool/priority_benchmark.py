@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+# 获取项目根目录并加入Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(root_dir)
+
+from MQProject.latency import LatencyHistogram
+from MQProject.message import PersonnelMessage, SafetyMessage
+from MQProject.priority import CRITICAL, ROUTINE, PriorityPublisher, lane_for
+from MQProject.transport import MemoryTransport
+
+'''分级发布验证：大量例行消息涌入时，安全事件的发布延迟是否有界
+    替身传输层每条消息耗时 --send-ms（模拟broker往返），例行消息的产生速度远超发送能力，形成积压；
+    例行连接每隔 --stall-every-s 秒卡住 --stall-ms（模拟broker故障时的重试和重连）；
+    分别在 单队列(FIFO) 和 分级发布（critical 独立发送线程和独立连接）下测量 安全事件从入队到发出 的延迟。
+    分级发布下安全事件延迟应不超过 send-ms + --slack-ms，否则以非零状态退出
+    python priority_benchmark.py --duration 5 --send-ms 2
+'''
+
+
+class SlowTransport(MemoryTransport):
+    """每条消息固定耗时的替身传输层，在发出时按消息中的入队时刻统计各通道延迟；可周期性卡住模拟重试"""
+    def __init__(self, send_ms, latency=None, stall_ms=0.0, stall_every_s=0.0):
+        super().__init__()
+        self.send_ms = send_ms
+        self.latency = latency or {CRITICAL: LatencyHistogram(), ROUTINE: LatencyHistogram()}
+        self.stall_ms = stall_ms
+        self.stall_every_s = stall_every_s
+        self._next_stall = time.monotonic() + stall_every_s
+
+    def send_message(self, queue_name, message):
+        if self.stall_ms and time.monotonic() >= self._next_stall:
+            time.sleep(self.stall_ms / 1000)
+            self._next_stall = time.monotonic() + self.stall_every_s
+        time.sleep(self.send_ms / 1000)
+        payload = json.loads(message)
+        self.latency[payload['lane']].record((time.perf_counter() - payload['enqueued']) * 1000)
+        return True
+
+
+def run(name, prioritized, args):
+    transport = SlowTransport(args.send_ms, stall_ms=args.stall_ms, stall_every_s=args.stall_every_s)
+    # FIFO 基线：所有消息都进 routine 队列且不丢弃，等同于原来的单一发送路径
+    critical_transport = SlowTransport(args.send_ms, transport.latency) if prioritized else None
+    publisher = PriorityPublisher(transport, max_routine=args.max_routine if prioritized else 10 ** 9,
+                                  critical_transport=critical_transport)
+    stop = threading.Event()
+
+    def flood(camera_id):
+        message = PersonnelMessage(camera_id=camera_id, personnel=1, area_occupied=1)
+        while not stop.is_set():
+            body = json.dumps({'lane': ROUTINE, 'enqueued': time.perf_counter(), 'body': message.to_json()})
+            publisher.send_message('predicate', body, ROUTINE)
+            time.sleep(args.routine_interval_ms / 1000)
+
+    def alarms():
+        message = SafetyMessage(camera_id='1', area_on_fire=2)
+        while not stop.is_set():
+            body = json.dumps({'lane': CRITICAL, 'enqueued': time.perf_counter(), 'body': message.to_json()})
+            publisher.send_message('predicate', body, lane_for(message) if prioritized else ROUTINE)
+            time.sleep(args.critical_interval_ms / 1000)
+
+    threads = [threading.Thread(target=flood, args=(str(i),), daemon=True) for i in range(args.cameras)]
+    threads.append(threading.Thread(target=alarms, daemon=True))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if prioritized:
+        publisher.flush(timeout=30)
+    critical = transport.latency[CRITICAL].summary()
+    routine = transport.latency[ROUTINE].summary()
+    print(f"{name:>8}: critical {critical['count']:>5} sent | p50 {critical['p50']:>9.1f} ms | p99 {critical['p99']:>9.1f} ms"
+          f" | max {critical['max']:>9.1f} ms || routine {routine['count']:>6} sent, p99 {routine['p99']:>9.1f} ms,"
+          f" dropped {publisher.stats[ROUTINE]['dropped']}, backlog {publisher.pending()[ROUTINE]}")
+    return critical
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='验证例行消息洪峰下安全事件的发布延迟上界')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--cameras', type=int, default=8, help='发送例行消息的摄像头线程数')
+    parser.add_argument('--routine-interval-ms', type=float, default=1.0, help='每个摄像头线程的发送间隔')
+    parser.add_argument('--critical-interval-ms', type=float, default=200.0)
+    parser.add_argument('--send-ms', type=float, default=2.0, help='替身传输层每条消息的发送耗时')
+    parser.add_argument('--max-routine', type=int, default=1000)
+    parser.add_argument('--stall-ms', type=float, default=1000.0, help='例行连接周期性卡住的时长')
+    parser.add_argument('--stall-every-s', type=float, default=2.0)
+    parser.add_argument('--slack-ms', type=float, default=20.0, help='线程调度等带来的额外容差')
+    args = parser.parse_args()
+
+    run('fifo', False, args)
+    critical = run('priority', True, args)
+    bound = args.send_ms + args.slack_ms
+    if critical['count'] == 0 or critical['max'] > bound:
+        print(f"FAIL: critical latency max {critical['max']:.1f} ms exceeds bound {bound:.1f} ms")
+        sys.exit(1)
+    print(f"OK: critical latency max {critical['max']:.1f} ms within bound {bound:.1f} ms")
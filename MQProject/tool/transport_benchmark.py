@@ -0,0 +1,130 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+
+# 获取项目根目录并加入Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(root_dir)
+
+from MQProject.message import AircraftMessage
+from MQProject.transport import IpcServer, IpcTransport, MemoryTransport
+
+# 消息前8字节为发送时刻(perf_counter_ns)，用于计算单程延迟
+_STAMP = struct.Struct('!Q')
+
+
+class LatencyRecorder:
+    def __init__(self, expected):
+        self.expected = expected
+        self.latencies = []
+        self.done = threading.Event()
+        self.first_time = None
+        self.last_time = None
+
+    def record(self, body):
+        now = time.perf_counter_ns()
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+        self.latencies.append(now - _STAMP.unpack_from(body)[0])
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def build_payload():
+    message = AircraftMessage(camera_id='1', plane_sliding_status=1, plane_number='ABC123', cabin_cover=2)
+    return message.to_json().encode('utf-8')
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))
+    return sorted_values[index]
+
+def run_backend(name, transport, recorder, payload, count, rate=0):
+    start = time.perf_counter_ns()
+    for i in range(count):
+        if rate:
+            # 按固定速率发送，测量无积压时的延迟
+            delay = start / 1e9 + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        transport.send_message('predicate', _STAMP.pack(time.perf_counter_ns()) + payload)
+    send_elapsed = (time.perf_counter_ns() - start) / 1e9
+    if not recorder.done.wait(60):
+        print(f"{name}: only {len(recorder.latencies)}/{count} messages received")
+    latencies = sorted(recorder.latencies)
+    total_elapsed = (recorder.last_time - start) / 1e9
+    print(f"{name:>8}: publish {count / send_elapsed:>10.0f} msg/s | end-to-end {len(latencies) / total_elapsed:>10.0f} msg/s"
+          f" | latency p50 {percentile(latencies, 50) / 1e3:>8.1f} us"
+          f" p99 {percentile(latencies, 99) / 1e3:>8.1f} us max {latencies[-1] / 1e3:>8.1f} us")
+
+def bench_memory(payload, count, rate=0):
+    transport = MemoryTransport()
+    recorder = LatencyRecorder(count)
+
+    def consume():
+        while not recorder.done.is_set():
+            body = transport.receive('predicate', timeout=1)
+            if body is not None:
+                recorder.record(body)
+
+    threading.Thread(target=consume, daemon=True).start()
+    run_backend('memory', transport, recorder, payload, count, rate)
+
+def bench_ipc(payload, count, path, rate=0):
+    recorder = LatencyRecorder(count)
+    server = IpcServer(lambda queue_name, body: recorder.record(body), path).start()
+    transport = IpcTransport(path)
+    try:
+        run_backend('ipc', transport, recorder, payload, count, rate)
+    finally:
+        transport.close_connection()
+        server.close()
+
+def bench_amqp(payload, count, host, port, rate=0):
+    try:
+        import pika
+        from MQProject.mq import RabbitMQ
+    except ImportError as e:
+        print(f"    amqp: skipped ({e})")
+        return
+    recorder = LatencyRecorder(count)
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host, port))
+    channel = connection.channel()
+    channel.queue_declare(queue='predicate')
+    channel.queue_purge(queue='predicate')
+    channel.basic_consume(queue='predicate', auto_ack=True,
+                          on_message_callback=lambda ch, method, properties, body: recorder.record(body))
+
+    def consume():
+        while not recorder.done.is_set():
+            connection.process_data_events(time_limit=0.1)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    run_backend('amqp', RabbitMQ(host, port), recorder, payload, count, rate)
+    consumer.join()
+    connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='比较各消息传输后端的延迟和吞吐')
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--rate', type=float, default=0, help='每秒发送条数，0表示尽可能快')
+    parser.add_argument('--backends', default='memory,ipc,amqp')
+    parser.add_argument('--ipc-path', default='/tmp/transport_benchmark.sock')
+    parser.add_argument('--amqp-host', default='localhost')
+    parser.add_argument('--amqp-port', type=int, default=5672)
+    args = parser.parse_args()
+
+    payload = build_payload()
+    print(f"payload {len(payload)} bytes, {args.count} messages")
+    backends = args.backends.split(',')
+    if 'memory' in backends:
+        bench_memory(payload, args.count, args.rate)
+    if 'ipc' in backends:
+        bench_ipc(payload, args.count, args.ipc_path, args.rate)
+    if 'amqp' in backends:
+        bench_amqp(payload, args.count, args.amqp_host, args.amqp_port, args.rate)
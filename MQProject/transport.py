@@ -0,0 +1,199 @@
+# coding=utf-8
+### 消息传输层：统一 send_message 接口，支持 AMQP(RabbitMQ)、进程内内存队列、本机Unix域套接字
+
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+from log.unified_log import get_mq_logger
+
+_logger = get_mq_logger()
+
+# 帧头：消息体长度(4字节) + 队列名长度(2字节)
+_HEADER = struct.Struct('!IH')
+
+
+class Transport:
+    """传输层基类，接口与 RabbitMQ 保持一致"""
+
+    def create_queue(self, queue_name):
+        pass
+
+    def send_message(self, queue_name, message):
+        """发送消息到指定队列，成功返回True"""
+        raise NotImplementedError("子类必须实现send_message方法")
+
+    def send_event(self, message, body=None, queue_name='predicate'):
+        """发送事件消息；没有交换机路由的传输层直接发到队列（RabbitMQ按主题交换机路由）"""
+        return self.send_message(queue_name, body if body is not None else message.to_json())
+
+    def close_connection(self):
+        pass
+
+
+class MemoryTransport(Transport):
+    """进程内内存队列，用于测试和单进程部署"""
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.queues = {}
+        self._lock = threading.Lock()
+
+    def get_queue(self, queue_name):
+        q = self.queues.get(queue_name)
+        if q is None:
+            with self._lock:
+                q = self.queues.setdefault(queue_name, queue.Queue(self.maxsize))
+        return q
+
+    def create_queue(self, queue_name):
+        self.get_queue(queue_name)
+
+    def send_message(self, queue_name, message):
+        try:
+            self.get_queue(queue_name).put_nowait(message)
+            return True
+        except queue.Full:
+            _logger.warning(f"Memory queue {queue_name} full, message dropped")
+            return False
+
+    def receive(self, queue_name, timeout=None):
+        """取出一条消息，超时返回None"""
+        try:
+            return self.get_queue(queue_name).get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class IpcTransport(Transport):
+    """本机Unix域套接字客户端，不经过broker；每个线程一个连接，消息头和消息体分散写入，不拼接拷贝"""
+
+    def __init__(self, path='/tmp/multi_rtsp_yolo_mq.sock', max_retries=3):
+        self.path = path
+        self.max_retries = max_retries
+        self.thread_local = threading.local()
+
+    def get_socket(self):
+        sock = getattr(self.thread_local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            self.thread_local.sock = sock
+            _logger.debug(f"Connected to IPC server {self.path} from {threading.current_thread().name}")
+        return sock
+
+    def _drop_socket(self):
+        sock = getattr(self.thread_local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self.thread_local.sock = None
+
+    def send_message(self, queue_name, message):
+        body = message.encode('utf-8') if isinstance(message, str) else message
+        name = queue_name.encode('utf-8')
+        header = _HEADER.pack(len(body), len(name))
+        total = len(header) + len(name) + len(body)
+        for retry_count in range(self.max_retries):
+            try:
+                sock = self.get_socket()
+                sent = sock.sendmsg([header, name, body])
+                if sent < total:
+                    # 极少出现的部分写入，补发剩余部分
+                    sock.sendall(b''.join([header, name, bytes(body)])[sent:])
+                return True
+            except OSError as e:
+                _logger.warning(f"IPC send failed ({e}), reconnecting...")
+                self._drop_socket()
+                time.sleep(0.1 * (retry_count + 1))
+        _logger.error(f"Failed to send IPC message after {self.max_retries} retries")
+        return False
+
+    def close_connection(self):
+        self._drop_socket()
+
+
+class IpcServer:
+    """Unix域套接字服务端：每个连接一个线程，复用接收缓冲区，
+    回调 handler(queue_name, body) 中的 body 是指向缓冲区的 memoryview，只在回调内有效"""
+
+    def __init__(self, handler, path='/tmp/multi_rtsp_yolo_mq.sock', buffer_size=65536):
+        self.handler = handler
+        self.path = path
+        self.buffer_size = buffer_size
+        self._running = False
+        if os.path.exists(path):
+            os.remove(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_loop, name='ipc-server')
+        self._thread.daemon = True
+        self._thread.start()
+        _logger.info(f"IPC server listening on {self.path}")
+        return self
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            worker = threading.Thread(target=self._serve, args=(conn,), name='ipc-conn')
+            worker.daemon = True
+            worker.start()
+
+    @staticmethod
+    def _recv_exact(conn, view, size):
+        received = 0
+        while received < size:
+            n = conn.recv_into(view[received:size])
+            if n == 0:
+                return False
+            received += n
+        return True
+
+    def _serve(self, conn):
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        with conn:
+            while True:
+                if not self._recv_exact(conn, view, _HEADER.size):
+                    return
+                body_len, name_len = _HEADER.unpack_from(buffer)
+                size = name_len + body_len
+                if size > len(buffer):
+                    buffer = bytearray(size)
+                    view = memoryview(buffer)
+                if not self._recv_exact(conn, view, size):
+                    return
+                try:
+                    self.handler(bytes(view[:name_len]).decode('utf-8'), view[name_len:size])
+                except Exception as e:
+                    _logger.error(f"IPC handler error: {e}")
+
+    def close(self):
+        self._running = False
+        self.server.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def create_transport(kind='amqp', **kwargs):
+    """按名称创建传输层：'amqp' / 'memory' / 'ipc'"""
+    if kind == 'amqp':
+        from MQProject.mq import RabbitMQ
+        return RabbitMQ(**kwargs)
+    if kind == 'memory':
+        return MemoryTransport(**kwargs)
+    if kind == 'ipc':
+        return IpcTransport(**kwargs)
+    raise ValueError(f"Unsupported transport: {kind}")
@@ -0,0 +1,238 @@
+import numpy as np
+
+from common import yolo_logger
+from yolo_rtsp.EventDetector import BOX_LABELS, PLANE_PARTS, LeftEventDetector
+
+'''多摄像头批量事件检测：所有摄像头的检测器状态按列存为NumPy数组（struct-of-arrays），
+    每个推理批次用一次向量化计算更新整批摄像头，事件结果与逐个调用 LeftEventDetector.detect_events 一致
+
+    输入按列组织：每个检测框一行 (批内帧序号, 槽位, xyxy)，槽位为 BOX_LABELS 中的下标；
+    同一帧同一槽位有多个框时取最后一个（与 LeftEventDetector.update_boxes 相同）
+    不处理固定区域（zone_map），结果中没有 zone_changed 字段，需要区域判断的摄像头使用 LeftEventDetector
+'''
+
+EVENT_FIELDS = ('plane_sliding_status', 'pilot_boarding_status', 'pilot_in_hangar',
+                'cabin_cover_state', 'skin', 'cabin_occupied')
+
+_SLOT = {label: index for index, label in enumerate(BOX_LABELS)}
+_PART_SLOTS = [_SLOT[part] for part in PLANE_PARTS]
+_ON, _OFF = _SLOT['cabin_cover_on'], _SLOT['cabin_cover_off']
+_RED_ON, _RED_OFF = _SLOT['red_on'], _SLOT['red_off']
+_AVIATOR = _SLOT['aviator']
+
+
+class BatchEventDetector:
+    def __init__(self, camera_count, movement_threshold=50):
+        self.camera_count = camera_count
+        self.movement_threshold = movement_threshold
+        # 前一帧检测框及其是否存在
+        self.previous_boxes = np.zeros((camera_count, len(BOX_LABELS), 4), dtype=np.int64)
+        self.previous_present = np.zeros((camera_count, len(BOX_LABELS)), dtype=bool)
+        # 状态列，含义同 EventDetector 的同名属性
+        self.last_pilot_in_cockpit = np.zeros(camera_count, dtype=np.int8)
+        self.last_plane_in_hangar = np.zeros(camera_count, dtype=bool)
+        self.last_cockpit_status = np.zeros(camera_count, dtype=np.int8)
+        self.plane_is_moving = np.zeros(camera_count, dtype=bool)
+        self.static_frame_count = np.zeros(camera_count, dtype=np.int64)
+        self.moving_frame_count = np.zeros(camera_count, dtype=np.int64)
+        self.last_aviator_detected = np.zeros(camera_count, dtype=bool)
+        # 事件最后发生时间，NaN表示没有记录
+        self.last_event_time = {name: np.full(camera_count, np.nan)
+                                for name in ('aviator', 'plane_entering', 'plane_exiting')}
+
+    # ---------------------------------------------------------------- 输入转换
+
+    @staticmethod
+    def slot_table(names):
+        """模型类别编号 -> 槽位下标，不关心的类别为-1"""
+        table = np.full(max(int(class_id) for class_id in names) + 1, -1, dtype=np.int64)
+        for class_id, name in names.items():
+            table[int(class_id)] = _SLOT.get(name, -1)
+        return table
+
+    def detect_results(self, cameras, results_list, is_first_detect, current_time):
+        """cameras[i] 这一帧的模型输出为 results_list[i]，把检测框拼成列后调用 detect_batch"""
+        frame_index, slots, xyxy = [], [], []
+        tables = {}
+        for index, results in enumerate(results_list):
+            for result in results:
+                boxes = result.boxes
+                if len(boxes) == 0:
+                    continue
+                key = id(result.names)
+                table = tables.get(key)
+                if table is None:
+                    table = tables[key] = self.slot_table(result.names)
+                classes = boxes.cls.cpu().numpy().astype(np.int64)
+                slots.append(table[classes])
+                xyxy.append(boxes.xyxy.cpu().numpy())
+                frame_index.append(np.full(len(classes), index, dtype=np.int64))
+        if slots:
+            frame_index, slots, xyxy = np.concatenate(frame_index), np.concatenate(slots), np.concatenate(xyxy)
+        else:
+            frame_index, slots, xyxy = np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros((0, 4), np.float32)
+        return self.detect_batch(cameras, frame_index, slots, xyxy, is_first_detect, current_time)
+
+    # ---------------------------------------------------------------- 向量化状态更新
+
+    def detect_batch(self, cameras, frame_index, slots, xyxy, is_first_detect, current_time):
+        """更新一批摄像头（每个摄像头一帧）的状态
+
+        Args:
+            cameras: (B,) 摄像头下标，批内不重复
+            frame_index, slots, xyxy: 每个检测框一行，frame_index 为批内帧序号，slots 为槽位（-1 表示忽略）
+            is_first_detect: (B,) 或标量
+            current_time: (B,) 或标量，帧时间
+        Returns:
+            {事件字段: (B,) int8数组}，与 LeftEventDetector 返回的 event_status 中 EVENT_FIELDS 各字段相同
+        """
+        cameras = np.asarray(cameras, dtype=np.int64)
+        batch = len(cameras)
+        first = np.broadcast_to(np.asarray(is_first_detect, dtype=bool), (batch,))
+        now = np.broadcast_to(np.asarray(current_time, dtype=np.float64), (batch,))
+
+        # 当前帧检测框：同一帧同一槽位保留最后一个框
+        current_boxes = np.zeros((batch, len(BOX_LABELS), 4), dtype=np.int64)
+        present = np.zeros((batch, len(BOX_LABELS)), dtype=bool)
+        keep = np.asarray(slots) >= 0
+        if keep.any():
+            keys = np.asarray(frame_index)[keep] * len(BOX_LABELS) + np.asarray(slots)[keep]
+            _, last = np.unique(keys[::-1], return_index=True)
+            last = len(keys) - 1 - last
+            rows, cols = np.divmod(keys[last], len(BOX_LABELS))
+            current_boxes[rows, cols] = np.asarray(xyxy)[keep][last]  # 与 astype(int) 一样向零取整
+            present[rows, cols] = True
+
+        status = {field: np.zeros(batch, dtype=np.int8) for field in EVENT_FIELDS}
+        aviator = present[:, _AVIATOR]
+        cabin_present = present[:, _ON] | present[:, _OFF]
+        cabin = np.where(present[:, _ON, None], current_boxes[:, _ON], current_boxes[:, _OFF])
+        aviator_box = current_boxes[:, _AVIATOR]
+
+        status['skin'][present[:, _RED_OFF]] = 2
+        status['skin'][present[:, _RED_ON]] = 1
+
+        # 飞行员进入机库（只记录时间）
+        status['pilot_in_hangar'][aviator] = 1
+        last_aviator = self.last_event_time['aviator']
+        entered = aviator & ~self.last_aviator_detected[cameras] & \
+            (now - np.nan_to_num(last_aviator[cameras], nan=0.0) > 1200)
+        last_aviator[cameras[entered]] = now[entered]
+        self.last_aviator_detected[cameras] = aviator
+
+        has_plane = present[:, _PART_SLOTS].any(axis=1)
+        both = aviator & cabin_present
+        in_cockpit = both & (aviator_box[:, 0] >= cabin[:, 0]) & (aviator_box[:, 2] <= cabin[:, 2]) & \
+            (aviator_box[:, 1] >= cabin[:, 1]) & (aviator_box[:, 3] <= cabin[:, 3])
+        outside = both & ((aviator_box[:, 2] < cabin[:, 0]) | (aviator_box[:, 0] > cabin[:, 2]) |
+                          (aviator_box[:, 3] < cabin[:, 1]) | (aviator_box[:, 1] > cabin[:, 3]))
+        cockpit_state = np.where(present[:, _ON], 1, np.where(present[:, _OFF], 2, 0)).astype(np.int8)
+
+        # 首次检测：只建立基线
+        first_cameras = cameras[first]
+        self.last_plane_in_hangar[first_cameras] = has_plane[first]
+        self.last_pilot_in_cockpit[first_cameras] = in_cockpit[first]
+        self.last_cockpit_status[first_cameras] = cockpit_state[first]
+
+        rows = np.flatnonzero(~first)
+        cams = cameras[rows]
+        # 飞机入库/出库
+        last_plane = self.last_plane_in_hangar[cams]
+        entering = ~last_plane & has_plane[rows]
+        exiting = last_plane & ~has_plane[rows]
+        status['plane_sliding_status'][rows[entering]] = 1
+        status['plane_sliding_status'][rows[exiting]] = 2
+        self.last_plane_in_hangar[cams] = has_plane[rows]
+        self.last_event_time['plane_entering'][cams[entering]] = now[rows[entering]]
+        self.last_event_time['plane_exiting'][cams[exiting]] = now[rows[exiting]]
+
+        # 座舱盖开启/关闭
+        last_cockpit = self.last_cockpit_status[cams]
+        current_cockpit = cockpit_state[rows]
+        status['cabin_cover_state'][rows[(last_cockpit == 2) & (current_cockpit == 1)]] = 1
+        status['cabin_cover_state'][rows[(last_cockpit == 1) & (current_cockpit == 2)]] = 2
+        self.last_cockpit_status[cams] = current_cockpit
+
+        # 飞机移动/静止：任一部件的 y1 变化超过阈值即为移动
+        tracked = has_plane[rows]
+        moved = (present[rows][:, _PART_SLOTS] & self.previous_present[cams][:, _PART_SLOTS] &
+                 (np.abs(current_boxes[rows][:, _PART_SLOTS, 1] - self.previous_boxes[cams][:, _PART_SLOTS, 1])
+                  > self.movement_threshold)).any(axis=1)
+        still = tracked & ~moved
+        moving = tracked & moved
+        still_cams, moving_cams = cams[still], cams[moving]
+        self.static_frame_count[still_cams] += 1
+        self.moving_frame_count[still_cams] = 0
+        settled = self.static_frame_count[cams] > 5
+        self.plane_is_moving[cams[still & settled]] = False
+        status['plane_sliding_status'][rows[still & settled]] = 3
+        self.moving_frame_count[moving_cams] += 1
+        self.static_frame_count[moving_cams] = 0
+        self.plane_is_moving[cams[moving & (self.moving_frame_count[cams] > 5)]] = True
+
+        # 飞行员登机/下机
+        pilot = both[rows]
+        last_pilot = self.last_pilot_in_cockpit[cams]
+        baseline = pilot & (last_pilot == 0)
+        alighting = pilot & (last_pilot == 1) & outside[rows]
+        boarding = pilot & (last_pilot == 2) & in_cockpit[rows]
+        self.last_pilot_in_cockpit[cams[baseline]] = in_cockpit[rows[baseline]]
+        self.last_pilot_in_cockpit[cams[alighting]] = 0
+        self.last_pilot_in_cockpit[cams[boarding]] = 1
+        status['pilot_boarding_status'][rows[alighting]] = 2
+        status['pilot_boarding_status'][rows[boarding]] = 1
+
+        self._log_transitions(cameras, rows, entering, exiting, status)
+
+        # 当前帧变为前一帧
+        self.previous_boxes[cameras] = current_boxes
+        self.previous_present[cameras] = present
+        return status
+
+    def _log_transitions(self, cameras, rows, entering, exiting, status):
+        """只为发生状态切换的摄像头写日志，没有事件时不产生Python层循环"""
+        for row in rows[entering]:
+            yolo_logger.info(f"摄像头 {cameras[row]} 检测到飞机入库")
+        for row in rows[exiting]:
+            yolo_logger.info(f"摄像头 {cameras[row]} 检测到飞机出库")
+        for row in np.flatnonzero(status['cabin_cover_state']):
+            yolo_logger.info(f"摄像头 {cameras[row]} 检测到座舱{'开启' if status['cabin_cover_state'][row] == 1 else '关闭'}")
+        for row in np.flatnonzero(status['pilot_boarding_status']):
+            yolo_logger.info(f"摄像头 {cameras[row]} 检测到飞行员{'登机' if status['pilot_boarding_status'][row] == 1 else '下机'}")
+
+    # ---------------------------------------------------------------- 与单摄像头检测器互转（快照/恢复）
+
+    def to_detector(self, camera):
+        """导出某个摄像头的状态为 LeftEventDetector，可交给 DetectorCheckpoint 保存"""
+        detector = LeftEventDetector()
+        detector.last_pilot_in_cockpit = int(self.last_pilot_in_cockpit[camera])
+        detector.last_plane_in_hangar = bool(self.last_plane_in_hangar[camera])
+        detector.last_cockpit_status = int(self.last_cockpit_status[camera])
+        detector.plane_is_moving = bool(self.plane_is_moving[camera])
+        detector.static_frame_count = int(self.static_frame_count[camera])
+        detector.moving_frame_count = int(self.moving_frame_count[camera])
+        detector.last_aviator_detected = bool(self.last_aviator_detected[camera])
+        detector.last_event_time = {name: float(times[camera]) for name, times in self.last_event_time.items()
+                                    if not np.isnan(times[camera])}
+        for label, slot in _SLOT.items():
+            if self.previous_present[camera, slot]:
+                detector.set_box(label, self.previous_boxes[camera, slot])
+        detector.swap_boxes()
+        return detector
+
+    def load_detector(self, camera, detector):
+        """把 LeftEventDetector（例如从快照恢复的）的状态写入某个摄像头的列"""
+        self.last_pilot_in_cockpit[camera] = int(detector.last_pilot_in_cockpit)
+        self.last_plane_in_hangar[camera] = bool(detector.last_plane_in_hangar)
+        self.last_cockpit_status[camera] = int(detector.last_cockpit_status)
+        self.plane_is_moving[camera] = bool(detector.plane_is_moving)
+        self.static_frame_count[camera] = detector.static_frame_count
+        self.moving_frame_count[camera] = detector.moving_frame_count
+        self.last_aviator_detected[camera] = bool(detector.last_aviator_detected)
+        for name, times in self.last_event_time.items():
+            times[camera] = detector.last_event_time.get(name, np.nan)
+        for label, slot in _SLOT.items():
+            box = detector.previous_boxes[label]
+            self.previous_present[camera, slot] = box is not None
+            if box is not None:
+                self.previous_boxes[camera, slot] = box
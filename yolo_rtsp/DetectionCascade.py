@@ -0,0 +1,176 @@
+import cv2
+import numpy as np
+
+from common import yolo_logger
+from yolo_rtsp.DetectionResult import DetectionResult
+
+'''两级检测级联
+    第一级：运动过滤（灰度缩略图帧差）和/或小模型低分辨率推理，判断画面中是否有飞机部件或人员
+    第二级：高精度模型，只在第一级触发时运行
+        mode='full'  对整帧推理
+        mode='crop'  只对第一级找到的座舱/飞行员候选区域裁剪推理，坐标映射回原图后与第一级结果合并
+    合并后的结果与模型输出接口一致，可直接交给 EventDetector
+'''
+
+
+# 结果来源对应 ModelManager.predict 的统计口径：复用缓存/只跑第一级不计入第二级模型的耗时和一致性比较
+SAMPLE_KINDS = {'stage2_full': 'full', 'stage2_crop': 'partial'}
+
+
+class DetectionCascade:
+    def __init__(self, stage2_model, stage1_model=None, mode='full', device=0,
+                 stage1_imgsz=320, stage1_conf=0.25,
+                 trigger_labels=('cabin_cover_on', 'cabin_cover_off', 'red_on', 'red_off', 'aviator', 'air_crew'),
+                 crop_labels=('cabin_cover_on', 'cabin_cover_off', 'aviator'), crop_padding=0.3, crop_imgsz=640,
+                 motion_threshold=None, motion_size=(64, 36), force_interval=30):
+        if mode not in ('full', 'crop'):
+            raise ValueError(f"Unsupported cascade mode: {mode}")
+        if mode == 'crop' and stage1_model is None:
+            raise ValueError("Cascade mode 'crop' needs a stage1 model to propose candidates")
+        self.stage2_model = stage2_model
+        self.stage1_model = stage1_model
+        self.mode = mode
+        self.device = device
+        self.stage1_imgsz = stage1_imgsz
+        self.stage1_conf = stage1_conf
+        self.trigger_labels = set(trigger_labels)
+        self.crop_labels = set(crop_labels)
+        self.crop_padding = crop_padding
+        self.crop_imgsz = crop_imgsz
+        self.motion_threshold = motion_threshold  # 缩略图平均灰度差阈值，None表示不启用运动过滤
+        self.motion_size = motion_size
+        self.force_interval = force_interval      # 每隔多少帧强制运行一次第二级，防止静止画面下状态漂移
+        self._reference = None   # 上次运行第二级时的缩略图
+        self._last_results = None
+        self._frames_since_stage2 = 0
+        self.stats = {'frames': 0, 'reused': 0, 'stage1_only': 0, 'stage2_full': 0, 'stage2_crop': 0}
+        self.last_stage = None   # 最近一帧结果的来源，取值同 stats 中的各项
+
+    @classmethod
+    def from_config(cls, stage2_model, config, device=0):
+        """按 RtspYoloConfig.cascade_config 构建，stage1_model_path 指定第一级小模型"""
+        config = dict(config)
+        stage1_path = config.pop('stage1_model_path', None)
+        stage1_model = None
+        if stage1_path:
+            from ultralytics import YOLO
+            stage1_model = YOLO(stage1_path)
+        return cls(stage2_model, stage1_model, device=device, **config)
+
+    def __call__(self, frame):
+        self.stats['frames'] += 1
+        self._frames_since_stage2 += 1
+        forced = self._last_results is None or self._frames_since_stage2 >= self.force_interval
+
+        # 运动过滤：画面与上次第二级推理时几乎相同，直接复用上次结果
+        thumbnail = None
+        if self.motion_threshold is not None:
+            thumbnail = self._thumbnail(frame)
+            if not forced and self._reference is not None and \
+                    cv2.absdiff(thumbnail, self._reference).mean() < self.motion_threshold:
+                self.stats['reused'] += 1
+                self.last_stage = 'reused'
+                return self._last_results
+
+        if self.stage1_model is None or forced and self.mode == 'full':
+            return self._run_full(frame, thumbnail)
+
+        stage1 = self.stage1_model(frame, device=self.device, imgsz=self.stage1_imgsz, conf=self.stage1_conf,
+                                   verbose=False)[0]
+        names = stage1.names
+        labels = [names[int(class_id)] for class_id in stage1.boxes.cls.cpu().numpy()]
+        if not forced and not self.trigger_labels.intersection(labels):
+            # 空场景：第一级结果就足够
+            self.stats['stage1_only'] += 1
+            self.last_stage = 'stage1_only'
+            return [stage1]
+        if self.mode == 'full':
+            return self._run_full(frame, thumbnail)
+        return self._run_crops(frame, stage1, labels, thumbnail)
+
+    def _thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, self.motion_size, interpolation=cv2.INTER_AREA)
+
+    def _remember(self, results, thumbnail):
+        self._last_results = results
+        self._frames_since_stage2 = 0
+        if thumbnail is not None:
+            self._reference = thumbnail
+        return results
+
+    def _run_full(self, frame, thumbnail):
+        self.stats['stage2_full'] += 1
+        self.last_stage = 'stage2_full'
+        return self._remember(self.stage2_model(frame, device=self.device, verbose=False), thumbnail)
+
+    def _run_crops(self, frame, stage1, labels, thumbnail):
+        """对候选区域裁剪后批量运行第二级，结果映射回原图坐标，替换第一级中对应类别的框"""
+        self.stats['stage2_crop'] += 1
+        self.last_stage = 'stage2_crop'
+        height, width = frame.shape[:2]
+        xyxy1 = stage1.boxes.xyxy.cpu().numpy()
+        cls1 = stage1.boxes.cls.cpu().numpy()
+        conf1 = stage1.boxes.conf.cpu().numpy()
+        names2 = self.stage2_model.names
+        ids2 = {name: class_id for class_id, name in names2.items()}
+
+        crops, offsets = [], []
+        for box, label in zip(xyxy1, labels):
+            if label not in self.crop_labels:
+                continue
+            x1, y1, x2, y2 = box
+            pad_x, pad_y = (x2 - x1) * self.crop_padding, (y2 - y1) * self.crop_padding
+            left, top = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+            right, bottom = min(width, int(x2 + pad_x)), min(height, int(y2 + pad_y))
+            if right - left < 8 or bottom - top < 8:
+                continue
+            crops.append(frame[top:bottom, left:right])
+            offsets.append((left, top))
+
+        merged_xyxy, merged_cls, merged_conf = [], [], []
+        # 非裁剪类别保留第一级结果（按名称映射到第二级类别编号）
+        for box, label, conf in zip(xyxy1, labels, conf1):
+            if label not in self.crop_labels and label in ids2:
+                merged_xyxy.append(box)
+                merged_cls.append(ids2[label])
+                merged_conf.append(conf)
+        if crops:
+            for result, (left, top) in zip(self.stage2_model(crops, device=self.device, imgsz=self.crop_imgsz,
+                                                             verbose=False), offsets):
+                boxes = result.boxes
+                for box, class_id, conf in zip(boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(),
+                                               boxes.conf.cpu().numpy()):
+                    merged_xyxy.append(box + np.array([left, top, left, top], dtype=box.dtype))
+                    merged_cls.append(int(class_id))
+                    merged_conf.append(conf)
+        else:
+            yolo_logger.debug("级联第一级触发但没有可裁剪的候选区域")
+        keep = _dedupe(np.array(merged_xyxy, dtype=np.float32).reshape(-1, 4), np.array(merged_cls), np.array(merged_conf))
+        result = DetectionResult.from_arrays(np.array(merged_xyxy, dtype=np.float32).reshape(-1, 4)[keep],
+                                             np.array(merged_cls, dtype=np.float32)[keep],
+                                             np.array(merged_conf, dtype=np.float32)[keep],
+                                             names2, (height, width))
+        return self._remember([result], thumbnail)
+
+
+def _dedupe(xyxy, cls, conf, iou_threshold=0.5):
+    """相邻裁剪区域重叠时同一目标会被检测两次：同类别IoU超过阈值的框只保留置信度最高的"""
+    order = np.argsort(-conf)
+    keep = []
+    for i in order:
+        duplicate = False
+        for j in keep:
+            if cls[i] != cls[j]:
+                continue
+            x1, y1 = max(xyxy[i, 0], xyxy[j, 0]), max(xyxy[i, 1], xyxy[j, 1])
+            x2, y2 = min(xyxy[i, 2], xyxy[j, 2]), min(xyxy[i, 3], xyxy[j, 3])
+            inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+            union = (xyxy[i, 2] - xyxy[i, 0]) * (xyxy[i, 3] - xyxy[i, 1]) + \
+                    (xyxy[j, 2] - xyxy[j, 0]) * (xyxy[j, 3] - xyxy[j, 1]) - inter
+            if union > 0 and inter / union > iou_threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            keep.append(i)
+    return np.array(sorted(keep), dtype=np.int64)
@@ -0,0 +1,59 @@
+import numpy as np
+
+'''与 ultralytics Results/Boxes 接口兼容的轻量检测结果
+    用于合并多阶段推理结果、回放录制的检测数据、以及跨进程传递检测结果，
+    EventDetector、FramePool 可以像处理模型输出一样处理它们
+'''
+
+
+class HostArray(np.ndarray):
+    """支持 .cpu() / .numpy() 的numpy数组，模拟已在CPU上的tensor"""
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.view(np.ndarray)
+
+
+def _host(data, dtype, shape):
+    return np.ascontiguousarray(np.asarray(data, dtype=dtype).reshape(shape)).view(HostArray)
+
+
+class DetectionBoxes:
+    def __init__(self, xyxy, cls, conf):
+        self.xyxy = _host(xyxy, np.float32, (-1, 4))
+        self.cls = _host(cls, np.float32, (-1,))
+        self.conf = _host(conf, np.float32, (-1,))
+
+    def __len__(self):
+        return len(self.cls)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield DetectionBoxes(self.xyxy[i:i + 1], self.cls[i:i + 1], self.conf[i:i + 1])
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+
+class DetectionResult:
+    def __init__(self, boxes, names, orig_shape=None):
+        self.boxes = boxes
+        self.names = names
+        self.orig_shape = orig_shape
+
+    @classmethod
+    def from_arrays(cls, xyxy, cls_ids, conf, names, orig_shape=None):
+        return cls(DetectionBoxes(xyxy, cls_ids, conf), names, orig_shape)
+
+    @classmethod
+    def from_result(cls, result):
+        """把 ultralytics 的单个结果拷贝到CPU上的 DetectionResult"""
+        boxes = result.boxes
+        return cls.from_arrays(boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(), boxes.conf.cpu().numpy(),
+                               dict(result.names), getattr(result, 'orig_shape', None))
+
+    def to_arrays(self):
+        """返回 (xyxy, cls, conf) 三个numpy数组"""
+        return self.boxes.xyxy.numpy(), self.boxes.cls.numpy(), self.boxes.conf.numpy()
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from yolo_rtsp.DetectionResult import DetectionResult
+from yolo_rtsp.EventDetector import LeftEventDetector
+
+'''检测结果录制与回放
+    录制：逐帧记录模型输出 (类别, 置信度, xyxy, 帧时间)，按列存为压缩的 .npz
+        frame_ts(float64, 每帧)  frame_offsets(int32, 帧数+1)  cls(int16)  conf(float16)  xyxy(float32, N x 4)  names(json)
+        按固定帧数滚动写成分段文件 <path去掉.npz>.00000.npz、.00001.npz ...，写完一段即清空内存中的缓冲，
+        长时间运行时内存和每次写盘的耗时都不随录制时长增长
+        每段有自己的类别表：各结果按自身的 names 转成类别名再编号，级联中第一级（小模型）与第二级类别表不同也能正确记录
+    回放：不需要模型和GPU，把录制的检测结果按帧时间喂给事件检测器，用于回归测试和事件逻辑性能测试
+'''
+
+# 只比较状态切换类事件；pilot_in_hangar/skin 等逐帧状态和 plane_sliding_status=3(静止) 每帧都会输出，不作为事件
+TRANSITION_EVENTS = {
+    'plane_sliding_status': (1, 2),
+    'cabin_cover_state': (1, 2),
+    'pilot_boarding_status': (1, 2),
+}
+
+
+def _chunk_base(path):
+    return path[:-4] if path.endswith('.npz') else path
+
+
+def chunk_paths(path):
+    """录制文件 path 对应的全部分段，按顺序排列"""
+    base = _chunk_base(path)
+    directory = os.path.dirname(os.path.abspath(base))
+    prefix = os.path.basename(base) + '.'
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory)
+             if name.startswith(prefix) and name.endswith('.npz') and name[len(prefix):-4].isdigit()]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+class TraceRecorder:
+    """单个摄像头的检测结果录制器"""
+    def __init__(self, path, flush_frames=3600):
+        self.path = path
+        self.flush_frames = flush_frames  # 每段的帧数，写满即落盘并清空缓冲，防止进程退出时丢失全部数据
+        self.chunk_index = len(chunk_paths(path))  # 重启后接着已有分段编号，不覆盖之前的录制
+        self._reset()
+
+    def _reset(self):
+        self._name_ids = {}  # 本段的 类别名 -> 编号
+        self._frame_ts = []
+        self._offsets = [0]
+        self._cls, self._conf, self._xyxy = [], [], []
+
+    def _class_map(self, names):
+        """把结果自身的类别编号映射到本段类别表的编号"""
+        mapping = np.zeros(max(names) + 1 if names else 0, dtype=np.int16)
+        for class_id, name in names.items():
+            mapping[int(class_id)] = self._name_ids.setdefault(name, len(self._name_ids))
+        return mapping
+
+    def record(self, results, timestamp=None):
+        count = self._offsets[-1]
+        for result in results:
+            boxes = result.boxes
+            if len(boxes):
+                classes = boxes.cls.cpu().numpy().astype(np.int64)
+                self._cls.append(self._class_map(result.names)[classes])
+                self._conf.append(boxes.conf.cpu().numpy().astype(np.float16))
+                self._xyxy.append(boxes.xyxy.cpu().numpy().astype(np.float32))
+                count += len(boxes)
+        self._offsets.append(count)
+        self._frame_ts.append(time.time() if timestamp is None else timestamp)
+        if len(self._frame_ts) >= self.flush_frames:
+            self.save()
+
+    def save(self):
+        """把当前缓冲按列写成一个分段（先写临时文件再改名），然后清空缓冲"""
+        if not self._frame_ts:
+            return
+        base = _chunk_base(self.path)
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+        path = f"{base}.{self.chunk_index:05d}.npz"
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            frame_ts=np.array(self._frame_ts, dtype=np.float64),
+            frame_offsets=np.array(self._offsets, dtype=np.int32),
+            cls=np.concatenate(self._cls) if self._cls else np.zeros(0, dtype=np.int16),
+            conf=np.concatenate(self._conf) if self._conf else np.zeros(0, dtype=np.float16),
+            xyxy=np.concatenate(self._xyxy) if self._xyxy else np.zeros((0, 4), dtype=np.float32),
+            names=np.array(json.dumps({class_id: name for name, class_id in self._name_ids.items()})),
+        )
+        os.replace(tmp_path, path)
+        self.chunk_index += 1
+        self._reset()
+
+    close = save
+
+
+class DetectionTrace:
+    """已录制的检测结果"""
+    def __init__(self, frame_ts, frame_offsets, cls, conf, xyxy, names):
+        self.frame_ts = frame_ts
+        self.frame_offsets = frame_offsets
+        self.cls = cls
+        self.conf = conf
+        self.xyxy = xyxy
+        self.names = names
+
+    @classmethod
+    def load(cls, path):
+        """读取单个 .npz，或 TraceRecorder 录制路径对应的全部分段（各段类别表按类别名合并）"""
+        paths = [path] if os.path.isfile(path) else chunk_paths(path)
+        if not paths:
+            raise FileNotFoundError(f"No trace found for {path}")
+        name_ids = {}
+        frame_ts, offsets, classes, conf, xyxy = [], [np.zeros(1, dtype=np.int64)], [], [], []
+        for chunk_path in paths:
+            with np.load(chunk_path) as data:
+                names = {int(class_id): name for class_id, name in json.loads(str(data['names'])).items()}
+                mapping = np.zeros(max(names) + 1 if names else 0, dtype=np.int16)
+                for class_id, name in names.items():
+                    mapping[class_id] = name_ids.setdefault(name, len(name_ids))
+                frame_ts.append(data['frame_ts'])
+                offsets.append(data['frame_offsets'][1:].astype(np.int64) + offsets[-1][-1])
+                classes.append(mapping[data['cls'].astype(np.int64)])
+                conf.append(data['conf'])
+                xyxy.append(data['xyxy'])
+        return cls(np.concatenate(frame_ts), np.concatenate(offsets), np.concatenate(classes), np.concatenate(conf),
+                   np.concatenate(xyxy), {class_id: name for name, class_id in name_ids.items()})
+
+    def __len__(self):
+        return len(self.frame_ts)
+
+    def results(self):
+        """预先构建每帧的结果对象，回放计时只包含事件逻辑"""
+        frames = []
+        for index in range(len(self)):
+            start, end = self.frame_offsets[index], self.frame_offsets[index + 1]
+            frames.append((float(self.frame_ts[index]),
+                           [DetectionResult.from_arrays(self.xyxy[start:end], self.cls[start:end],
+                                                        self.conf[start:end], self.names)]))
+        return frames
+
+
+def extract_events(frame_index, event_status):
+    """从一帧的事件状态中取出状态切换事件"""
+    return [[frame_index, field, event_status[field]] for field, values in TRANSITION_EVENTS.items()
+            if event_status.get(field) in values]
+
+
+def replay(frames, detector_factory=LeftEventDetector, quiet=True):
+    """把检测结果按顺序喂给新的检测器，返回 (事件列表, 每秒处理帧数)
+
+    Args:
+        frames: [(帧时间, results)]，可由 DetectionTrace.results() 得到
+        quiet: 回放时关闭检测器的INFO日志，否则日志开销会淹没事件逻辑本身
+    """
+    logger = logging.getLogger('yolo_rtsp')
+    level = logger.level
+    if quiet:
+        logger.setLevel(logging.WARNING)
+    try:
+        detector = detector_factory()
+        events = []
+        start = time.perf_counter()
+        for frame_index, (timestamp, results) in enumerate(frames):
+            event_status = detector.detect_events(results, frame_index == 0, current_time=timestamp)
+            if any(value in TRANSITION_EVENTS.get(field, ()) for field, value in event_status.items()):
+                events.extend(extract_events(frame_index, event_status))
+        elapsed = time.perf_counter() - start
+    finally:
+        logger.setLevel(level)
+    return events, len(frames) / elapsed if elapsed > 0 else float('inf')
@@ -0,0 +1,135 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+from common import yolo_logger
+from yolo_rtsp.EventDetector import BOX_LABELS
+
+'''事件检测器状态快照（二进制，一般不超过200字节）
+    头部   magic(4s) version(B) saved_at(d)
+    状态   last_pilot_in_cockpit(b) last_plane_in_hangar(?) last_cockpit_status(b) plane_is_moving(?)
+           last_aviator_detected(?) static_frame_count(I) moving_frame_count(I)
+    检测框 前一帧各槽位是否存在(B位图) + 槽位坐标(int32 x 槽位数 x 4)
+    事件时间 数量(B) + 每项 [名称长度(B) 名称 时间(d)]
+'''
+
+MAGIC = b'EDS1'
+VERSION = 1
+_HEADER = struct.Struct('<4sBd')
+_STATE = struct.Struct('<b?b??II')
+_BOXES = struct.Struct(f'<B{len(BOX_LABELS) * 4}i')
+
+
+def pack_state(detector, saved_at=None):
+    """把检测器状态编码为二进制"""
+    presence = 0
+    coords = np.zeros((len(BOX_LABELS), 4), dtype=np.int32)
+    for index, label in enumerate(BOX_LABELS):
+        box = detector.previous_boxes[label]
+        if box is not None:
+            presence |= 1 << index
+            coords[index] = box
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, time.time() if saved_at is None else saved_at),
+        _STATE.pack(int(detector.last_pilot_in_cockpit), bool(detector.last_plane_in_hangar),
+                    int(detector.last_cockpit_status), bool(detector.plane_is_moving),
+                    bool(detector.last_aviator_detected), detector.static_frame_count, detector.moving_frame_count),
+        _BOXES.pack(presence, *coords.ravel().tolist()),
+        struct.pack('<B', len(detector.last_event_time)),
+    ]
+    for name, event_time in detector.last_event_time.items():
+        encoded = name.encode('utf-8')
+        parts.append(struct.pack(f'<B{len(encoded)}sd', len(encoded), encoded, event_time))
+    return b''.join(parts)
+
+
+def unpack_state(data, detector):
+    """把二进制状态写回检测器，返回快照时间"""
+    magic, version, saved_at = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported detector state: {magic!r} v{version}")
+    offset = _HEADER.size
+    (last_pilot_in_cockpit, last_plane_in_hangar, last_cockpit_status, plane_is_moving,
+     last_aviator_detected, static_frame_count, moving_frame_count) = _STATE.unpack_from(data, offset)
+    offset += _STATE.size
+    presence, *coords = _BOXES.unpack_from(data, offset)
+    offset += _BOXES.size
+    (count,) = struct.unpack_from('<B', data, offset)
+    offset += 1
+    last_event_time = {}
+    for _ in range(count):
+        (length,) = struct.unpack_from('<B', data, offset)
+        name, event_time = struct.unpack_from(f'<{length}sd', data, offset + 1)
+        offset += 1 + length + 8
+        last_event_time[name.decode('utf-8')] = event_time
+
+    detector.last_pilot_in_cockpit = last_pilot_in_cockpit
+    detector.last_plane_in_hangar = last_plane_in_hangar
+    detector.last_cockpit_status = last_cockpit_status
+    detector.plane_is_moving = plane_is_moving
+    detector.last_aviator_detected = last_aviator_detected
+    detector.static_frame_count = static_frame_count
+    detector.moving_frame_count = moving_frame_count
+    detector.last_event_time = last_event_time
+    # 恢复前一帧检测框：写入当前槽位后交换，当前帧保持为空
+    coords = np.array(coords, dtype=np.int64).reshape(len(BOX_LABELS), 4)
+    for index, label in enumerate(BOX_LABELS):
+        if presence & (1 << index):
+            detector.set_box(label, coords[index])
+    detector.swap_boxes()
+    return saved_at
+
+
+class DetectorCheckpoint:
+    """定期把单个摄像头的检测器状态原子写入文件，启动时在快照足够新的情况下恢复"""
+    def __init__(self, path, interval=5.0, max_age=300.0):
+        self.path = path
+        self.interval = interval  # 快照间隔（秒）
+        self.max_age = max_age    # 超过该时长的快照不再恢复（秒）
+        self.last_save = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def save(self, detector):
+        """原子写入：先写临时文件并fsync，再rename覆盖"""
+        data = pack_state(detector)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        self.last_save = time.monotonic()
+
+    def maybe_save(self, detector):
+        """距上次快照超过间隔时保存，返回是否保存"""
+        if time.monotonic() - self.last_save < self.interval:
+            return False
+        try:
+            self.save(detector)
+            return True
+        except OSError as e:
+            yolo_logger.error(f"保存检测器状态失败 {self.path}: {e}")
+            return False
+
+    def restore(self, detector):
+        """恢复检测器状态，成功返回True；快照不存在、过期或损坏时返回False"""
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return False
+        try:
+            state_copy = type(detector)()
+            saved_at = unpack_state(data, state_copy)
+        except (ValueError, struct.error) as e:
+            yolo_logger.warning(f"检测器状态文件损坏，忽略 {self.path}: {e}")
+            return False
+        age = time.time() - saved_at
+        if age > self.max_age or age < 0:
+            yolo_logger.info(f"检测器状态已过期（{age:.0f} 秒），重新开始: {self.path}")
+            return False
+        unpack_state(data, detector)
+        yolo_logger.info(f"已恢复检测器状态（{age:.1f} 秒前）: {self.path}")
+        return True
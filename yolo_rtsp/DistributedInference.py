@@ -0,0 +1,482 @@
+import argparse
+import functools
+import heapq
+import json
+import os
+import queue
+import random
+import struct
+import sys
+import time
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 将父目录添加到Python路径中
+sys.path.append(parent_dir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+
+from MQProject.message import Message
+from common import yolo_logger
+from yolo_rtsp.DetectionResult import DetectionResult
+from yolo_rtsp.DetectionTrace import extract_events
+from yolo_rtsp.DetectorCheckpoint import DetectorCheckpoint
+from yolo_rtsp.EventDetector import LeftEventDetector
+from yolo_rtsp.FrameQualityGate import FrameQualityGate
+
+'''分布式推理模式：采集、推理、事件逻辑拆分到不同进程/节点，推理能力可按需横向扩展
+    capture  采集节点：按间隔采样，JPEG压缩后发布到 frames 工作队列（帧头含摄像头编号、采集时间、帧序号）
+    worker   推理节点：按 prefetch 限制预取帧数，推理后把检测结果发布到 detections 队列，多个节点竞争消费
+    events   事件节点：按摄像头、按帧序号重排检测结果后依次送入 EventDetector，保证状态按采集顺序更新，发布事件
+    local    本机验证：替身broker + 多个推理进程（随机耗时，结果乱序返回），事件序列应与单进程回放一致
+
+    python DistributedInference.py capture --camera 1 --url rtsp://... --amqp-host 10.0.0.5
+    python DistributedInference.py worker --model yolo11n.pt --prefetch 4 --amqp-host 10.0.0.5
+    python DistributedInference.py events --amqp-host 10.0.0.5
+    python DistributedInference.py local --workers 3 --cameras 2
+'''
+
+FRAME_QUEUE = 'frames'
+DETECTION_QUEUE = 'detections'
+
+# 帧消息：采集时间(d) 帧序号(Q) 原始宽高(HH) 摄像头编号长度(H) + 摄像头编号 + JPEG
+_FRAME_HEADER = struct.Struct('!dQHHH')
+# 检测结果消息：JSON头长度(I) + JSON头 + xyxy(float32) + cls(float32) + conf(float32)
+_DETECTION_HEADER = struct.Struct('!I')
+
+
+def encode_frame(camera_id, capture_time, frame_seq, image, quality=80, orig_shape=None):
+    """orig_shape 为缩放前的 (高, 宽)，推理节点据此把检测框换算回原始分辨率，事件逻辑的像素阈值保持不变"""
+    ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encode failed")
+    height, width = orig_shape or image.shape[:2]
+    camera = str(camera_id).encode('utf-8')
+    return _FRAME_HEADER.pack(capture_time, frame_seq, width, height, len(camera)) + camera + jpeg.tobytes()
+
+
+def decode_frame(body):
+    """返回 (camera_id, capture_time, frame_seq, image, orig_shape)"""
+    capture_time, frame_seq, width, height, camera_len = _FRAME_HEADER.unpack_from(body)
+    offset = _FRAME_HEADER.size
+    camera_id = bytes(body[offset:offset + camera_len]).decode('utf-8')
+    jpeg = np.frombuffer(body, dtype=np.uint8, offset=offset + camera_len)
+    image = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"JPEG decode failed for camera {camera_id} frame {frame_seq}")
+    return camera_id, capture_time, frame_seq, image, (height, width)
+
+
+def encode_detections(camera_id, capture_time, frame_seq, result, worker_id=''):
+    xyxy, cls, conf = result.to_arrays()
+    header = json.dumps({'camera_id': camera_id, 'capture_time': capture_time, 'frame_seq': frame_seq,
+                         'count': len(cls), 'names': result.names, 'orig_shape': result.orig_shape,
+                         'worker': worker_id, 'sent_time': time.time()}).encode('utf-8')
+    return b''.join([_DETECTION_HEADER.pack(len(header)), header, xyxy.tobytes(), cls.tobytes(), conf.tobytes()])
+
+
+def decode_detections(body):
+    """返回 (元信息字典, DetectionResult)"""
+    header_len, = _DETECTION_HEADER.unpack_from(body)
+    offset = _DETECTION_HEADER.size
+    meta = json.loads(bytes(body[offset:offset + header_len]))
+    offset += header_len
+    count = meta['count']
+    xyxy = np.frombuffer(body, dtype=np.float32, count=count * 4, offset=offset)
+    cls = np.frombuffer(body, dtype=np.float32, count=count, offset=offset + count * 16)
+    conf = np.frombuffer(body, dtype=np.float32, count=count, offset=offset + count * 20)
+    names = {int(class_id): name for class_id, name in meta['names'].items()}
+    orig_shape = tuple(meta['orig_shape']) if meta['orig_shape'] else None
+    return meta, DetectionResult.from_arrays(xyxy, cls, conf, names, orig_shape)
+
+
+class AmqpBus:
+    """RabbitMQ 工作队列：frames 队列限长并丢弃最旧的帧，推理跟不上时不会积压过期画面"""
+    def __init__(self, host='localhost', port=5672, username='guest', password='guest', max_frames=1000):
+        import pika
+        self.pika = pika
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(
+            host=host, port=port, credentials=pika.PlainCredentials(username, password), heartbeat=60))
+        self.channel = self.connection.channel()
+        self.channel.queue_declare(queue=FRAME_QUEUE, arguments={'x-max-length': max_frames,
+                                                                 'x-overflow': 'drop-head'})
+        self.channel.queue_declare(queue=DETECTION_QUEUE)
+
+    def publish(self, queue_name, body):
+        self.channel.basic_publish(exchange='', routing_key=queue_name, body=body)
+
+    def consume(self, queue_name, handler, prefetch=1, stop_event=None, on_idle=None, idle_timeout=0.5,
+                deferred_ack=False):
+        """手动确认：handler 处理完（结果已发布）才ack，节点崩溃时未确认的帧会重新投递给其他节点
+        deferred_ack=True 时调用 handler(body, ack)，由 handler 在消息真正处理完后调用 ack()（须在本线程中）
+        handler 抛出异常（如损坏的帧）时记录日志并 nack 不重新入队，避免同一条消息轮流打垮所有节点"""
+        self.channel.basic_qos(prefetch_count=prefetch)
+        for method, properties, body in self.channel.consume(queue_name, inactivity_timeout=idle_timeout):
+            if stop_event is not None and stop_event.is_set():
+                break
+            if method is not None:
+                ack = functools.partial(self.channel.basic_ack, method.delivery_tag)
+                try:
+                    if deferred_ack:
+                        handler(body, ack)
+                    else:
+                        handler(body)
+                        ack()
+                except Exception as e:
+                    yolo_logger.error(f"处理 {queue_name} 消息失败，已丢弃: {e}")
+                    self.channel.basic_nack(method.delivery_tag, requeue=False)
+            if on_idle is not None:
+                on_idle()
+        self.channel.cancel()
+
+    def close(self):
+        if self.connection.is_open:
+            self.connection.close()
+
+
+def _no_ack():
+    pass
+
+
+class LocalBus:
+    """替身broker：multiprocessing.Manager 的队列，可在本机多个进程间传递（用于测试）"""
+    def __init__(self, manager):
+        self.queues = {FRAME_QUEUE: manager.Queue(), DETECTION_QUEUE: manager.Queue()}
+
+    def publish(self, queue_name, body):
+        self.queues[queue_name].put(body)
+
+    def consume(self, queue_name, handler, prefetch=1, stop_event=None, on_idle=None, idle_timeout=0.5,
+                deferred_ack=False):
+        """一次最多预取 prefetch 条，取空后再处理；没有确认机制，ack 为空操作"""
+        source = self.queues[queue_name]
+        while stop_event is None or not stop_event.is_set():
+            batch = []
+            try:
+                batch.append(source.get(timeout=idle_timeout))
+                while len(batch) < prefetch:
+                    batch.append(source.get_nowait())
+            except queue.Empty:
+                pass
+            for body in batch:
+                try:
+                    if deferred_ack:
+                        handler(body, _no_ack)
+                    else:
+                        handler(body)
+                except Exception as e:
+                    yolo_logger.error(f"处理 {queue_name} 消息失败，已丢弃: {e}")
+            if on_idle is not None:
+                on_idle()
+
+    def close(self):
+        pass
+
+
+class CaptureNode:
+    """采集节点：只解码最新帧并按间隔采样，不加载模型"""
+    def __init__(self, camera_id, rtsp_url, bus, frame_interval=1.0, max_width=1280, quality=80, quality_gate=None):
+        self.camera_id = camera_id
+        self.rtsp_url = rtsp_url
+        self.bus = bus
+        self.frame_interval = frame_interval
+        self.max_width = max_width
+        self.quality = quality
+        self.quality_gate = quality_gate  # FrameQualityGate，不合格的帧不发布，既省推理也省带宽
+        self.frame_seq = 0
+
+    def publish(self, image, capture_time):
+        orig_shape = image.shape[:2]
+        if self.max_width and image.shape[1] > self.max_width:
+            scale = self.max_width / image.shape[1]
+            image = cv2.resize(image, (self.max_width, int(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        self.frame_seq += 1
+        self.bus.publish(FRAME_QUEUE, encode_frame(self.camera_id, capture_time, self.frame_seq, image, self.quality,
+                                                   orig_shape))
+
+    def run(self, stop_event=None):
+        cap = cv2.VideoCapture(self.rtsp_url)
+        last_process_time = 0.0
+        next_check_time = 0.0
+        try:
+            while cap.isOpened() and (stop_event is None or not stop_event.is_set()):
+                # 间隔内只grab不解码，到采样时刻才retrieve
+                if not cap.grab():
+                    yolo_logger.warning(f"摄像头 {self.camera_id} 读取失败")
+                    break
+                now = time.time()
+                if now - last_process_time < self.frame_interval or now < next_check_time:
+                    continue
+                ret, frame = cap.retrieve()
+                if ret and self.quality_gate is not None and not self.quality_gate.check(frame)[0]:
+                    # 不合格的帧跳过，稍后重新检查，不必等满采样间隔
+                    next_check_time = now + min(self.quality_gate.retry_interval, self.frame_interval)
+                    continue
+                if ret:
+                    last_process_time = now
+                    self.publish(frame, now)
+        finally:
+            cap.release()
+
+
+class InferenceWorker:
+    """推理节点：infer(image, meta) 返回模型结果列表，默认按 model_path 加载 YOLO"""
+    def __init__(self, bus, model_path=None, infer=None, device=0, worker_id=None, prefetch=4):
+        self.bus = bus
+        self.model_path = model_path
+        self.device = device
+        self.worker_id = worker_id or f"{os.uname().nodename}-{os.getpid()}"
+        self.prefetch = prefetch
+        self.infer = infer or self._infer_yolo
+        self.model = None
+        self.processed = 0
+
+    def _infer_yolo(self, image, meta):
+        if self.model is None:
+            from ultralytics import YOLO
+            self.model = YOLO(self.model_path)
+        return self.model(image, device=self.device, verbose=False)
+
+    def handle(self, body):
+        camera_id, capture_time, frame_seq, image, orig_shape = decode_frame(body)
+        meta = {'camera_id': camera_id, 'capture_time': capture_time, 'frame_seq': frame_seq}
+        results = self.infer(image, meta)
+        result = results[0] if isinstance(results[0], DetectionResult) else DetectionResult.from_result(results[0])
+        if orig_shape != image.shape[:2]:
+            # 采集节点缩放过，检测框换算回原始分辨率
+            xyxy, cls, conf = result.to_arrays()
+            scale = np.array([orig_shape[1] / image.shape[1], orig_shape[0] / image.shape[0]] * 2, dtype=np.float32)
+            result = DetectionResult.from_arrays(xyxy * scale, cls, conf, result.names, orig_shape)
+        self.bus.publish(DETECTION_QUEUE, encode_detections(camera_id, capture_time, frame_seq, result, self.worker_id))
+        self.processed += 1
+
+    def run(self, stop_event=None):
+        yolo_logger.info(f"推理节点 {self.worker_id} 启动，prefetch={self.prefetch}")
+        self.bus.consume(FRAME_QUEUE, self.handle, self.prefetch, stop_event)
+
+
+class _CameraStream:
+    """事件节点中单个摄像头的状态：检测器 + 按帧序号的重排缓冲"""
+    def __init__(self, camera_id, checkpoint_dir):
+        self.detector = LeftEventDetector()
+        self.message = Message(camera_id=camera_id)
+        self.checkpoint = None
+        self.is_first_detect = True
+        if checkpoint_dir:
+            self.checkpoint = DetectorCheckpoint(os.path.join(checkpoint_dir, f"{camera_id}.state"))
+            self.is_first_detect = not self.checkpoint.restore(self.detector)
+        self.next_seq = None
+        self.last_capture_time = 0.0
+        self.pending = []        # 堆 [(frame_seq, 到达时刻, capture_time, results, ack)]
+        self.stats = {'processed': 0, 'late': 0, 'skipped': 0}
+
+
+class OrderedEventStage:
+    """按摄像头重排检测结果：缺失的帧最多等待 max_delay 秒或 window 帧，之后跳过，晚到的结果丢弃"""
+    def __init__(self, transport=None, event_store=None, max_delay=2.0, window=32, checkpoint_dir=None,
+                 on_event=None):
+        self.transport = transport
+        self.event_store = event_store
+        self.max_delay = max_delay
+        self.window = window
+        self.checkpoint_dir = checkpoint_dir
+        self.on_event = on_event  # 回调 on_event(camera_id, frame_seq, event_status)
+        self.streams = {}
+
+    def handle(self, body, ack=_no_ack):
+        """ack 在该检测结果送入事件检测（或作为迟到结果丢弃）后才调用，事件节点崩溃时缓冲中的结果会重新投递"""
+        meta, result = decode_detections(body)
+        camera_id = meta['camera_id']
+        stream = self.streams.get(camera_id)
+        if stream is None:
+            stream = self.streams[camera_id] = _CameraStream(camera_id, self.checkpoint_dir)
+        frame_seq = meta['frame_seq']
+        if stream.next_seq is not None and frame_seq < stream.next_seq:
+            if meta['capture_time'] > stream.last_capture_time + self.max_delay:
+                # 采集节点重启后序号从头开始
+                yolo_logger.info(f"摄像头 {camera_id} 帧序号重置 {stream.next_seq} -> {frame_seq}")
+                self._drain(camera_id, stream, force=True)
+                stream.next_seq = frame_seq
+            else:
+                stream.stats['late'] += 1
+                ack()
+                return
+        heapq.heappush(stream.pending, (frame_seq, time.monotonic(), meta['capture_time'], [result], ack))
+        self._drain(camera_id, stream)
+
+    def flush_expired(self, force=False):
+        """空闲时调用，释放等待超时的帧；force=True 时不再等待缺失的帧"""
+        for camera_id, stream in self.streams.items():
+            self._drain(camera_id, stream, force)
+
+    def _drain(self, camera_id, stream, force=False):
+        now = time.monotonic()
+        while stream.pending:
+            frame_seq, arrived, capture_time, results, ack = stream.pending[0]
+            if stream.next_seq is None:
+                # 第一帧也等待一个窗口，防止乱序到达时把更早的帧当作迟到
+                if not force and now - arrived < self.max_delay and len(stream.pending) < self.window:
+                    return
+                stream.next_seq = frame_seq
+            if frame_seq != stream.next_seq:
+                if not force and now - arrived < self.max_delay and len(stream.pending) < self.window:
+                    return
+                stream.stats['skipped'] += frame_seq - stream.next_seq
+            heapq.heappop(stream.pending)
+            stream.next_seq = frame_seq + 1
+            try:
+                self._feed(camera_id, stream, frame_seq, capture_time, results)
+            except Exception as e:
+                yolo_logger.error(f"摄像头 {camera_id} 帧 {frame_seq} 事件处理失败: {e}")
+            ack()
+
+    def _feed(self, camera_id, stream, frame_seq, capture_time, results):
+        stream.last_capture_time = capture_time
+        message = stream.message
+        message.stamp_capture(capture_time, None, frame_seq)
+        event_status = stream.detector.detect_events(results, stream.is_first_detect, message, current_time=capture_time)
+        stream.is_first_detect = False
+        stream.stats['processed'] += 1
+        if stream.checkpoint is not None:
+            stream.checkpoint.maybe_save(stream.detector)
+        if self.on_event is not None:
+            self.on_event(camera_id, frame_seq, event_status)
+        if any(value != 0 for value in event_status.values()):
+            message.message_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+            if self.transport is not None:
+                self.transport.send_event(message)
+            if self.event_store is not None:
+                self.event_store.add(message)
+
+    def run(self, bus, stop_event=None):
+        # 缓冲中的结果未确认，预取数须大于重排窗口，否则等待缺失帧时收不到新消息
+        bus.consume(DETECTION_QUEUE, self.handle, min(max(64, self.window * 2), 65535), stop_event, on_idle=self.flush_expired,
+                    deferred_ack=True)
+
+
+# ---------------------------------------------------------------- 本机多进程验证
+
+class ScenarioModel:
+    """替身模型：按帧序号返回合成场景的检测结果，并加入随机耗时使结果乱序返回"""
+    def __init__(self, jitter_ms=20.0, seed=None):
+        from yolo_rtsp.replay_benchmark import synthetic_scenario
+        self.frames = synthetic_scenario()
+        self.jitter_ms = jitter_ms
+        self.rng = random.Random(seed)
+
+    def __call__(self, image, meta):
+        time.sleep(self.rng.random() * self.jitter_ms / 1000)
+        return self.frames[meta['frame_seq'] - 1][1]
+
+
+def _run_local_worker(bus, stop_event, index, prefetch, jitter_ms):
+    InferenceWorker(bus, infer=ScenarioModel(jitter_ms, seed=index), worker_id=f"local-{index}",
+                    prefetch=prefetch).run(stop_event)
+
+
+def run_local(workers=3, cameras=2, prefetch=4, jitter_ms=20.0):
+    """合成场景经替身broker和多个推理进程处理，比较每个摄像头的事件序列与 SCENARIO_EVENTS"""
+    import multiprocessing
+    from yolo_rtsp.replay_benchmark import SCENARIO_EVENTS, synthetic_scenario
+
+    manager = multiprocessing.Manager()
+    bus = LocalBus(manager)
+    stop_event = manager.Event()
+    processes = [multiprocessing.Process(target=_run_local_worker, args=(bus, stop_event, index, prefetch, jitter_ms),
+                                         daemon=True) for index in range(workers)]
+    for process in processes:
+        process.start()
+
+    events = {}
+
+    def on_event(camera_id, frame_seq, event_status):
+        events.setdefault(camera_id, []).extend(extract_events(frame_seq - 1, event_status))
+
+    # 乱序只来自推理耗时抖动，等待时间按抖动放宽
+    stage = OrderedEventStage(max_delay=max(1.0, jitter_ms / 1000 * prefetch * 4), window=10 ** 6, on_event=on_event)
+    scenario = synthetic_scenario()
+    image = np.random.randint(0, 255, (72, 128, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    nodes = [CaptureNode(str(camera), None, bus) for camera in range(1, cameras + 1)]
+    for timestamp, _ in scenario:
+        for node in nodes:
+            node.publish(image, timestamp)
+    total = len(scenario) * cameras
+    detections = bus.queues[DETECTION_QUEUE]
+    deadline = time.monotonic() + 60
+    while sum(stream.stats['processed'] + stream.stats['skipped'] for stream in stage.streams.values()) < total \
+            and time.monotonic() < deadline:
+        try:
+            stage.handle(detections.get(timeout=0.1))
+        except queue.Empty:
+            stage.flush_expired()
+    stage.flush_expired(force=True)
+    elapsed = time.perf_counter() - start
+    stop_event.set()
+    for process in processes:
+        process.join(timeout=5)
+
+    ok = True
+    for node in nodes:
+        stream = stage.streams.get(node.camera_id)
+        actual = events.get(node.camera_id, [])
+        match = actual == SCENARIO_EVENTS
+        ok = ok and match
+        print(f"camera {node.camera_id}: {'OK' if match else 'MISMATCH'} {len(actual)} events | "
+              f"{stream.stats if stream else 'no results'}")
+        if not match:
+            print(f"  expected: {SCENARIO_EVENTS}")
+            print(f"  actual:   {actual}")
+    print(f"{total} frames through {workers} workers in {elapsed:.2f} s ({total / elapsed:.0f} frames/s)")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='分布式推理：采集节点 / 推理节点 / 事件节点')
+    parser.add_argument('role', choices=['capture', 'worker', 'events', 'local'])
+    parser.add_argument('--amqp-host', default='localhost')
+    parser.add_argument('--camera', help='capture: 摄像头编号')
+    parser.add_argument('--url', help='capture: RTSP地址')
+    parser.add_argument('--interval', type=float, default=1.0, help='capture: 采样间隔（秒）')
+    parser.add_argument('--max-width', type=int, default=1280, help='capture: 发布前缩放到的最大宽度')
+    parser.add_argument('--quality', type=int, default=80, help='capture: JPEG质量')
+    parser.add_argument('--no-quality-gate', action='store_true', help='capture: 不做帧质量检查，所有采样帧都发布')
+    parser.add_argument('--model', default=os.path.join(parent_dir, 'yolo_rtsp', 'yolo11n.pt'), help='worker: 模型路径')
+    parser.add_argument('--prefetch', type=int, default=4, help='worker: 每个推理节点最多预取的帧数')
+    parser.add_argument('--worker-index', type=int, help='worker: 按 ResourceManager 分配绑核的推理进程序号')
+    parser.add_argument('--workers', type=int, default=3, help='local: 推理进程数；worker: 本机推理进程总数（绑核用）')
+    parser.add_argument('--cameras', type=int, default=2, help='local: 摄像头数')
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help='local: 替身模型的随机耗时上限')
+    args = parser.parse_args()
+
+    if args.role == 'local':
+        sys.exit(0 if run_local(args.workers, args.cameras, args.prefetch, args.jitter_ms) else 1)
+
+    bus = AmqpBus(args.amqp_host)
+    try:
+        if args.role == 'capture':
+            if not args.camera or not args.url:
+                parser.error('capture requires --camera and --url')
+            quality_gate = None if args.no_quality_gate else FrameQualityGate(args.camera)
+            CaptureNode(args.camera, args.url, bus, args.interval, args.max_width, args.quality, quality_gate).run()
+        elif args.role == 'worker':
+            if args.worker_index is not None:
+                from yolo_rtsp.ResourceManager import configure_inference_worker, plan_allocation
+                configure_inference_worker(args.worker_index, plan_allocation(1, args.workers))
+            InferenceWorker(bus, args.model, prefetch=args.prefetch).run()
+        else:
+            from MQProject.event_store import EventStore
+            from MQProject.mq import RabbitMQ
+            from MQProject.priority import PriorityPublisher
+            event_store = EventStore(os.path.join(parent_dir, 'video', 'events.db'))
+            transport = PriorityPublisher.for_transport(
+                RabbitMQ(args.amqp_host), critical_factory=lambda: RabbitMQ(args.amqp_host, shared=False))
+            try:
+                OrderedEventStage(transport, event_store,
+                                  checkpoint_dir=os.path.join(parent_dir, 'video', 'state')).run(bus)
+            finally:
+                event_store.close()
+    finally:
+        bus.close()
@@ -1,4 +1,5 @@
 from common import yolo_logger
+from MQProject.message import AircraftMessage, PersonnelMessage, VehicleMessage, SafetyMessage
 import numpy as np
 import time
 
@@ -11,25 +12,33 @@ import time
     'aviator'          飞行员
 '''
 
+# 事件检测关心的类别，每个类别在检测框缓冲区中占一个固定槽位
+BOX_LABELS = ('cabin_cover_on', 'cabin_cover_off', 'red_off', 'red_on', 'aviator')
+PLANE_PARTS = ('cabin_cover_on', 'cabin_cover_off', 'red_off', 'red_on')
+
 # 定义事件检测基类
 class EventDetector:
     """基础事件检测类，提供通用的事件检测功能"""
     def __init__(self):
+        # 检测框预分配为两组槽位（当前帧/前一帧），每帧交换并原地复用，不再分配新的字典和数组
+        self.box_slots = {label: index for index, label in enumerate(BOX_LABELS)}
+        self._box_buffers = np.zeros((2, len(BOX_LABELS), 4), dtype=np.int64)
+        self._box_views = [[self._box_buffers[side, index] for index in range(len(BOX_LABELS))]
+                           for side in range(2)]
+        self._current_side = 0
         # 存储前一帧的检测框
-        self.previous_boxes = {
-            'cabin_cover_on': None,
-            'cabin_cover_off': None,
-            'red_off': None,
-            'red_on': None,
-            'aviator': None
-        }
+        self.previous_boxes = {label: None for label in BOX_LABELS}
         # 存储当前帧的检测框
-        self.current_boxes = {
-            'cabin_cover_on': None,
-            'cabin_cover_off': None,
-            'red_off': None,
-            'red_on': None,
-            'aviator': None
+        self.current_boxes = {label: None for label in BOX_LABELS}
+        # 事件状态字典，每帧原地清零后复用
+        self.event_status = {
+            'plane_sliding_status': 0,  # 0=无效, 1=入库, 2=出库, 3=静止
+            'pilot_boarding_status': 0,  # 0=无效, 1=登机, 2=下机
+            'pilot_in_hangar': 0,        # 0=不在机库, 1=在机库
+            'cabin_cover_state': 0,       # 0=无效, 1=打开, 2=关闭
+            'skin': 0,                   # 0=无效, 1=有, 2=无
+            'cabin_occupied': 0,
+            'zone_changed': 0,           # 0=无变化, 1=有区域的占用状态变化（设置了 zone_map 时）
         }
 
         # 状态标志
@@ -42,6 +51,11 @@ class EventDetector:
         self.movement_threshold = 50  # 移动阈值
         self.last_event_time = {}  # 记录每个事件的最后一次检测时间
         self.last_aviator_detected = False  # 记录上一帧是否检测到飞行员
+        # 可选的固定区域（ZoneMap），设置后每帧统计各区域占用并驱动 area_occupied / vehicle 等字段，
+        # 基础 Message 没有这些字段，占用情况写入 message.zones；任一区域有/无目标发生变化时 zone_changed=1，触发发布
+        self.zone_map = None
+        self.zone_occupancy = None
+        self.last_zone_occupied = None  # 上一帧各区域是否有目标
 
     def calculate_iou(self, box1, box2):
         """计算两个框的交并比（IoU）"""
@@ -86,7 +100,39 @@ class EventDetector:
     def has_plane_parts(self, boxes_dict):
         """检查是否存在飞机部件
         飞机是否在机库"""
-        return any(boxes_dict[part] is not None for part in ['cabin_cover_on', 'cabin_cover_off', 'red_off', 'red_on'])
+        return any(boxes_dict[part] is not None for part in PLANE_PARTS)
+
+    def set_box(self, label, xyxy):
+        """把检测框写入当前帧对应的槽位"""
+        view = self._box_views[self._current_side][self.box_slots[label]]
+        np.copyto(view, xyxy, casting='unsafe')  # 与astype(int)一样向零取整
+        self.current_boxes[label] = view
+
+    def update_boxes(self, results):
+        """从YOLO结果更新当前帧的检测框，每个结果只做一次GPU->CPU拷贝"""
+        for result in results:
+            boxes = result.boxes
+            if len(boxes) == 0:
+                continue
+            classes = boxes.cls.cpu().numpy()
+            xyxy = boxes.xyxy.cpu().numpy()
+            for class_id, box in zip(classes, xyxy):
+                label = result.names[int(class_id)]
+                if label in self.current_boxes:
+                    self.set_box(label, box)
+
+    def swap_boxes(self):
+        """当前帧变为前一帧，并原地清空新的当前帧"""
+        self.previous_boxes, self.current_boxes = self.current_boxes, self.previous_boxes
+        self._current_side = 1 - self._current_side
+        for label in self.current_boxes:
+            self.current_boxes[label] = None
+
+    def reset_event_status(self):
+        """原地清零事件状态字典"""
+        for key in self.event_status:
+            self.event_status[key] = 0
+        return self.event_status
 
     def is_aviator_outside_cockpit(self, aviator_box, cabin_box):
         """判断飞行员是否完全在座舱外"""
@@ -145,35 +191,31 @@ class EventDetector:
             return 2  # 座舱盖关闭
         return 0  # 无效状态
 
-    def detect_events(self, results, is_first_detect, message=None):
+    def detect_events(self, results, is_first_detect, message=None, current_time=None):
         """基类的事件检测方法，子类应该重写此方法"""
         raise NotImplementedError("子类必须实现detect_events方法")
 
 
 class LeftEventDetector(EventDetector):
     """左机库事件检测器"""
-    def detect_events(self, results, is_first_detect, message=None):
-        """检测所有事件并更新消息对象"""
+    def detect_events(self, results, is_first_detect, message=None, current_time=None):
+        """检测所有事件并更新消息对象；返回的事件状态字典每帧复用，需要保留时请复制
+        current_time 默认取当前时间，回放录制数据时传入帧时间"""
         # 更新当前帧的检测框
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                class_id = int(box.cls[0].item())
-                label = result.names[class_id]
-                if label in self.current_boxes:
-                    self.current_boxes[label] = box.xyxy[0].cpu().numpy().astype(int)
-        
-        current_time = time.time()
+        self.update_boxes(results)
+        if current_time is None:
+            current_time = time.time()
 
         # 初始化事件状态字典
-        event_status = {
-            'plane_sliding_status': 0,  # 0=无效, 1=入库, 2=出库, 3=静止
-            'pilot_boarding_status': 0,  # 0=无效, 1=登机, 2=下机
-            'pilot_in_hangar': 0,        # 0=不在机库, 1=在机库
-            'cabin_cover_state': 0,       # 0=无效, 1=打开, 2=关闭
-            'skin': 0,                   # 0=无效, 1=有, 2=无
-            'cabin_occupied': 0,         
-        }
+        event_status = self.reset_event_status()
+
+        if self.zone_map is not None:
+            self.zone_occupancy = self.zone_map.occupancy(results)
+            occupied = self.zone_occupancy > 0
+            if self.last_zone_occupied is not None and (occupied != self.last_zone_occupied).any():
+                yolo_logger.info(f"区域占用变化: {self.zone_map.occupied(self.zone_occupancy)}")
+                event_status['zone_changed'] = 1
+            self.last_zone_occupied = occupied
         
         # 获取飞行员和座舱数据
         aviator_box = self.current_boxes['aviator']
@@ -239,7 +281,7 @@ class LeftEventDetector(EventDetector):
             # 检测飞机是否在移动
             if self.last_plane_in_hangar and has_plane_now:
                 is_moving = False
-                for part in ['cabin_cover_on', 'cabin_cover_off', 'red_off', 'red_on']:
+                for part in PLANE_PARTS:
                     if (self.current_boxes[part] is not None and self.previous_boxes[part] is not None and
                             self.is_box_moving(self.current_boxes[part], self.previous_boxes[part])):
                         is_moving = True
@@ -301,9 +343,12 @@ class LeftEventDetector(EventDetector):
                 message.area_on_fire = 0  # 当前没有火灾检测
                 message.timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
                 message.event_type = 4  # 4=安全事件
+            if self.zone_map is not None:
+                # 有对应字段的消息（如人员消息的 area_occupied）按区域设置字段，所有消息都带上各区域占用
+                self.zone_map.update_message(message, self.zone_occupancy)
+                message.zones = self.zone_map.occupied(self.zone_occupancy)
         
         # 更新前一帧的检测框
-        self.previous_boxes = self.current_boxes.copy()
-        self.current_boxes = {key: None for key in self.current_boxes}
+        self.swap_boxes()
         
         return event_status
\ No newline at end of file
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+# 标注框颜色（BGR），按类别编号循环使用
+_COLORS = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207), (10, 249, 72),
+           (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0), (168, 153, 44), (255, 194, 0)]
+
+
+class FramePool:
+    """单个摄像头的帧缓冲池：解码、标注、缩放都写入预分配的数组，稳态运行时不再分配新的帧内存"""
+    def __init__(self, save_width=800):
+        self.save_width = save_width
+        self.frame = None      # 解码缓冲区，VideoCapture.read 直接写入
+        self.annotated = None  # 标注缓冲区
+        self.resized = None    # 保存图片用的缩放缓冲区
+        self.reallocations = 0  # 分辨率变化导致的重新分配次数
+
+    def read(self, cap):
+        """读取一帧到解码缓冲区；分辨率变化时OpenCV会返回新数组，此时改用新数组作为缓冲区"""
+        ret, frame = cap.read(self.frame)
+        if ret and frame is not self.frame:
+            self.frame = frame
+            self.reallocations += 1
+        return ret, frame
+
+    def _ensure(self, name, shape, dtype=np.uint8):
+        buffer = getattr(self, name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=dtype)
+            setattr(self, name, buffer)
+            self.reallocations += 1
+        return buffer
+
+    def annotate(self, frame, results):
+        """在标注缓冲区上绘制检测框，代替每帧都复制整幅图像的 results[0].plot()"""
+        annotated = self._ensure('annotated', frame.shape)
+        np.copyto(annotated, frame)
+        for result in results:
+            boxes = result.boxes
+            if len(boxes) == 0:
+                continue
+            xyxy = boxes.xyxy.cpu().numpy()
+            classes = boxes.cls.cpu().numpy()
+            scores = boxes.conf.cpu().numpy()
+            for (x1, y1, x2, y2), class_id, score in zip(xyxy, classes, scores):
+                class_id = int(class_id)
+                color = _COLORS[class_id % len(_COLORS)]
+                top_left = (int(x1), int(y1))
+                cv2.rectangle(annotated, top_left, (int(x2), int(y2)), color, 2)
+                cv2.putText(annotated, f"{result.names[class_id]} {score:.2f}", (top_left[0], max(top_left[1] - 5, 12)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+        return annotated
+
+    def resize_for_save(self, image):
+        """按保存宽度等比缩放到缩放缓冲区"""
+        height, width = image.shape[:2]
+        new_height = int(height * (self.save_width / width))
+        resized = self._ensure('resized', (new_height, self.save_width) + image.shape[2:])
+        cv2.resize(image, (self.save_width, new_height), dst=resized)
+        return resized
@@ -0,0 +1,140 @@
+import zlib
+
+import cv2
+import numpy as np
+
+from common import yolo_logger
+
+'''推理前的帧质量检查
+    丢包后的灰屏/花屏拖影、夜间黑屏、卡住不动的重复帧送进模型既浪费一次推理，
+    又会让 cabin_cover_on/off 等检测结果闪烁，触发错误的状态切换
+    每帧只缩放一次得到缩略图，在缩略图上向量化计算（可多路摄像头堆叠成一批一起算）：
+        dark / overexposed  平均亮度过低/过高
+        flat                对比度（灰度标准差）过低，整帧灰屏
+        corrupt             解码损坏：画面底部连续多行与上一行几乎相同（丢失宏块后灰色填充或向下拖影），或大面积纯绿
+        blurred             拉普拉斯方差过低，画面模糊/涂抹
+        duplicate           缩略图CRC与上一帧完全相同，码流卡住
+    不合格的帧按原因跳过（不推理、不更新事件状态）或只标记（照常推理，消息 trace 中带上原因），每个摄像头分别计数
+    默认 dark、blurred 只标记：夜间和雨雾天画面本身就暗/糊，跳过会让整晚没有检测结果；其余原因默认跳过
+    跳过一帧后至少间隔 retry_interval 秒再检查下一帧，避免持续花屏时每帧都解码检查
+'''
+
+REASONS = ('dark', 'overexposed', 'flat', 'corrupt', 'blurred', 'duplicate')
+
+
+def thumbnail(frame, size=(160, 90)):
+    """缩放到固定大小的BGR缩略图，不同分辨率的摄像头可以堆叠成一批
+    大画面先最近邻抽样到4倍缩略图大小再区域平均，只读取约1/9的像素，比直接 INTER_AREA 快数倍"""
+    if frame.ndim == 2:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    width, height = size
+    if frame.shape[1] > width * 4 and frame.shape[0] > height * 4:
+        frame = cv2.resize(frame, (width * 4, height * 4), interpolation=cv2.INTER_NEAREST)
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def frame_metrics(thumbnails):
+    """一批缩略图 (N, H, W, 3) uint8 的质量指标，每个指标为 (N,) 数组"""
+    thumbnails = np.asarray(thumbnails)
+    if thumbnails.ndim == 3:
+        thumbnails = thumbnails[None]
+    color = thumbnails.astype(np.float32)
+    blue, green, red = color[..., 0], color[..., 1], color[..., 2]
+    gray = 0.114 * blue + 0.587 * green + 0.299 * red
+    height = gray.shape[1]
+    laplacian = (4 * gray[:, 1:-1, 1:-1] - gray[:, :-2, 1:-1] - gray[:, 2:, 1:-1]
+                 - gray[:, 1:-1, :-2] - gray[:, 1:-1, 2:])
+    # 从底部向上数与上一行几乎相同的连续行数
+    same_row = np.abs(np.diff(gray, axis=1)).mean(axis=2) < 1.0
+    smear_rows = np.cumprod(same_row[:, ::-1], axis=1).sum(axis=1)
+    return {
+        'brightness': gray.mean(axis=(1, 2)),
+        'contrast': gray.std(axis=(1, 2)),
+        'sharpness': laplacian.var(axis=(1, 2)),
+        'smear': smear_rows / (height - 1),
+        'green': (green - np.maximum(blue, red) > 80).mean(axis=(1, 2)),
+    }
+
+
+class FrameQualityGate:
+    def __init__(self, camera_id='', thumb_size=(160, 90), min_brightness=20, max_brightness=240, min_contrast=6,
+                 min_sharpness=60, max_smear=0.2, max_green=0.3, actions=None, retry_interval=0.2, log_interval=1000):
+        self.camera_id = camera_id
+        self.thumb_size = thumb_size
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_contrast = min_contrast
+        self.min_sharpness = min_sharpness  # 缩略图上的拉普拉斯方差，与 thumb_size 相关
+        self.max_smear = max_smear          # 底部连续相同行占画面高度的比例
+        self.max_green = max_green          # 纯绿像素比例（解码器用零值填充丢失数据时的颜色）
+        # 各原因的处理方式：'skip' 跳过推理，'flag' 照常推理并标记
+        self.actions = dict.fromkeys(REASONS, 'skip')
+        self.actions.update(dark='flag', blurred='flag')
+        if actions:
+            self.actions.update(actions)
+        self.retry_interval = retry_interval  # 跳过一帧后到下次检查的最短间隔（秒），不超过采样间隔
+        self.log_interval = log_interval
+        self._last_hash = None
+        self.stats = dict({'frames': 0, 'passed': 0, 'skipped': 0, 'flagged': 0}, **dict.fromkeys(REASONS, 0))
+
+    @classmethod
+    def from_config(cls, camera_id, config):
+        """按 RtspYoloConfig.quality_config 构建，None 表示使用默认阈值，False 表示不检查"""
+        if config is False:
+            return None
+        return cls(camera_id, **(config or {}))
+
+    def reasons(self, metrics, index=0, frame_hash=None):
+        """第 index 帧不合格的原因列表"""
+        reasons = []
+        brightness = metrics['brightness'][index]
+        if brightness < self.min_brightness:
+            reasons.append('dark')
+        elif brightness > self.max_brightness:
+            reasons.append('overexposed')
+        elif metrics['contrast'][index] < self.min_contrast:
+            reasons.append('flat')
+        elif metrics['smear'][index] > self.max_smear or metrics['green'][index] > self.max_green:
+            reasons.append('corrupt')
+        elif metrics['sharpness'][index] < self.min_sharpness:
+            reasons.append('blurred')
+        if frame_hash is not None and frame_hash == self._last_hash:
+            reasons.append('duplicate')
+        return reasons
+
+    def check(self, frame, thumb=None, metrics=None, index=0):
+        """检查一帧，返回 (是否送入推理, 原因列表)；批量检查时传入已算好的缩略图和 metrics"""
+        if thumb is None:
+            thumb = thumbnail(frame, self.thumb_size)
+        if metrics is None:
+            metrics = frame_metrics(thumb)
+        frame_hash = zlib.crc32(np.ascontiguousarray(thumb))
+        reasons = self.reasons(metrics, index, frame_hash)
+        self._last_hash = frame_hash
+        return self._count(reasons), reasons
+
+    def _count(self, reasons):
+        stats = self.stats
+        stats['frames'] += 1
+        for reason in reasons:
+            stats[reason] += 1
+        if not reasons:
+            stats['passed'] += 1
+            accept = True
+        elif any(self.actions[reason] == 'skip' for reason in reasons):
+            stats['skipped'] += 1
+            accept = False
+        else:
+            stats['flagged'] += 1
+            accept = True
+        if self.log_interval and stats['frames'] % self.log_interval == 0:
+            yolo_logger.info(f"{self.camera_id} 帧质量统计: {stats}")
+        return accept
+
+
+def check_batch(gates, frames):
+    """多路摄像头各一帧堆叠成一批计算指标，返回 [(是否送入推理, 原因列表)]；各门限的 thumb_size 需一致"""
+    thumbs = np.stack([thumbnail(frame, gate.thumb_size) for gate, frame in zip(gates, frames)])
+    metrics = frame_metrics(thumbs)
+    return [gate.check(frame, thumbs[index], metrics, index)
+            for index, (gate, frame) in enumerate(zip(gates, frames))]
@@ -0,0 +1,320 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from common import yolo_logger
+
+'''模型热更新：不重启进程、不断开RTSP、不重置检测器状态地替换模型权重
+    1. 后台线程监视 model_path（文件大小和修改时间连续两次轮询不变才认为写入完成），或调用 request_update() 指定新权重
+    2. 在后台加载全部副本并预热，黄金帧集（golden_dir 下的图片）存在时与当前版本比较检测结果一致性和耗时，不达标直接拒绝
+    3. 通过后原子替换当前版本：每次推理开始时只读取一次版本引用，正在进行的推理用旧版本完成，下一批即用新版本
+    4. 替换后进入观察期：记录线上推理耗时，并抽样把帧交给后台线程用旧版本重跑比较；
+       观察期结束时新版本明显变慢或检测结果偏离，自动回滚到仍驻留内存的旧版本，该文件版本不再重试
+    通过 runner 调用级联等包装时，runner 同时返回本次结果的来源：复用缓存/只跑了第一级的结果不计入耗时和比较，
+    第二级只跑了裁剪区域的结果只计入耗时，只有整帧推理的结果才抽样与旧版本的整帧推理比较
+    替换和观察期间新旧两个版本同时驻留显存/内存
+'''
+
+
+def _load_yolo(path):
+    from ultralytics import YOLO
+    return YOLO(path)
+
+
+def _detections(results):
+    """检测结果 -> (xyxy, cls) 两个numpy数组"""
+    xyxy, cls = [np.zeros((0, 4), dtype=np.float32)], [np.zeros(0, dtype=np.int64)]
+    for result in results:
+        boxes = result.boxes
+        if len(boxes) == 0:
+            continue
+        xyxy.append(boxes.xyxy.cpu().numpy().astype(np.float32).reshape(-1, 4))
+        cls.append(boxes.cls.cpu().numpy().astype(np.int64))
+    return np.concatenate(xyxy), np.concatenate(cls)
+
+
+def detection_agreement(a, b, iou_threshold=0.5):
+    """两组检测结果的一致性（F1）：同类别且IoU不低于阈值的框贪心配对，两组都为空时为1"""
+    xyxy_a, cls_a = a
+    xyxy_b, cls_b = b
+    if len(cls_a) == 0 and len(cls_b) == 0:
+        return 1.0
+    if len(cls_a) == 0 or len(cls_b) == 0:
+        return 0.0
+    x1 = np.maximum(xyxy_a[:, None, 0], xyxy_b[None, :, 0])
+    y1 = np.maximum(xyxy_a[:, None, 1], xyxy_b[None, :, 1])
+    x2 = np.minimum(xyxy_a[:, None, 2], xyxy_b[None, :, 2])
+    y2 = np.minimum(xyxy_a[:, None, 3], xyxy_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (xyxy_a[:, 2] - xyxy_a[:, 0]) * (xyxy_a[:, 3] - xyxy_a[:, 1])
+    area_b = (xyxy_b[:, 2] - xyxy_b[:, 0]) * (xyxy_b[:, 3] - xyxy_b[:, 1])
+    iou = inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+    iou[cls_a[:, None] != cls_b[None, :]] = 0
+    matched = 0
+    while True:
+        index = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[index] < iou_threshold:
+            break
+        matched += 1
+        iou[index[0], :] = 0
+        iou[:, index[1]] = 0
+    return 2.0 * matched / (len(cls_a) + len(cls_b))
+
+
+class ModelVersion:
+    """一个模型版本：同一权重的若干副本（每个并发推理线程一个），以及该版本的线上耗时统计"""
+    def __init__(self, name, path, signature, replicas):
+        self.name = name
+        self.path = path
+        self.signature = signature
+        self.pool = queue.Queue()
+        for replica in replicas:
+            self.pool.put(replica)
+        self.replicas = len(replicas)
+        self.latencies = deque(maxlen=500)  # 最近的线上推理耗时（毫秒）
+        self.frames = 0
+        self.full_frames = 0    # 整帧推理次数，观察期按此抽样比较
+        self.golden = None      # 黄金帧上的检测结果
+        self.golden_ms = None   # 黄金帧上的推理耗时中位数
+
+    def record(self, elapsed_ms, kind='full'):
+        self.frames += 1
+        if kind != 'reused':
+            self.latencies.append(elapsed_ms)
+        if kind == 'full':
+            self.full_frames += 1
+
+    def median_ms(self):
+        return float(np.median(self.latencies)) if self.latencies else None
+
+
+class ModelManager:
+    def __init__(self, model_path, loader=None, replicas=1, device=0, verbose=False, golden_dir=None, warmup=3,
+                 max_slowdown=1.3, min_agreement=0.9, probation_frames=300, shadow_every=10, poll_interval=5.0):
+        """loader(path) 返回可调用的模型，默认 ultralytics.YOLO；replicas 为同时调用模型的推理线程数"""
+        self.model_path = model_path
+        self.loader = loader or _load_yolo
+        self.replicas = replicas
+        self.device = device
+        self.verbose = verbose
+        self.warmup = warmup
+        self.max_slowdown = max_slowdown          # 新版本耗时超过旧版本的倍数即拒绝/回滚
+        self.min_agreement = min_agreement        # 新旧版本检测结果一致性（F1）低于该值即拒绝/回滚
+        self.probation_frames = probation_frames  # 替换后观察的线上推理次数
+        self.shadow_every = shadow_every          # 观察期内每隔多少次推理抽样一帧用旧版本比较
+        self.poll_interval = poll_interval
+        self.golden_frames = self._load_golden(golden_dir)
+        self.active = self._load(model_path, self._signature(model_path))
+        # model_path 上次处理过的文件签名；request_update 切换到其他文件后，监视线程仍只在 model_path 本身变化时才加载
+        self._watched_signature = self.active.signature
+        self.previous = None    # 观察期内保留的旧版本，用于回滚
+        self.probation = None   # 处于观察期的新版本
+        self.rejected = set()   # 被拒绝或回滚的文件版本（签名），文件再次变化前不再尝试
+        self.history = []
+        self._agreements = []
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._shadow = queue.Queue(maxsize=4)
+        self._stop = threading.Event()
+        self._thread = None
+        self._watch = False
+        self._pending_signature = None
+        self._next_poll = 0.0
+
+    # ---------------------------------------------------------------- 推理线程调用
+
+    def predict(self, frame, runner=None):
+        """用当前版本推理一帧；runner(model, frame) 可替换默认的 model(frame, device=..., verbose=...) 调用，
+        返回 (results, kind)：kind 为 'full' 表示整帧推理，'partial' 表示模型只跑了一部分（如级联裁剪），
+        'reused' 表示没有用该模型推理（复用缓存、只跑了第一级）"""
+        version = self.active  # 只读取一次，本次推理全程使用同一版本
+        model = version.pool.get()
+        try:
+            start = time.perf_counter()
+            if runner is not None:
+                results, kind = runner(model, frame)
+            else:
+                results, kind = model(frame, device=self.device, verbose=self.verbose), 'full'
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        finally:
+            version.pool.put(model)
+        version.record(elapsed_ms, kind)
+        # 旧版本在后台按整帧推理重跑，只有整帧推理的结果可以直接比较
+        if kind == 'full' and version is self.probation and version.full_frames % self.shadow_every == 0 \
+                and not self._shadow.full():
+            try:
+                # 调用方的帧通常是复用的缓冲区（FramePool），下一次读取会原地覆盖，抽样的帧必须复制
+                self._shadow.put_nowait((frame.copy(), _detections(results)))
+            except queue.Full:
+                pass  # 后台比较跟不上时丢弃抽样，不阻塞推理
+        return results
+
+    # ---------------------------------------------------------------- 更新入口
+
+    def request_update(self, path=None):
+        """请求加载新权重（默认重新加载 model_path），在后台线程中完成"""
+        self._requests.put(path or self.model_path)
+
+    def start(self, watch=True):
+        """启动后台线程；watch 为 True 时轮询 model_path 的变化"""
+        self._watch = watch
+        self._thread = threading.Thread(target=self._run, name='model-manager', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def summary(self):
+        return {'active': self.active.name, 'probation': self.probation is not None,
+                'active_ms': self.active.median_ms(), 'history': list(self.history)}
+
+    # ---------------------------------------------------------------- 后台线程
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._drain_shadow()
+                self._review_probation()
+                if self.probation is not None:
+                    self._stop.wait(0.2)  # 观察期内不加载其他版本，更新请求留在队列中
+                    continue
+                try:
+                    path = self._requests.get(timeout=0.2)
+                except queue.Empty:
+                    if self._watch and time.monotonic() >= self._next_poll:
+                        self._next_poll = time.monotonic() + self.poll_interval
+                        self._poll()
+                    continue
+                signature = self._signature(path)
+                if signature is not None:
+                    if path == self.model_path:
+                        self._watched_signature = signature
+                    self._try_update(path, signature)
+            except Exception as e:
+                yolo_logger.error(f"模型更新出错: {e}")
+
+    def _poll(self):
+        signature = self._signature(self.model_path)
+        if signature is None or signature == self._watched_signature or signature in self.rejected:
+            self._pending_signature = None
+            return
+        if signature != self._pending_signature:
+            self._pending_signature = signature  # 文件可能还在写入，下次轮询不变再加载
+            return
+        self._pending_signature = None
+        self._watched_signature = signature
+        self._try_update(self.model_path, signature)
+
+    def _try_update(self, path, signature):
+        start = time.perf_counter()
+        try:
+            candidate = self._load(path, signature)
+        except Exception as e:
+            self.rejected.add(signature)  # 文件损坏或格式不对，同一版本不再重试
+            yolo_logger.error(f"加载模型 {path} 失败: {e}，继续使用 {self.active.name}")
+            return
+        load_s = time.perf_counter() - start
+        if self.golden_frames:
+            agreement = float(np.mean([detection_agreement(a, b) for a, b in zip(self.active.golden, candidate.golden)]))
+            slowdown = candidate.golden_ms / max(self.active.golden_ms, 1e-6)
+            if agreement < self.min_agreement or slowdown > self.max_slowdown:
+                self._reject(candidate, 'rejected', f"黄金帧一致性 {agreement:.3f}，耗时 {slowdown:.2f} 倍")
+                return
+        with self._lock:
+            self.previous, self.active, self.probation = self.active, candidate, candidate
+            self._agreements = []
+        self._record('swapped', candidate, f"加载+预热 {load_s:.1f} 秒")
+        yolo_logger.info(f"模型已切换到 {candidate.name}（加载+预热 {load_s:.1f} 秒），观察 {self.probation_frames} 次推理")
+
+    def _drain_shadow(self):
+        previous = self.previous
+        while True:
+            try:
+                frame, detections = self._shadow.get_nowait()
+            except queue.Empty:
+                return
+            if previous is None:
+                continue
+            model = previous.pool.get()
+            try:
+                baseline = _detections(model(frame, device=self.device, verbose=self.verbose))
+            finally:
+                previous.pool.put(model)
+            self._agreements.append(detection_agreement(baseline, detections))
+
+    def _review_probation(self):
+        candidate = self.probation
+        if candidate is None or candidate.frames < self.probation_frames:
+            return
+        previous_ms, candidate_ms = self.previous.median_ms(), candidate.median_ms()
+        slowdown = candidate_ms / max(previous_ms, 1e-6) if previous_ms else 1.0
+        agreement = float(np.mean(self._agreements)) if self._agreements else 1.0
+        if slowdown > self.max_slowdown or agreement < self.min_agreement:
+            with self._lock:
+                self.active, self.previous, self.probation = self.previous, None, None
+            self._reject(candidate, 'rolled_back', f"线上耗时 {slowdown:.2f} 倍，抽样一致性 {agreement:.3f}")
+            return
+        with self._lock:
+            self.previous, self.probation = None, None  # 释放旧版本
+        self._record('committed', candidate, f"线上耗时 {slowdown:.2f} 倍，抽样一致性 {agreement:.3f}")
+        yolo_logger.info(f"模型 {candidate.name} 通过观察期（耗时 {slowdown:.2f} 倍，一致性 {agreement:.3f}）")
+
+    def _reject(self, candidate, action, reason):
+        self.rejected.add(candidate.signature)
+        self._record(action, candidate, reason)
+        yolo_logger.warning(f"模型 {candidate.name} {'已回滚' if action == 'rolled_back' else '未通过验证'}：{reason}，"
+                            f"继续使用 {self.active.name}")
+
+    def _record(self, action, version, reason):
+        self.history.append((time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()), action, version.name, reason))
+
+    # ---------------------------------------------------------------- 加载
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_golden(self, golden_dir):
+        if not golden_dir:
+            return []
+        if not os.path.isdir(golden_dir):
+            yolo_logger.warning(f"黄金帧目录 {golden_dir} 不存在，更新模型时只做预热，不做验证")
+            return []
+        frames = []
+        for name in sorted(os.listdir(golden_dir)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+                frame = cv2.imread(os.path.join(golden_dir, name))
+                if frame is not None:
+                    frames.append(frame)
+        return frames
+
+    def _load(self, path, signature):
+        """加载全部副本并预热；有黄金帧时记录该版本在黄金帧上的结果和耗时"""
+        replicas = [self.loader(path) for _ in range(self.replicas)]
+        warmup_frames = self.golden_frames[:self.warmup] or [np.zeros((640, 640, 3), dtype=np.uint8)] * self.warmup
+        for replica in replicas:
+            for frame in warmup_frames:
+                replica(frame, device=self.device, verbose=self.verbose)
+        mtime = time.strftime('%m%d-%H%M%S', time.localtime(signature[0] / 1e9)) if signature else 'unknown'
+        version = ModelVersion(f"{os.path.basename(path)}@{mtime}", path, signature, replicas)
+        if self.golden_frames:
+            golden, latencies = [], []
+            for frame in self.golden_frames:
+                start = time.perf_counter()
+                results = replicas[0](frame, device=self.device, verbose=self.verbose)
+                latencies.append((time.perf_counter() - start) * 1000)
+                golden.append(_detections(results))
+            version.golden, version.golden_ms = golden, float(np.median(latencies))
+        return version
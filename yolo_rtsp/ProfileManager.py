@@ -0,0 +1,243 @@
+import cProfile
+import json
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from common import yolo_logger
+
+'''按需性能分析
+    mode='cprofile'  在摄像头线程内启用cProfile，每个处理阶段单独一个Profile，输出pstats
+    mode='sample'    后台线程定时采样目标线程的调用栈，输出带阶段标注的collapsed stack（可直接生成火焰图）
+    mode='both'      同时进行
+未开启时不安装任何跟踪函数、不启动采样线程，热循环中只有一次属性判断
+各摄像头的运行统计（帧质量、级联等计数字典）可登记到 register_metrics，由HTTP接口一并查看
+Python 3.12 起 cProfile 基于 sys.monitoring，整个进程同一时刻只能启用一个 Profile，且会记录所有线程的调用，
+此时 cprofile 模式一次只分析一个摄像头（未指定摄像头时取第一个），需要同时看多路时用 sample 模式
+'''
+
+# 3.12 之前 cProfile 基于线程级的 setprofile，各摄像头线程可以同时启用自己的 Profile
+CONCURRENT_CPROFILE = sys.version_info < (3, 12)
+
+
+class CameraProfileHook:
+    """单个摄像头线程的分析钩子，由摄像头线程在每个处理阶段开始时调用 enter(stage)"""
+    def __init__(self, manager, camera_id):
+        self.manager = manager
+        self.camera_id = str(camera_id)
+        self.thread_id = threading.get_ident()
+        self.stage = 'idle'
+        self.pending = None     # 等待摄像头线程接手的cProfile请求 (截止时间, 输出前缀)
+        self._profiles = None   # 进行中的 {阶段: cProfile.Profile}
+        self._active = None
+        self._deadline = 0
+        self._prefix = None
+
+    def enter(self, stage):
+        """进入某个处理阶段"""
+        self.stage = stage
+        if self.pending is None and self._profiles is None:
+            return
+        self._switch(stage)
+
+    def _switch(self, stage):
+        if self._active is not None:
+            self._active.disable()
+            self._active = None
+        if self.pending is not None and self._profiles is None:
+            self._deadline, self._prefix = self.pending
+            self.pending = None
+            self._profiles = {}
+        if time.monotonic() >= self._deadline:
+            self._dump()
+            return
+        profile = self._profiles.get(stage) or cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # 3.12+ 已有其他 Profile 在运行（其他摄像头或外部工具），结束本摄像头的分析，保留已收集的部分
+            yolo_logger.warning(f"摄像头 {self.camera_id} 无法启用 cProfile: {e}")
+            self._dump()
+            return
+        self._profiles[stage] = profile
+        self._active = profile
+
+    def _dump(self):
+        profiles, prefix = self._profiles, self._prefix
+        self._profiles = None
+        if not profiles:
+            return
+        paths = []
+        for stage, profile in profiles.items():
+            path = f"{prefix}_{stage}.pstats"
+            profile.dump_stats(path)
+            paths.append(path)
+        combined = pstats.Stats(*profiles.values())
+        combined.dump_stats(f"{prefix}_all.pstats")
+        yolo_logger.info(f"摄像头 {self.camera_id} cProfile 结果已保存: {prefix}_*.pstats")
+        self.manager.finished(self.camera_id, 'cprofile', paths + [f"{prefix}_all.pstats"])
+
+
+class ProfileManager:
+    """进程内唯一的分析控制器：注册摄像头钩子，响应信号或本地HTTP请求启动限时分析"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(ProfileManager, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, output_dir='profiles', default_duration=10, sample_interval=0.005):
+        if hasattr(self, 'initialized'):
+            return
+        self.initialized = True
+        self.output_dir = output_dir
+        self.default_duration = default_duration
+        self.sample_interval = sample_interval
+        self.hooks = {}
+        self.metrics = {}  # {摄像头: {名称: 统计字典}}，字典由摄像头线程原地更新
+        self.results = []  # 已完成的分析结果 (时间, 摄像头, 模式, 文件列表)
+        self._http_server = None
+
+    def register(self, camera_id):
+        """在摄像头线程中调用，返回该线程的钩子"""
+        hook = CameraProfileHook(self, camera_id)
+        with self._lock:
+            self.hooks[hook.camera_id] = hook
+        return hook
+
+    def register_metrics(self, camera_id, name, stats):
+        """登记一个计数字典，HTTP接口返回其当前值"""
+        with self._lock:
+            self.metrics.setdefault(str(camera_id), {})[name] = stats
+
+    def metrics_snapshot(self):
+        with self._lock:
+            return {camera_id: {name: dict(stats) for name, stats in items.items()}
+                    for camera_id, items in self.metrics.items()}
+
+    def _targets(self, camera_id):
+        if camera_id is None:
+            return list(self.hooks.values())
+        hook = self.hooks.get(str(camera_id))
+        if hook is None:
+            raise KeyError(f"Unknown camera: {camera_id}")
+        return [hook]
+
+    def start(self, camera_id=None, duration=None, mode='sample'):
+        """对指定摄像头（None表示全部）启动限时分析，返回输出文件前缀"""
+        if mode not in ('cprofile', 'sample', 'both'):
+            raise ValueError(f"Unsupported profile mode: {mode}")
+        duration = duration or self.default_duration
+        hooks = self._targets(camera_id)
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, time.strftime('%Y%m%d_%H%M%S', time.localtime()))
+        if mode in ('cprofile', 'both'):
+            deadline = time.monotonic() + duration
+            cprofile_hooks = hooks
+            if not CONCURRENT_CPROFILE and len(hooks) > 1:
+                cprofile_hooks = hooks[:1]
+                yolo_logger.warning(f"Python {sys.version_info.major}.{sys.version_info.minor} 同一时刻只能启用一个 cProfile，"
+                                    f"只分析摄像头 {hooks[0].camera_id}")
+            for hook in cprofile_hooks:
+                hook.pending = (deadline, f"{prefix}_camera{hook.camera_id}")
+        if mode in ('sample', 'both'):
+            sampler = threading.Thread(target=self._sample, args=(hooks, duration, prefix), name='profile-sampler')
+            sampler.daemon = True
+            sampler.start()
+        yolo_logger.info(f"开始性能分析: camera={camera_id or 'all'} mode={mode} duration={duration}s")
+        return prefix
+
+    def _sample(self, hooks, duration, prefix):
+        """定时采样目标线程的调用栈，按 摄像头;阶段;调用栈 聚合"""
+        counts = Counter()
+        deadline = time.monotonic() + duration
+        own_files = (__file__,)
+        while time.monotonic() < deadline:
+            frames = sys._current_frames()
+            for hook in hooks:
+                frame = frames.get(hook.thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename not in own_files:
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(f"stage_{hook.stage}")
+                stack.append(f"camera_{hook.camera_id}")
+                counts[';'.join(reversed(stack))] += 1
+            del frames
+            time.sleep(self.sample_interval)
+        path = f"{prefix}.collapsed"
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in counts.most_common():
+                file.write(f"{stack} {count}\n")
+        yolo_logger.info(f"采样分析结果已保存: {path}")
+        self.finished(','.join(hook.camera_id for hook in hooks), 'sample', [path])
+
+    def finished(self, camera_id, mode, paths):
+        with self._lock:
+            self.results.append((time.time(), camera_id, mode, paths))
+
+    def install_signal_handler(self, sample_signal=signal.SIGUSR1, cprofile_signal=signal.SIGUSR2):
+        """kill -USR1 <pid> 采样全部摄像头，kill -USR2 <pid> 对全部摄像头做cProfile；必须在主线程调用"""
+        signal.signal(sample_signal, lambda signum, frame: self.start(mode='sample'))
+        signal.signal(cprofile_signal, lambda signum, frame: self.start(mode='cprofile'))
+
+    def start_http_server(self, port=8765, host='127.0.0.1'):
+        """本地HTTP控制：GET /profile?camera=1&duration=10&mode=sample，GET /profile/status，GET /metrics
+        端口被占用（如同机运行多个进程）时只记录错误并返回None，不影响推理"""
+        manager = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                try:
+                    if url.path == '/profile':
+                        prefix = manager.start(query.get('camera'), float(query.get('duration', 0)) or None,
+                                               query.get('mode', 'sample'))
+                        self._reply(200, {'started': True, 'prefix': prefix})
+                    elif url.path == '/profile/status':
+                        self._reply(200, {'cameras': sorted(manager.hooks),
+                                          'stages': {camera_id: hook.stage for camera_id, hook in manager.hooks.items()},
+                                          'results': manager.results,
+                                          'metrics': manager.metrics_snapshot()})
+                    elif url.path == '/metrics':
+                        self._reply(200, manager.metrics_snapshot())
+                    else:
+                        self._reply(404, {'error': 'not found'})
+                except (KeyError, ValueError) as e:
+                    self._reply(400, {'error': str(e)})
+
+            def _reply(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                yolo_logger.debug(format % args)
+
+        try:
+            self._http_server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            yolo_logger.error(f"性能分析控制接口无法监听 {host}:{port}: {e}")
+            return None
+        thread = threading.Thread(target=self._http_server.serve_forever, name='profile-http')
+        thread.daemon = True
+        thread.start()
+        yolo_logger.info(f"性能分析控制接口: http://{host}:{port}/profile")
+        return self._http_server
@@ -0,0 +1,126 @@
+import os
+import threading
+
+'''CPU资源分配，避免多路摄像头时 PyTorch / OpenCV / BLAS / JPEG 编码各自按全部核数开线程池造成超额订阅
+
+分配策略（plan_allocation）：
+    1. 预留 reserved 个核给系统、主线程、消息发布和日志
+    2. 解码：每路摄像头一个解码线程（FFmpeg单线程解码），占用 decode_share 比例的核
+    3. 编码：JPEG编码和缩放使用 OpenCV，cv2 线程池固定为1，编码与解码线程共用核
+    4. 推理：剩余的核平均分给各推理工作者，每个工作者 torch intra-op 线程数 = 分到的核数，inter-op = 1
+       多进程部署时每个推理进程绑定到自己的核集合（sched_setaffinity），互不抢占
+    单进程部署时 torch/cv2 线程池是进程级的，推理线程数 = 推理核数 / 同时调用模型的线程数
+    （每路摄像头一个线程时为摄像头数，asyncio 模式时为推理线程池大小）；
+    Linux 下线程池中的线程可以单独绑核（pin_current_thread 作为 ThreadPoolExecutor 的 initializer）
+
+注意：BLAS/OpenMP 的线程数由环境变量决定，必须在导入 numpy/torch/cv2 之前调用 limit_env_threads
+'''
+
+_THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                    'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+
+
+def available_cores():
+    """当前进程可用的CPU核编号"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def limit_env_threads(threads, override=False):
+    """设置 BLAS/OpenMP 线程数环境变量，需在导入 numpy/torch 之前调用；已设置的变量默认不覆盖"""
+    for name in _THREAD_ENV_VARS:
+        if override or name not in os.environ:
+            os.environ[name] = str(threads)
+    # OpenCV 的 FFmpeg 后端解码线程数
+    if override or 'OPENCV_FFMPEG_CAPTURE_OPTIONS' not in os.environ:
+        os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = 'threads;1'
+
+
+def plan_allocation(camera_count, inference_workers=1, cores=None, reserved=1, decode_share=0.25):
+    """按上面的策略计算各角色的核分配
+
+    Returns:
+        dict: {'reserved': [...], 'decode': [...], 'inference': [[...], ...], 'torch_threads': n, 'opencv_threads': 1}
+    """
+    cores = list(cores) if cores is not None else available_cores()
+    if len(cores) <= reserved + 1:
+        # 核太少时不做划分，全部共享
+        return {'reserved': [], 'decode': cores, 'inference': [cores] * inference_workers,
+                'torch_threads': max(1, len(cores) // max(1, inference_workers)), 'opencv_threads': 1}
+    reserved_cores, rest = cores[:reserved], cores[reserved:]
+    decode_count = min(max(1, round(len(rest) * decode_share)), camera_count, len(rest) - 1)
+    decode_cores, inference_cores = rest[:decode_count], rest[decode_count:]
+    per_worker = max(1, len(inference_cores) // inference_workers)
+    inference_sets = []
+    for index in range(inference_workers):
+        start = (index * per_worker) % len(inference_cores)
+        inference_sets.append(inference_cores[start:start + per_worker] or inference_cores)
+    return {'reserved': reserved_cores, 'decode': decode_cores, 'inference': inference_sets,
+            'torch_threads': per_worker, 'opencv_threads': 1}
+
+
+def configure_libraries(torch_threads=None, torch_interop_threads=1, opencv_threads=1, blas_threads=None):
+    """设置当前进程中各库的线程池大小，返回实际生效的设置"""
+    applied = {}
+    if opencv_threads is not None:
+        try:
+            import cv2
+            cv2.setNumThreads(opencv_threads)
+            applied['opencv_threads'] = cv2.getNumThreads()
+        except ImportError:
+            pass
+    if torch_threads is not None:
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+            try:
+                torch.set_num_interop_threads(torch_interop_threads)
+            except RuntimeError:
+                pass  # inter-op 线程池只能在首次并行计算前设置
+            applied['torch_threads'] = torch.get_num_threads()
+            applied['torch_interop_threads'] = torch.get_num_interop_threads()
+        except ImportError:
+            pass
+    if blas_threads is not None:
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(blas_threads)
+            applied['blas_threads'] = blas_threads
+        except ImportError:
+            applied['blas_threads'] = os.environ.get('OMP_NUM_THREADS')  # 只能依赖导入前设置的环境变量
+    return applied
+
+
+def pin_to_cores(cores, pid=0):
+    """把进程（pid=0 为当前进程）绑定到指定核；平台不支持时返回False"""
+    if not cores or not hasattr(os, 'sched_setaffinity'):
+        return False
+    os.sched_setaffinity(pid, set(cores))
+    return True
+
+
+def pin_current_thread(cores):
+    """把当前线程绑定到指定核（Linux 下亲和性按线程生效）"""
+    if not cores or not hasattr(os, 'sched_setaffinity') or not hasattr(threading, 'get_native_id'):
+        return False
+    os.sched_setaffinity(threading.get_native_id(), set(cores))
+    return True
+
+
+def configure_inference_worker(index, plan):
+    """多进程部署时在第 index 个推理进程启动时调用：绑核并按分到的核数设置线程池"""
+    cores = plan['inference'][index % len(plan['inference'])]
+    pin_to_cores(cores)
+    return configure_libraries(torch_threads=len(cores), opencv_threads=plan['opencv_threads'], blas_threads=len(cores))
+
+
+def configure_shared_process(concurrent_inference, camera_count=None, cores=None, reserved=1):
+    """单进程部署：所有推理线程共享进程级线程池，推理线程数 = 推理可用核数 / 同时推理的线程数，至少为1"""
+    plan = plan_allocation(camera_count or concurrent_inference, 1, cores, reserved)
+    inference_cores = len(plan['inference'][0])
+    torch_threads = max(1, inference_cores // max(1, concurrent_inference))
+    applied = configure_libraries(torch_threads=torch_threads, opencv_threads=plan['opencv_threads'],
+                                  blas_threads=torch_threads)
+    applied['plan'] = plan
+    return applied
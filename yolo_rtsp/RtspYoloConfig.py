@@ -1,5 +1,6 @@
 from MQProject.message import Message
 from MQProject.mq import RabbitMQ
+from MQProject.priority import PriorityPublisher
 
 
 class RtspConfig:
@@ -13,13 +14,33 @@ class RtspConfig:
         return f"rtsp://{self.user_name}:{self.password}@{self.ip}:{self.port}//Streaming/Chanels/{self.channel_num}"
 
 class RtspYoloConfig:
-    def __init__(self,user_name,password,ip,port,channel_num,model_path,camera_id):
+    def __init__(self,user_name,password,ip,port,channel_num,model_path,camera_id,event_store=None,dedup_distance=None,transport=None,cascade_config=None,trace_path=None,zones_path=None,model_manager=None,quality_config=None,priority_lanes=False,dedup_window=1000):
         self.rtsp_config=RtspConfig(user_name,password,ip,port,channel_num)
         self.rtsp_url=self.rtsp_config.get_rtsp_url()
         self.model_path=model_path
         self.camera_id=camera_id
-        self.rabbit_mq = RabbitMQ('localhost', 5672, 'guest', 'guest')
+        # 消息传输层，默认RabbitMQ；同机消费者可传入IpcTransport，测试可传入MemoryTransport
+        # priority_lanes=True 时经过分级发布线程（发送变为异步、例行消息积压超限丢弃最旧的），安全事件走独立通道；
+        # 通道按消息的 event_type 选择，只有 SafetyMessage（event_type=4）走 critical，基础 Message 都是例行消息
+        critical_factory = None
+        if transport is None:
+            transport = RabbitMQ('localhost', 5672, 'guest', 'guest')
+            # 安全事件使用独立连接，不受例行消息重试/重连和心跳的影响；所有摄像头共享一个发布器，只建一次连接
+            critical_factory = lambda: RabbitMQ('localhost', 5672, 'guest', 'guest', shared=False)
+        self.transport = transport
+        if priority_lanes:
+            self.transport = PriorityPublisher.for_transport(transport, critical_factory=critical_factory)
         self.message = Message(camera_id=self.camera_id)
+        self.event_store = event_store  # 可选的本地事件存储(EventStore)，多个摄像头可共享
+        self.dedup_distance = dedup_distance  # 保存图片时近重复判定的汉明距离，None表示不去重
+        self.dedup_window = dedup_window      # 只与最近保存的若干张图片比较，None表示不限（索引随运行时间增长）
+        # 两级检测级联配置（DetectionCascade参数，stage1_model_path指定小模型），None表示每帧都用model_path整帧推理
+        self.cascade_config = cascade_config
+        self.trace_path = trace_path  # 录制每帧检测结果的 .npz 路径（按段滚动写成 <路径>.00000.npz ...），用于回放测试，None表示不录制
+        self.zones_path = zones_path  # 固定区域配置（ZoneMap JSON），None表示不做区域判断
+        self.model_manager = model_manager  # 共享的模型管理器（ModelManager，支持热更新），None表示线程内自行加载model_path
+        # 推理前帧质量检查的参数（FrameQualityGate参数，如阈值和各原因的 skip/flag 处理方式），None为默认参数，False表示不检查
+        self.quality_config = quality_config
 
     def send_message(self):
 
@@ -36,4 +57,4 @@ class RtspYoloConfig:
         self.message.timestamp = ''
         self.message.event_type = 0
 
-        self.rabbit_mq.send_message('predicate', self.msg.to_json())
\ No newline at end of file
+        self.transport.send_message('predicate', self.msg.to_json())
\ No newline at end of file
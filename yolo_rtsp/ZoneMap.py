@@ -0,0 +1,112 @@
+import json
+
+import cv2
+import numpy as np
+
+'''摄像头固定区域（机库门、加油区、禁入区等）
+    启动时把每个区域的多边形按降低后的分辨率栅格化成一张位掩码图（每个区域占一位，区域可以重叠），
+    之后每个检测框取锚点（默认底边中点，即人/车接地位置）查一次表即可得到所在区域，所有框一次向量化完成
+
+    区域配置（JSON）：
+    {
+      "frame_size": [1920, 1080],          多边形坐标对应的画面宽高
+      "cell": 8,                            掩码每格对应的像素数，越大越省内存、边界越粗
+      "zones": [
+        {"name": "refuel_area", "polygon": [[100, 600], [700, 600], [700, 1000], [100, 1000]],
+         "labels": ["fuel_truck"], "field": "vehicle"},
+        {"name": "restricted_area", "polygon": [...], "labels": ["aviator", "air_crew"], "field": "area_occupied"}
+      ]
+    }
+    labels 为计入该区域占用的类别，field 为该区域驱动的消息字段（1 有 / 2 无）
+'''
+
+MAX_ZONES = 32
+
+
+class ZoneMap:
+    def __init__(self, zones, frame_size, cell=8):
+        if len(zones) > MAX_ZONES:
+            raise ValueError(f"At most {MAX_ZONES} zones per camera, got {len(zones)}")
+        self.zones = zones
+        self.names = [zone['name'] for zone in zones]
+        self.frame_size = tuple(frame_size)  # (宽, 高)
+        self.cell = cell
+        width, height = self.frame_size
+        self.mask = np.zeros(((height + cell - 1) // cell, (width + cell - 1) // cell), dtype=np.uint32)
+        layer = np.zeros(self.mask.shape, dtype=np.uint8)
+        for bit, zone in enumerate(zones):
+            layer[:] = 0
+            # 定点坐标（4位小数）栅格化，减少缩小后的取整误差；偏移半格使每格按格子中心判断
+            points = np.round((np.asarray(zone['polygon'], dtype=np.float64) / cell - 0.5) * 16).astype(np.int32)
+            cv2.fillPoly(layer, [points], 1, lineType=cv2.LINE_8, shift=4)
+            self.mask |= layer.astype(np.uint32) << np.uint32(bit)
+        # 每个区域计入占用的类别名，以及各消息字段由哪些区域驱动
+        self.zone_labels = [set(zone.get('labels', ())) for zone in zones]
+        self.fields = {}
+        for bit, zone in enumerate(zones):
+            if zone.get('field'):
+                self.fields[zone['field']] = self.fields.get(zone['field'], 0) | (1 << bit)
+        self._label_bits = {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            config = json.load(file)
+        return cls(config['zones'], config['frame_size'], config.get('cell', 8))
+
+    def lookup(self, xyxy, frame_shape=None, anchor='bottom'):
+        """每个框锚点所在区域的位掩码，(N,) uint32；frame_shape 为实际画面的 (高, 宽)，与配置不同时按比例换算"""
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        x = (xyxy[:, 0] + xyxy[:, 2]) * 0.5
+        y = xyxy[:, 3] if anchor == 'bottom' else (xyxy[:, 1] + xyxy[:, 3]) * 0.5
+        width, height = self.frame_size
+        if frame_shape is not None and (frame_shape[1], frame_shape[0]) != (width, height):
+            x = x * (width / frame_shape[1])
+            y = y * (height / frame_shape[0])
+        col = (x / self.cell).astype(np.int64)
+        row = (y / self.cell).astype(np.int64)
+        inside = (x >= 0) & (y >= 0) & (row < self.mask.shape[0]) & (col < self.mask.shape[1])
+        bits = np.zeros(len(xyxy), dtype=np.uint32)
+        bits[inside] = self.mask[row[inside], col[inside]]
+        return bits
+
+    def _bits_for_labels(self, names):
+        """类别编号 -> 该类别计入哪些区域的位掩码"""
+        key = tuple(names.items())
+        table = self._label_bits.get(key)
+        if table is None:
+            table = np.zeros(max(int(class_id) for class_id in names) + 1, dtype=np.uint32)
+            for class_id, name in names.items():
+                for bit, labels in enumerate(self.zone_labels):
+                    if name in labels:
+                        table[int(class_id)] |= np.uint32(1 << bit)
+            self._label_bits[key] = table
+        return table
+
+    def occupancy(self, results):
+        """统计每个区域内计入的目标数，返回 (len(zones),) int 数组"""
+        counts = np.zeros(len(self.zones), dtype=np.int64)
+        shifts = np.arange(len(self.zones), dtype=np.uint32)
+        for result in results:
+            boxes = result.boxes
+            if len(boxes) == 0:
+                continue
+            classes = boxes.cls.cpu().numpy().astype(np.int64)
+            bits = self.lookup(boxes.xyxy.cpu().numpy(), getattr(result, 'orig_shape', None))
+            bits &= self._bits_for_labels(result.names)[classes]
+            counts += ((bits[:, None] >> shifts) & 1).sum(axis=0, dtype=np.int64)
+        return counts
+
+    def occupied(self, occupancy):
+        """区域名 -> 是否有目标"""
+        return {name: bool(count) for name, count in zip(self.names, occupancy)}
+
+    def update_message(self, message, occupancy):
+        """按区域占用设置消息字段：字段对应的任一区域有目标为1，否则为2；消息没有该字段时跳过"""
+        occupied_bits = 0
+        for bit, count in enumerate(occupancy):
+            if count:
+                occupied_bits |= 1 << bit
+        for field, bits in self.fields.items():
+            if hasattr(message, field):
+                setattr(message, field, 1 if occupied_bits & bits else 2)
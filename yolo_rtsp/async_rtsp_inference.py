@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import copy
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 将父目录添加到Python路径中
+sys.path.append(parent_dir)
+
+# 必须在导入 cv2/torch/numpy 之前限制 BLAS/OpenMP 线程数
+from yolo_rtsp.ResourceManager import limit_env_threads, configure_shared_process, pin_current_thread
+limit_env_threads(1)
+
+import cv2
+
+from MQProject.event_store import EventStore
+from MQProject.priority import PriorityPublisher
+from MQProject.tool.frame_dedup import FrameDeduplicator
+from common import yolo_logger
+from yolo_rtsp.DetectorCheckpoint import DetectorCheckpoint
+from yolo_rtsp.EventDetector import LeftEventDetector
+from yolo_rtsp.FramePool import FramePool
+from yolo_rtsp.FrameQualityGate import FrameQualityGate
+from yolo_rtsp.ModelManager import ModelManager
+from yolo_rtsp.RtspYoloConfig import RtspYoloConfig
+from yolo_rtsp.ZoneMap import ZoneMap
+
+'''asyncio 编排模式：适合数百路低帧率摄像头
+    每个摄像头是一个协程，负责调度、断线重连、发布和写盘；
+    解码、推理、磁盘/网络IO分别交给固定大小的线程池，线程数只与硬件相关，与摄像头数量无关
+'''
+
+
+class CameraState:
+    """单个摄像头在协程中的运行状态"""
+    def __init__(self, config):
+        self.config = config
+        self.cap = None
+        self.fps = 25.0
+        self.last_read = 0.0
+        self.frame_pool = FramePool(save_width=800)
+        self.detector = LeftEventDetector()
+        if config.zones_path:
+            self.detector.zone_map = ZoneMap.load(config.zones_path)
+        self.checkpoint = DetectorCheckpoint(os.path.join(parent_dir, 'video', 'state', f"{config.camera_id}.state"))
+        self.is_first_detect = not self.checkpoint.restore(self.detector)
+        self.frame_dedup = FrameDeduplicator(config.dedup_distance, max_entries=config.dedup_window) if config.dedup_distance is not None else None
+        self.quality_gate = FrameQualityGate.from_config(config.camera_id, config.quality_config)
+        self.output_dir = os.path.join(parent_dir, 'video', 'output', config.camera_id)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.frame_seq = 0
+        self.frame_count = 0
+
+
+class AsyncOrchestrator:
+    def __init__(self, configs, decode_workers=None, inference_workers=1, io_workers=4,
+                 frame_interval=1.0, max_backoff=30.0, device=0, pin_threads=False, hot_swap=False, golden_dir=None):
+        cpu_count = os.cpu_count() or 4
+        self.configs = configs
+        self.frame_interval = frame_interval
+        self.max_backoff = max_backoff
+        self.device = device
+        # 推理线程池中的线程同时调用模型，torch 线程数按推理线程数划分；可选把解码/推理线程绑到各自的核
+        self.resources = configure_shared_process(inference_workers, len(configs))
+        plan = self.resources['plan']
+        self.decode_pool = ThreadPoolExecutor(decode_workers or max(1, cpu_count // 2), thread_name_prefix='decode',
+                                              initializer=pin_current_thread if pin_threads else None,
+                                              initargs=(plan['decode'],))
+        self.inference_pool = ThreadPoolExecutor(inference_workers, thread_name_prefix='inference',
+                                                 initializer=pin_current_thread if pin_threads else None,
+                                                 initargs=(plan['inference'][0],))
+        self.io_pool = ThreadPoolExecutor(io_workers, thread_name_prefix='io')
+        # 每个模型路径一个管理器，副本数等于推理线程数，而不是每个摄像头一个；hot_swap 时监视权重文件并在线替换
+        self.model_managers = {}
+        for config in configs:
+            if config.model_path not in self.model_managers:
+                manager = ModelManager(config.model_path, replicas=inference_workers, device=device,
+                                       golden_dir=golden_dir if hot_swap else None)
+                self.model_managers[config.model_path] = manager.start() if hot_swap else manager
+
+    # ---------------------------------------------------------------- 线程池中执行的阻塞函数
+
+    def _open(self, state):
+        cap = cv2.VideoCapture(state.config.rtsp_url)
+        if not cap.isOpened():
+            cap.release()
+            return False
+        state.cap = cap
+        # 部分摄像头/封装报告的帧率为0或异常大（如90000），限制在合理范围内，避免一次grab上千帧
+        state.fps = min(max(cap.get(cv2.CAP_PROP_FPS) or 25.0, 1.0), 60.0)
+        state.last_read = time.monotonic()
+        return True
+
+    def _read_latest(self, state):
+        """丢弃上次读取以来已缓冲的帧（只grab不解码输出），只对最新一帧retrieve
+        丢帧最多占用一个处理周期，帧率不准时也不会长时间占住解码线程"""
+        now = time.monotonic()
+        skip = min(int(state.fps * (now - state.last_read)) - 1, int(state.fps * self.frame_interval * 2))
+        deadline = now + self.frame_interval
+        for _ in range(max(0, skip)):
+            if not state.cap.grab():
+                return False, None
+            if time.monotonic() >= deadline:
+                break
+        ret, frame = state.frame_pool.read(state.cap)
+        state.last_read = time.monotonic()
+        return ret, frame
+
+    def _infer(self, model_path, frame):
+        return self.model_managers[model_path].predict(frame)
+
+    def _check_quality(self, state, frame):
+        start = time.perf_counter()
+        accept, reasons = state.quality_gate.check(frame)
+        return accept, reasons, (time.perf_counter() - start) * 1000
+
+    def _render_and_save(self, state, frame, results, save_path):
+        """近重复判定、标注、缩放和编码都是CPU开销，放在IO线程池中，避免阻塞事件循环"""
+        if state.frame_dedup is not None and state.frame_dedup.is_duplicate(frame, save_path):
+            return False
+        resized = state.frame_pool.resize_for_save(state.frame_pool.annotate(frame, results))
+        cv2.imwrite(save_path, resized)
+        return True
+
+    # ---------------------------------------------------------------- 协程
+
+    async def _connect(self, loop, state):
+        backoff = 1.0
+        while not await loop.run_in_executor(self.decode_pool, self._open, state):
+            yolo_logger.warning(f"连接 {state.config.camera_id} 失败，{backoff:.0f} 秒后重试")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+        yolo_logger.info(f"已连接摄像头 {state.config.camera_id}")
+
+    async def run_camera(self, config):
+        loop = asyncio.get_running_loop()
+        state = CameraState(config)
+        try:
+            await self._connect(loop, state)
+            next_tick = loop.time()
+            while True:
+                next_tick += self.frame_interval
+                ret, frame = await loop.run_in_executor(self.decode_pool, self._read_latest, state)
+                if not ret:
+                    yolo_logger.warning(f"摄像头 {config.camera_id} 读取失败，重新连接")
+                    await loop.run_in_executor(self.decode_pool, state.cap.release)
+                    await self._connect(loop, state)
+                    next_tick = loop.time()
+                    continue
+                capture_time, capture_monotonic = time.time(), time.monotonic()
+                state.frame_seq += 1
+                quality = None
+                if state.quality_gate is not None:
+                    # 灰屏、花屏、黑屏、卡帧不送入模型，本周期跳过
+                    quality = await loop.run_in_executor(self.decode_pool, self._check_quality, state, frame)
+                if quality is None or quality[0]:
+                    await self.process_frame(loop, state, frame, capture_time, capture_monotonic, quality)
+                delay = next_tick - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    next_tick = loop.time()  # 处理不过来时不累积欠账
+        finally:
+            # 出错重启或被取消时释放连接，否则每次重启都会遗留一个RTSP连接和解码器
+            if state.cap is not None:
+                self.decode_pool.submit(state.cap.release)
+
+    async def process_frame(self, loop, state, frame, capture_time, capture_monotonic, quality=None):
+        config = state.config
+        message = config.message
+        message.stamp_capture(capture_time, capture_monotonic, state.frame_seq)
+        if quality is not None:
+            _, reasons, quality_ms = quality
+            message.add_trace('quality', quality_ms)
+            if reasons:
+                message.trace['frame_quality'] = reasons  # 只标记不跳过的原因
+        stage_start = time.perf_counter()
+        results = await loop.run_in_executor(self.inference_pool, self._infer, config.model_path, frame)
+        message.add_trace('inference', (time.perf_counter() - stage_start) * 1000)
+
+        # 事件逻辑很轻，直接在事件循环中执行，保证同一摄像头的状态按顺序更新
+        stage_start = time.perf_counter()
+        event_status = state.detector.detect_events(results, state.is_first_detect, message)
+        state.is_first_detect = False
+        message.add_trace('events', (time.perf_counter() - stage_start) * 1000)
+        if any(value != 0 for value in event_status.values()):
+            message.message_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+            message.trace['sent_time'] = time.time()
+            body = message.to_json()
+            if isinstance(config.transport, PriorityPublisher):
+                config.transport.send_event(message, body)  # 分级发布只是入队，不阻塞事件循环
+            else:
+                # 直接发布是同步的（失败时重连、重试会等待数秒），放到IO线程池；消息对象下一帧会被复用，路由按快照计算
+                await loop.run_in_executor(self.io_pool, config.transport.send_event, copy.copy(message), body)
+            if config.event_store is not None:
+                config.event_store.add(body)
+        if time.monotonic() - state.checkpoint.last_save >= state.checkpoint.interval:
+            await loop.run_in_executor(self.io_pool, state.checkpoint.maybe_save, state.detector)
+
+        state.frame_count += 1
+        save_path = os.path.join(state.output_dir, f"{state.frame_count}_{time.strftime('%Y%m%d_%H%M%S', time.localtime())}.jpg")
+        await loop.run_in_executor(self.io_pool, self._render_and_save, state, frame, results, save_path)
+
+    async def run(self):
+        yolo_logger.info(f"asyncio 编排启动：{len(self.configs)} 路摄像头，"
+                         f"解码 {self.decode_pool._max_workers} / 推理 {self.inference_pool._max_workers} / IO {self.io_pool._max_workers} 线程，"
+                         f"torch {self.resources.get('torch_threads')} / OpenCV {self.resources.get('opencv_threads')} 线程")
+        try:
+            await asyncio.gather(*(self._guard(config) for config in self.configs))
+        finally:
+            self.decode_pool.shutdown(wait=False)
+            self.inference_pool.shutdown(wait=False)
+            self.io_pool.shutdown(wait=False)
+            for manager in self.model_managers.values():
+                manager.stop()
+
+    async def _guard(self, config):
+        """单个摄像头异常不影响其他摄像头，出错后延时重启该摄像头协程"""
+        while True:
+            try:
+                await self.run_camera(config)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                yolo_logger.error(f"处理 {config.rtsp_url} 时出现错误: {e}")
+                await asyncio.sleep(self.max_backoff)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='asyncio 编排多路RTSP摄像头推理')
+    parser.add_argument('--model', default=os.path.join(parent_dir, 'yolo_rtsp', 'yolo11n.pt'))
+    parser.add_argument('--decode-workers', type=int, default=None)
+    parser.add_argument('--inference-workers', type=int, default=1)
+    parser.add_argument('--io-workers', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=1.0, help='每路摄像头推理间隔（秒）')
+    parser.add_argument('--pin-threads', action='store_true', help='解码/推理线程绑定到 ResourceManager 分配的核')
+    parser.add_argument('--hot-swap', action='store_true', help='监视模型文件，新权重验证通过后不停机替换')
+    parser.add_argument('--golden-dir', default=os.path.join(parent_dir, 'video', 'golden'), help='热更新验证用的黄金帧目录')
+    args = parser.parse_args()
+
+    yolo_logger.info("启动RTSP视频流处理（asyncio模式）")
+    event_store = EventStore(os.path.join(parent_dir, 'video', 'events.db'))
+    configs = [
+        RtspYoloConfig('admin', '123456', '192.168.1.64', '554', '1', args.model, '1', event_store),
+        RtspYoloConfig('admin', '123456', '192.168.1.65', '554', '2', args.model, '2', event_store),
+    ]
+    orchestrator = AsyncOrchestrator(configs, args.decode_workers, args.inference_workers, args.io_workers,
+                                     frame_interval=args.interval, pin_threads=args.pin_threads,
+                                     hot_swap=args.hot_swap, golden_dir=args.golden_dir)
+    try:
+        asyncio.run(orchestrator.run())
+    finally:
+        event_store.close()
@@ -0,0 +1,141 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from yolo_rtsp.BatchEventDetector import EVENT_FIELDS, BatchEventDetector
+from yolo_rtsp.DetectionResult import DetectionResult
+from yolo_rtsp.EventDetector import LeftEventDetector
+from yolo_rtsp.replay_benchmark import NAMES, synthetic_scenario
+
+'''批量事件检测校验与基准
+    1. 一致性：每个摄像头生成随机场景（部件出现/消失、移动、开关舱、飞行员进出座舱），
+       逐帧比较 BatchEventDetector 与各自独立的 LeftEventDetector 的事件状态和内部状态
+    2. 性能：同样的检测结果，逐个摄像头调用 LeftEventDetector 与一次批量更新的耗时对比
+    python batch_detector_benchmark.py --cameras 500 --frames 200
+'''
+
+STATE_FIELDS = ('last_pilot_in_cockpit', 'last_plane_in_hangar', 'last_cockpit_status', 'plane_is_moving',
+                'static_frame_count', 'moving_frame_count', 'last_aviator_detected')
+
+
+def random_scenario(frames, rng):
+    """随机游走的检测结果序列，覆盖事件逻辑的各个分支"""
+    present = {label: rng.random() < 0.5 for label in NAMES.values()}
+    boxes = {label: rng.uniform(0, 800, 2) for label in NAMES.values()}
+    sequence = []
+    for _ in range(frames):
+        xyxy, cls = [], []
+        for class_id, label in NAMES.items():
+            if rng.random() < 0.15:
+                present[label] = not present[label]
+            if rng.random() < 0.1:
+                boxes[label] = boxes[label] + rng.normal(0, 60, 2)  # 偶尔大幅移动
+            else:
+                boxes[label] = boxes[label] + rng.normal(0, 5, 2)
+            if not present[label]:
+                continue
+            x, y = boxes[label]
+            size = (300, 200) if label.startswith('cabin') else (60, 90) if label == 'aviator' else (500, 300)
+            if label == 'aviator' and rng.random() < 0.5 and present['cabin_cover_on']:
+                x, y = boxes['cabin_cover_on'] + rng.uniform(0, 120, 2)  # 飞行员在座舱内
+            xyxy.append([x, y, x + size[0], y + size[1]])
+            cls.append(class_id)
+            if rng.random() < 0.05:
+                xyxy.append([x + 3, y + 3, x + size[0], y + size[1]])  # 同类别重复框，后一个生效
+                cls.append(class_id)
+        sequence.append([DetectionResult.from_arrays(np.array(xyxy, dtype=np.float32).reshape(-1, 4), cls,
+                                                     np.full(len(cls), 0.9), NAMES)])
+    return sequence
+
+
+def check_equivalence(cameras, frames, seed):
+    rng = np.random.default_rng(seed)
+    scenarios = [random_scenario(frames, rng) for _ in range(cameras - 1)]
+    scenarios.append([results for _, results in synthetic_scenario(frames // 70 + 1)][:frames])
+    frames = min(len(scenario) for scenario in scenarios)
+    detectors = [LeftEventDetector() for _ in scenarios]
+    batch = BatchEventDetector(len(scenarios))
+    indices = np.arange(len(scenarios))
+    mismatches = 0
+    coverage = {field: 0 for field in EVENT_FIELDS}
+    for frame in range(frames):
+        now = 1700000000.0 + frame * 7
+        results_list = [scenario[frame] for scenario in scenarios]
+        status = batch.detect_results(indices, results_list, frame == 0, now)
+        for camera, detector in enumerate(detectors):
+            status_single = detector.detect_events(results_list[camera], frame == 0, current_time=now)
+            expected = {field: status_single[field] for field in EVENT_FIELDS}
+            actual = {field: int(status[field][camera]) for field in EVENT_FIELDS}
+            for field, value in expected.items():
+                coverage[field] += value != 0
+            state_ok = all(int(getattr(detector, name)) == int(getattr(batch, name)[camera]) for name in STATE_FIELDS)
+            if actual != expected or not state_ok:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"frame {frame} camera {camera}: expected {expected}, got {actual}, state ok {state_ok}")
+    print(f"Equivalence: {len(scenarios)} cameras x {frames} frames, {mismatches} mismatching camera-frames"
+          f" (non-zero events per field: {coverage})")
+    return mismatches == 0
+
+
+def benchmark(cameras, frames, seed):
+    rng = np.random.default_rng(seed)
+    pool = [random_scenario(frames, rng) for _ in range(min(cameras, 20))]
+    scenarios = [pool[camera % len(pool)] for camera in range(cameras)]
+    indices = np.arange(cameras)
+
+    detectors = [LeftEventDetector() for _ in range(cameras)]
+    start = time.perf_counter()
+    for frame in range(frames):
+        for camera, detector in enumerate(detectors):
+            detector.detect_events(scenarios[camera][frame], frame == 0, current_time=float(frame))
+    scalar = (time.perf_counter() - start) / frames
+
+    batch = BatchEventDetector(cameras)
+    start = time.perf_counter()
+    for frame in range(frames):
+        batch.detect_results(indices, [scenario[frame] for scenario in scenarios], frame == 0, float(frame))
+    with_conversion = (time.perf_counter() - start) / frames
+
+    # 推理批次直接给出列数据时（例如批量推理的输出），只剩向量化状态更新
+    columns = []
+    for frame in range(frames):
+        frame_index, slots, xyxy = [], [], []
+        for camera, scenario in enumerate(scenarios):
+            xyxy_c, cls_c, _ = scenario[frame][0].to_arrays()
+            frame_index.append(np.full(len(cls_c), camera))
+            slots.append(BatchEventDetector.slot_table(NAMES)[cls_c.astype(np.int64)])
+            xyxy.append(xyxy_c)
+        columns.append((np.concatenate(frame_index), np.concatenate(slots), np.concatenate(xyxy)))
+    batch = BatchEventDetector(cameras)
+    start = time.perf_counter()
+    for frame, (frame_index, slots, xyxy) in enumerate(columns):
+        batch.detect_batch(indices, frame_index, slots, xyxy, frame == 0, float(frame))
+    columnar = (time.perf_counter() - start) / frames
+
+    print(f"{cameras:>5} cameras: per-camera loop {scalar * 1000:8.3f} ms/step | batch {with_conversion * 1000:8.3f} ms/step"
+          f" | batch (columnar input) {columnar * 1000:8.3f} ms/step")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='校验批量事件检测与 LeftEventDetector 一致，并比较耗时')
+    parser.add_argument('--cameras', default='1,50,500', help='基准测试的摄像头数量，逗号分隔')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--check-cameras', type=int, default=64, help='一致性校验的摄像头数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.getLogger('yolo_rtsp').setLevel(logging.WARNING)  # 检测器日志开销会淹没事件逻辑本身
+    ok = check_equivalence(args.check_cameras, args.frames, args.seed)
+    for cameras in [int(value) for value in args.cameras.split(',')]:
+        benchmark(cameras, args.frames, args.seed)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,127 @@
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from yolo_rtsp.DetectionResult import DetectionResult
+from yolo_rtsp.EventDetector import LeftEventDetector
+from yolo_rtsp.FramePool import FramePool
+
+NAMES = {0: 'cabin_cover_on', 1: 'cabin_cover_off', 2: 'air_crew', 3: 'red_on', 4: 'red_off', 5: 'aviator'}
+
+
+class FakeCapture:
+    """模拟 VideoCapture：支持 read(image) 写入调用方的缓冲区"""
+    def __init__(self, height, width):
+        self.source = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+
+    def read(self, image=None):
+        if image is None or image.shape != self.source.shape:
+            image = np.empty_like(self.source)
+        np.copyto(image, self.source)
+        return True, image
+
+
+def make_results(step):
+    offset = (step % 20) * 3.0
+    xyxy = np.array([[100, 100 + offset, 400, 300 + offset],
+                     [150, 120, 220, 260],
+                     [50, 400, 500, 600]], dtype=np.float32)
+    return [DetectionResult.from_arrays(xyxy, [0, 5, 3], [0.9, 0.8, 0.7], NAMES)]
+
+
+def legacy_step(cap, detector_state, results):
+    """改造前的写法：每帧分配新帧、plot拷贝、缩放拷贝、事件字典和检测框字典"""
+    ret, frame = cap.read()
+    annotated = frame.copy()
+    height, width = annotated.shape[:2]
+    resized = cv2.resize(annotated, (800, int(height * 800 / width)))
+    current, previous = detector_state
+    for result in results:
+        for box in result.boxes:
+            label = result.names[int(box.cls[0].item())]
+            if label in current:
+                current[label] = box.xyxy[0].cpu().numpy().astype(int)
+    event_status = {'plane_sliding_status': 0, 'pilot_boarding_status': 0, 'pilot_in_hangar': 0,
+                    'cabin_cover_state': 0, 'skin': 0, 'cabin_occupied': 0}
+    detector_state[1] = current.copy()
+    detector_state[0] = {key: None for key in current}
+    return resized, event_status
+
+
+def pooled_step(cap, pool, detector, results, is_first_detect):
+    ret, frame = pool.read(cap)
+    annotated = pool.annotate(frame, results)
+    resized = pool.resize_for_save(annotated)
+    event_status = detector.detect_events(results, is_first_detect)
+    return resized, event_status
+
+
+def rss_mb():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def run(name, step, frames, warmup):
+    gc_time = [0.0]
+    gc_start = [0.0]
+
+    def on_gc(phase, info):
+        if phase == 'start':
+            gc_start[0] = time.perf_counter()
+        else:
+            gc_time[0] += time.perf_counter() - gc_start[0]
+
+    for i in range(warmup):
+        step(i)
+    gc.collect()
+    gc.callbacks.append(on_gc)
+    collections_before = sum(stat['collections'] for stat in gc.get_stats())
+    rss_before = rss_mb()
+    tracemalloc.start()
+    allocated = 0
+    blocks = 0
+    start = time.perf_counter()
+    for i in range(frames):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        snapshot_blocks = sys.getallocatedblocks()
+        step(warmup + i)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+        blocks += max(0, sys.getallocatedblocks() - snapshot_blocks)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    gc.callbacks.remove(on_gc)
+    collections = sum(stat['collections'] for stat in gc.get_stats()) - collections_before
+    print(f"{name:>8}: {elapsed / frames * 1000:7.3f} ms/frame | peak transient alloc {allocated / frames / 1024:9.1f} KiB/frame"
+          f" | net blocks {blocks / frames:6.1f}/frame | RSS {rss_before:7.1f} -> {rss_mb():7.1f} MiB"
+          f" | gc {collections} collections, {gc_time[0] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='对比热循环改造前后每帧的内存分配、RSS和GC')
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    args = parser.parse_args()
+
+    cap = FakeCapture(args.height, args.width)
+    results_cycle = [make_results(i) for i in range(20)]
+
+    state = [{label: None for label in ('cabin_cover_on', 'cabin_cover_off', 'red_off', 'red_on', 'aviator')}, None]
+    run('legacy', lambda i: legacy_step(cap, state, results_cycle[i % 20]), args.frames, args.warmup)
+
+    pool = FramePool(save_width=800)
+    detector = LeftEventDetector()
+    run('pooled', lambda i: pooled_step(cap, pool, detector, results_cycle[i % 20], i == 0), args.frames, args.warmup)
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from yolo_rtsp.ResourceManager import available_cores, configure_libraries, configure_shared_process
+
+'''线程配置基准：N 个摄像头线程同时做 解码(模拟) -> 推理 -> JPEG编码，比较不同线程设置下的吞吐和尾延迟
+    BLAS/OpenMP 线程数只能在导入前通过环境变量设置，所以每种设置在独立子进程中运行
+    推理：安装了 torch 时用卷积网络模拟，否则用 numpy 矩阵乘（走 BLAS 线程池）
+    python benchmark_threads.py --cameras 8 --frames 100
+'''
+
+# (名称, BLAS/OpenMP环境变量线程数, 进程内设置方式)
+SETTINGS = [
+    ('default', None, 'none'),   # 不做限制，各库按全部核数开线程池
+    ('single', 1, 'single'),     # 所有库都只用1个线程
+    ('planned', 1, 'planned'),   # ResourceManager.configure_shared_process 按摄像头数划分
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def make_model():
+    """返回一个模拟推理的函数"""
+    try:
+        import torch
+        net = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 32, 3, stride=2, padding=1), torch.nn.ReLU(),
+            torch.nn.Conv2d(32, 64, 3, stride=2, padding=1), torch.nn.ReLU(),
+            torch.nn.Conv2d(64, 64, 3, stride=2, padding=1)).eval()
+
+        def infer(image):
+            with torch.no_grad():
+                tensor = torch.from_numpy(image).permute(2, 0, 1).unsqueeze(0).float()
+                return net(tensor)
+        return infer, 'torch'
+    except ImportError:
+        import numpy as np
+        weights = np.random.rand(640, 640).astype(np.float32)
+
+        def infer(image):
+            features = image[:, :, 0].astype(np.float32)  # 384 x 640
+            return features @ weights
+        return infer, 'numpy'
+
+
+def run_worker(args):
+    import cv2
+    import numpy as np
+
+    if args.mode == 'single':
+        applied = configure_libraries(torch_threads=1, opencv_threads=1, blas_threads=1)
+    elif args.mode == 'planned':
+        applied = configure_shared_process(args.cameras)
+        applied.pop('plan')
+    else:
+        applied = {}
+    infer, backend = make_model()
+    source = np.random.randint(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    latencies = [[] for _ in range(args.cameras)]
+
+    def camera(index):
+        for _ in range(args.frames):
+            start = time.perf_counter()
+            frame = cv2.GaussianBlur(source, (5, 5), 0)              # 解码后处理（模拟）
+            infer(cv2.resize(frame, (640, 384)))                       # 推理
+            cv2.imencode('.jpg', cv2.resize(frame, (800, 450)))        # 编码保存
+            latencies[index].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=camera, args=(index,)) for index in range(args.cameras)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    all_latencies = [value for values in latencies for value in values]
+    print(json.dumps({'backend': backend, 'applied': applied, 'fps': len(all_latencies) / elapsed,
+                      'p50': percentile(all_latencies, 0.5), 'p99': percentile(all_latencies, 0.99),
+                      'max': max(all_latencies)}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='比较不同线程设置下多路摄像头的吞吐和尾延迟')
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--frames', type=int, default=50, help='每路摄像头处理的帧数')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', default='none', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        sys.exit(0)
+
+    print(f"{len(available_cores())} cores, {args.cameras} camera threads, {args.frames} frames each")
+    for name, env_threads, mode in SETTINGS:
+        env = dict(os.environ)
+        if env_threads is not None:
+            for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+                env[variable] = str(env_threads)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', '--mode', mode,
+                                 '--cameras', str(args.cameras), '--frames', str(args.frames)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:>8}: {result['fps']:7.1f} frames/s | p50 {result['p50']:7.1f} ms | p99 {result['p99']:7.1f} ms"
+              f" | max {result['max']:7.1f} ms | {result['backend']} {result['applied']}")
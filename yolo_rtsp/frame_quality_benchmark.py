@@ -0,0 +1,114 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from yolo_rtsp.FrameQualityGate import FrameQualityGate, check_batch, frame_metrics, thumbnail
+
+'''帧质量检查校验与基准
+    以仓库中的样例图片为正常画面，加上噪声/亮度/压缩等正常变化，以及模拟的黑屏、过曝、灰屏、
+    丢包灰块、向下拖影、绿屏、模糊和卡帧，检查每类是否按预期判定，并统计单帧和批量检查耗时
+    python frame_quality_benchmark.py --size 1920x1080
+'''
+
+
+def base_frames(size):
+    frames = []
+    for path in ('MQProject/bus.jpg', 'yolo_rtsp/result.jpg'):
+        image = cv2.imread(os.path.join(parent_dir, path))
+        if image is not None:
+            frames.append(cv2.resize(image, size))
+    return frames
+
+
+def variants(frame, rng):
+    """(名称, 期望原因, 画面)；期望原因为 None 表示应当通过"""
+    height, width = frame.shape[:2]
+    noisy = np.clip(frame.astype(np.int16) + rng.integers(-6, 7, frame.shape), 0, 255).astype(np.uint8)
+    jpeg = cv2.imdecode(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 40])[1], cv2.IMREAD_COLOR)
+    dim = cv2.convertScaleAbs(frame, alpha=0.45)
+    grey_tail = noisy.copy()
+    grey_tail[int(height * 0.6):] = 128
+    smear = noisy.copy()
+    smear[int(height * 0.5):] = smear[int(height * 0.5) - 1]
+    green = noisy.copy()
+    green[int(height * 0.3):] = (0, 135, 0)
+    night = np.clip(frame.astype(np.float32) * 0.04 + rng.normal(0, 2, frame.shape), 0, 255).astype(np.uint8)
+    return [
+        ('noisy', None, noisy),
+        ('jpeg q40', None, jpeg),
+        ('dim', None, dim),
+        ('night', 'dark', night),
+        ('overexposed', 'overexposed', cv2.convertScaleAbs(frame, alpha=1.0, beta=230)),
+        ('grey', 'flat', np.full_like(frame, 128) + rng.integers(0, 3, frame.shape, dtype=np.uint8)),
+        ('grey tail', 'corrupt', grey_tail),
+        ('smear', 'corrupt', smear),
+        ('green', 'corrupt', green),
+        ('blur', 'blurred', cv2.GaussianBlur(frame, (0, 0), width / 80)),
+    ]
+
+
+def check_cases(frames, seed):
+    rng = np.random.default_rng(seed)
+    errors = 0
+    for frame_index, frame in enumerate(frames):
+        for name, expected, image in variants(frame, rng):
+            gate = FrameQualityGate(log_interval=0)
+            accept, reasons = gate.check(image)
+            metrics = {key: round(float(value[0]), 3) for key, value in frame_metrics(thumbnail(image)).items()}
+            ok = reasons == ([] if expected is None else [expected])
+            errors += not ok
+            print(f"frame {frame_index} {name:<12} {'OK ' if ok else 'BAD'} accept={accept!s:<5} reasons={reasons} {metrics}")
+        # 卡帧：同一画面连续出现，第二帧起为 duplicate；正常噪声下的相邻帧不应判为重复
+        gate = FrameQualityGate(log_interval=0)
+        frozen = [gate.check(frame)[1] for _ in range(3)]
+        live = [gate.check(np.clip(frame.astype(np.int16) + rng.integers(-3, 4, frame.shape), 0, 255)
+                           .astype(np.uint8))[1] for _ in range(3)]
+        ok = frozen == [[], ['duplicate'], ['duplicate']] and live == [[], [], []]
+        errors += not ok
+        print(f"frame {frame_index} {'frozen':<12} {'OK ' if ok else 'BAD'} frozen={frozen} live={live}")
+    return errors
+
+
+def benchmark(frames, cameras, repeat):
+    image = frames[0]
+    gate = FrameQualityGate(log_interval=0)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        gate.check(image)
+    single_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    gates = [FrameQualityGate(str(camera), log_interval=0) for camera in range(cameras)]
+    batch = [frames[camera % len(frames)] for camera in range(cameras)]
+    start = time.perf_counter()
+    for _ in range(max(1, repeat // cameras)):
+        check_batch(gates, batch)
+    batch_ms = (time.perf_counter() - start) * 1000 / max(1, repeat // cameras) / cameras
+    print(f"{image.shape[1]}x{image.shape[0]}: single check {single_ms:.3f} ms/frame | "
+          f"batch of {cameras} {batch_ms:.3f} ms/frame")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='校验帧质量检查的判定并统计耗时')
+    parser.add_argument('--size', default='1920x1080', help='画面尺寸 宽x高')
+    parser.add_argument('--cameras', type=int, default=16, help='批量检查的摄像头数')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.getLogger('yolo_rtsp').setLevel(logging.WARNING)
+    size = tuple(int(value) for value in args.size.split('x'))
+    frames = base_frames(size)
+    errors = check_cases(frames, args.seed)
+    benchmark(frames, args.cameras, args.repeat)
+    print(f"{errors} misclassified cases")
+    sys.exit(0 if errors == 0 else 1)
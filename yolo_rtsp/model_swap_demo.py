@@ -0,0 +1,194 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from yolo_rtsp.DetectionResult import DetectionResult
+from yolo_rtsp.ModelManager import ModelManager
+
+'''模型热更新验证：替身模型（权重文件为JSON，描述加载耗时、推理耗时和检测框偏移），多个推理线程持续推理
+    有黄金帧：正常版本（覆盖写 model_path，由监视线程发现）切换并通过观察期；偏离版本、变慢版本在验证阶段被拒绝
+    无黄金帧：变慢版本、偏离版本切换后在观察期内被自动回滚
+    request_update 切换到其他文件后，监视线程不会因为 model_path 未变化而切回原文件
+    经过级联式 runner（大部分帧复用缓存结果）推理时，变慢版本同样被回滚：复用的帧不计入耗时
+    同时检查推理线程全程没有出错，最长推理间隔不超过单次推理耗时的若干倍（加载和验证都在后台）
+    python model_swap_demo.py --threads 4
+'''
+
+NAMES = {0: 'aviator', 1: 'cabin_cover_on', 2: 'air_crew'}
+
+
+class StandInModel:
+    """替身模型：检测框由画面内容决定，shift 为整体偏移像素"""
+    def __init__(self, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            spec = json.load(file)
+        time.sleep(spec.get('load_s', 0.5))
+        self.latency_ms = spec['latency_ms']
+        self.shift = spec.get('shift', 0)
+
+    def __call__(self, frame, device=None, verbose=False):
+        time.sleep(self.latency_ms / 1000)
+        rng = np.random.default_rng(int(frame[::64, ::64].sum()))
+        xy = rng.uniform(0, 500, (3, 2)) + self.shift
+        xyxy = np.hstack([xy, xy + 80]).astype(np.float32)
+        return [DetectionResult.from_arrays(xyxy, [0, 1, 2], np.full(3, 0.9), NAMES, frame.shape[:2])]
+
+
+def write_model(path, latency_ms, shift=0, load_s=0.5):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'latency_ms': latency_ms, 'shift': shift, 'load_s': load_s}, file)
+    return path
+
+
+class CachingRunner:
+    """模拟级联：每 every 帧整帧推理一次，其余帧直接复用上次结果"""
+    def __init__(self, every=4):
+        self.every = every
+        self.count = 0
+        self.last = None
+        self.lock = threading.Lock()
+
+    def __call__(self, model, frame):
+        with self.lock:
+            self.count += 1
+            if self.last is not None and self.count % self.every:
+                return self.last, 'reused'
+        results = model(frame)
+        self.last = results
+        return results, 'full'
+
+
+class Workload:
+    """若干推理线程持续调用 manager.predict（每个线程复用一块帧缓冲区），记录错误数和最长推理间隔"""
+    def __init__(self, manager, threads, frames, runner=None):
+        self.manager = manager
+        self.frames = frames
+        self.runner = runner
+        self.stop_event = threading.Event()
+        self.errors = 0
+        self.count = 0
+        self.max_gap = 0.0
+        self.threads = [threading.Thread(target=self._loop, args=(index,), daemon=True) for index in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def _loop(self, index):
+        last = time.perf_counter()
+        buffer = np.empty_like(self.frames[0])  # 与 FramePool 一样每个线程复用同一块缓冲区
+        while not self.stop_event.is_set():
+            np.copyto(buffer, self.frames[(self.count + index) % len(self.frames)])
+            try:
+                self.manager.predict(buffer, runner=self.runner)
+            except Exception:
+                self.errors += 1
+            now = time.perf_counter()
+            self.max_gap = max(self.max_gap, now - last)
+            last = now
+            self.count += 1
+
+    def close(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+
+def wait_for(manager, actions, timeout=20.0):
+    """等待更新历史中出现指定个数的结论（committed/rejected/rolled_back）"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len([item for item in manager.history if item[1] != 'swapped']) >= actions:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run(threads, workdir):
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (360, 640, 3), dtype=np.uint8) for _ in range(32)]
+    golden_dir = os.path.join(workdir, 'golden')
+    os.makedirs(golden_dir)
+    for index, frame in enumerate(frames[:8]):
+        cv2.imwrite(os.path.join(golden_dir, f"{index:02d}.png"), frame)
+    options = dict(loader=StandInModel, replicas=threads, probation_frames=100, shadow_every=5, poll_interval=0.2)
+    base_ms = 10
+    ok = True
+
+    model_path = write_model(os.path.join(workdir, 'model.json'), base_ms)
+    manager = ModelManager(model_path, golden_dir=golden_dir, **options).start()
+    workload = Workload(manager, threads, frames)
+    time.sleep(0.5)  # 先积累旧版本的线上耗时，同时保证覆盖写后修改时间变化
+    write_model(model_path, base_ms, shift=1)               # 正常版本：覆盖写，由监视线程发现
+    ok &= wait_for(manager, 1)
+    manager.request_update(write_model(os.path.join(workdir, 'divergent.json'), base_ms, shift=60))
+    ok &= wait_for(manager, 2)
+    manager.request_update(write_model(os.path.join(workdir, 'slow.json'), base_ms * 3))
+    ok &= wait_for(manager, 3)
+    manager.request_update(write_model(os.path.join(workdir, 'other.json'), base_ms, shift=1))
+    ok &= wait_for(manager, 4)
+    time.sleep(options['poll_interval'] * 4)  # 监视线程多轮轮询后仍应停留在 other.json
+    workload.close()
+    manager.stop()
+    expected = ['swapped', 'committed', 'rejected', 'rejected', 'swapped', 'committed']
+    ok &= report('with golden set', manager, workload, expected, 'other.json', base_ms)
+
+    manager = ModelManager(write_model(os.path.join(workdir, 'base.json'), base_ms), **options).start()
+    workload = Workload(manager, threads, frames)
+    time.sleep(0.5)
+    manager.request_update(write_model(os.path.join(workdir, 'slow2.json'), base_ms * 3))
+    ok &= wait_for(manager, 1)
+    manager.request_update(write_model(os.path.join(workdir, 'divergent2.json'), base_ms, shift=60))
+    ok &= wait_for(manager, 2)
+    workload.close()
+    manager.stop()
+    expected = ['swapped', 'rolled_back', 'swapped', 'rolled_back']
+    ok &= report('without golden set', manager, workload, expected, 'base.json', base_ms)
+
+    manager = ModelManager(write_model(os.path.join(workdir, 'base3.json'), base_ms), **options).start(watch=False)
+    workload = Workload(manager, threads, frames, runner=CachingRunner())
+    time.sleep(0.5)
+    manager.request_update(write_model(os.path.join(workdir, 'slow3.json'), base_ms * 3))
+    ok &= wait_for(manager, 1, timeout=40.0)
+    workload.close()
+    manager.stop()
+    ok &= report('cascade runner', manager, workload, ['swapped', 'rolled_back'], 'base3.json', base_ms)
+    return ok
+
+
+def report(title, manager, workload, expected, active_file, base_ms):
+    actions = [item[1] for item in manager.history]
+    print(f"{title}: {workload.count} inferences, {workload.errors} errors, max gap {workload.max_gap * 1000:.1f} ms, "
+          f"active {manager.active.name}")
+    for _, action, name, reason in manager.history:
+        print(f"    {action:<12} {name:<28} {reason}")
+    ok = (actions == expected and workload.errors == 0 and manager.active.name.startswith(active_file)
+          and workload.max_gap * 1000 < base_ms * 3 * 4)
+    print(f"    {'OK' if ok else 'FAILED'} (expected {expected})")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='验证模型热更新：后台加载、黄金帧验证、原子切换和自动回滚')
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    logging.getLogger('yolo_rtsp').setLevel(logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='model_swap_')
+    try:
+        ok = run(args.threads, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
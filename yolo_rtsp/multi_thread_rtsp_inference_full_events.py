@@ -1,7 +1,14 @@
+import os
+import sys
+
+# 必须在导入 cv2/torch/numpy 之前限制 BLAS/OpenMP 线程数，之后再按摄像头数设置（见 ResourceManager）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yolo_rtsp.ResourceManager import limit_env_threads, configure_shared_process
+limit_env_threads(1)
+
 import cv2
 import threading
 import time
-import os
 import configparser
 
 import sys
@@ -18,9 +25,19 @@ from ultralytics import YOLO
 # 导入消息队列相关模块
 from MQProject.message import Message
 from MQProject.mq import RabbitMQ
+from MQProject.event_store import EventStore
+from MQProject.tool.frame_dedup import FrameDeduplicator
 from common import yolo_logger # 使用Python内置的logging模块替代无法导入的统一日志模块
-from yolo_rtsp.EventDetector import EventDetector
+from yolo_rtsp.EventDetector import LeftEventDetector
+from yolo_rtsp.FramePool import FramePool
+from yolo_rtsp.FrameQualityGate import FrameQualityGate
+from yolo_rtsp.ModelManager import ModelManager
+from yolo_rtsp.DetectorCheckpoint import DetectorCheckpoint
+from yolo_rtsp.DetectionCascade import DetectionCascade, SAMPLE_KINDS
+from yolo_rtsp.DetectionTrace import TraceRecorder
+from yolo_rtsp.ProfileManager import ProfileManager
 from yolo_rtsp.RtspYoloConfig import RtspYoloConfig
+from yolo_rtsp.ZoneMap import ZoneMap
 
 
 
@@ -34,10 +51,29 @@ def process_rtsp_stream(rtsp_yolo_config):
 
         
     try:
-        # 每个线程单独加载模型
-        model = YOLO(rtsp_yolo_config.model_path)
+        # 有共享的模型管理器时每帧从管理器取当前版本（支持热更新），否则每个线程单独加载模型
+        model_manager = rtsp_yolo_config.model_manager
+        model = YOLO(rtsp_yolo_config.model_path) if model_manager is None else None
+        cascade = None
+        if rtsp_yolo_config.cascade_config:
+            cascade = DetectionCascade.from_config(model, rtsp_yolo_config.cascade_config, device=0)
+
+        def cascade_runner(current_model, frame):
+            # 级联的第二级使用管理器当前版本的模型；复用缓存或只跑第一级的帧不计入新版本的观察期统计
+            cascade.stage2_model = current_model
+            results = cascade(frame)
+            return results, SAMPLE_KINDS.get(cascade.last_stage, 'reused')
+
         cap = cv2.VideoCapture(rtsp_yolo_config.rtsp_url)
-        event_detector = EventDetector()
+        event_detector = LeftEventDetector()
+        # 固定区域在启动时栅格化，之后每帧只做查表
+        if rtsp_yolo_config.zones_path:
+            event_detector.zone_map = ZoneMap.load(rtsp_yolo_config.zones_path)
+        # 定期快照检测器状态，重启后快照足够新则直接恢复，不再把第一帧当作首次检测
+        checkpoint = DetectorCheckpoint(os.path.join(parent_dir, 'video', 'state', f"{rtsp_yolo_config.camera_id}.state"))
+        is_first_detect = not checkpoint.restore(event_detector)
+        # 预分配的解码/标注/缩放缓冲区，稳态运行不再每帧分配
+        frame_pool = FramePool(save_width=800)
         frame_interval = 1  # 每秒处理一帧
         last_process_time = time.time()
         
@@ -48,53 +84,112 @@ def process_rtsp_stream(rtsp_yolo_config):
         
         # 帧计数器
         frame_count = 0
+        # 近重复帧（如空机库）不再保存
+        frame_dedup = None
+        if rtsp_yolo_config.dedup_distance is not None:
+            frame_dedup = FrameDeduplicator(rtsp_yolo_config.dedup_distance, max_entries=rtsp_yolo_config.dedup_window)
+        # 解码帧序号，用于链路追踪
+        frame_seq = 0
+        # 录制检测结果，供不依赖模型的回放测试使用
+        trace_recorder = TraceRecorder(rtsp_yolo_config.trace_path) if rtsp_yolo_config.trace_path else None
+        # 推理前的帧质量检查：灰屏、花屏、黑屏、卡帧不送入模型，避免浪费推理和事件抖动
+        quality_gate = FrameQualityGate.from_config(rtsp_yolo_config.camera_id, rtsp_yolo_config.quality_config)
+        next_check_time = 0.0
+        # 按需性能分析钩子，未开启分析时 enter() 只做一次判断
+        profile_manager = ProfileManager()
+        profile_hook = profile_manager.register(rtsp_yolo_config.camera_id)
+        # 运行统计通过 /profile/status 和 /metrics 查看
+        if quality_gate is not None:
+            profile_manager.register_metrics(rtsp_yolo_config.camera_id, 'frame_quality', quality_gate.stats)
+        if cascade is not None:
+            profile_manager.register_metrics(rtsp_yolo_config.camera_id, 'cascade', cascade.stats)
 
         while cap.isOpened():
-            ret, frame = cap.read()
+            profile_hook.enter('decode')
+            read_start = time.perf_counter()
+            ret, frame = frame_pool.read(cap)
             if ret:
-                current_time = time.time()
-                if current_time - last_process_time >= frame_interval:
+                # 帧采集时间：墙上时钟 + 单调时钟，高精度
+                capture_time = time.time()
+                capture_monotonic = time.monotonic()
+                read_ms = (time.perf_counter() - read_start) * 1000
+                frame_seq += 1
+                current_time = capture_time
+                process = current_time - last_process_time >= frame_interval and current_time >= next_check_time
+                quality_reasons = []
+                if process and quality_gate is not None:
+                    # 不合格的帧直接跳过，不更新处理时间，稍后重新检查，不必等满采样间隔
+                    profile_hook.enter('quality')
+                    stage_start = time.perf_counter()
+                    process, quality_reasons = quality_gate.check(frame)
+                    quality_ms = (time.perf_counter() - stage_start) * 1000
+                    if not process:
+                        next_check_time = current_time + min(quality_gate.retry_interval, frame_interval)
+                        yolo_logger.debug(f"{rtsp_yolo_config.camera_id} 跳过不合格帧 {frame_seq}: {quality_reasons}")
+                if process:
                     start_time = time.time()  # 记录开始处理的时间
+                    message = rtsp_yolo_config.message
+                    message.stamp_capture(capture_time, capture_monotonic, frame_seq)
+                    message.add_trace('decode', read_ms)
+                    if quality_gate is not None:
+                        message.add_trace('quality', quality_ms)
+                        if quality_reasons:
+                            message.trace['frame_quality'] = quality_reasons  # 只标记不跳过的原因
                     # 在 GPU 上进行推理，device=0 表示使用第一个 GPU
-                    results = model(frame, device=0)
-                    # 获取检测结果中的飞行员和座舱的框坐标
-                    current_pilot_box = None
-                    current_cockpit_box = None
-                    current_plane_detected = False
-                    for result in results:
-                        boxes = result.boxes
-                        for box in boxes:
-                            class_id = int(box.cls[0])
-                            label = model.names[class_id]
+                    profile_hook.enter('inference')
+                    stage_start = time.perf_counter()
+                    if model_manager is not None:
+                        results = model_manager.predict(frame, runner=cascade_runner if cascade is not None else None)
+                    elif cascade is not None:
+                        results = cascade(frame)
+                    else:
+                        results = model(frame, device=0)
+                    message.add_trace('inference', (time.perf_counter() - stage_start) * 1000)
+                    if trace_recorder is not None:
+                        trace_recorder.record(results, capture_time)
                     # 进行事件检测
-                    event_status = event_detector.detect_events(results, rtsp_yolo_config.message)
+                    profile_hook.enter('events')
+                    stage_start = time.perf_counter()
+                    event_status = event_detector.detect_events(results, is_first_detect, rtsp_yolo_config.message)
+                    is_first_detect = False
+                    checkpoint.maybe_save(event_detector)
+                    message.add_trace('events', (time.perf_counter() - stage_start) * 1000)
                     
                     # 发送消息
                     if event_status and any(value != 0 for value in event_status.values()):
+                        profile_hook.enter('publish')
                         rtsp_yolo_config.message.message_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-                        rtsp_yolo_config.rabbit_mq.send_message('predicate', rtsp_yolo_config.message.to_json())
+                        message.trace['sent_time'] = time.time()
+                        rtsp_yolo_config.transport.send_event(rtsp_yolo_config.message)
                         yolo_logger.info(f"已发送消息: {rtsp_yolo_config.message.to_json()}")
+                        # 写入本地事件存储，便于按时间回溯查询
+                        if rtsp_yolo_config.event_store is not None:
+                            rtsp_yolo_config.event_store.add(rtsp_yolo_config.message)
                     
                     
                     # 可视化检测结果
-                    annotated_frame = results[0].plot()
+                    profile_hook.enter('render')
+                    annotated_frame = frame_pool.annotate(frame, results)
                     cv2.imshow(rtsp_yolo_config.rtsp_url, annotated_frame)
                     
-                    # 保存检测结果图片
+                    # 保存检测结果图片，与已保存画面近重复时跳过编码
+                    profile_hook.enter('save')
                     frame_count += 1
                     timestamp = time.strftime('%Y%m%d_%H%M%S', time.localtime())
                     save_path = os.path.join(output_dir, f"{frame_count}_{timestamp}.jpg")
-                    # 调整图片大小为宽度800像素，保持宽高比
-                    height, width = annotated_frame.shape[:2]
-                    new_width = 800
-                    new_height = int(height * (new_width / width))
-                    resized_frame = cv2.resize(annotated_frame, (new_width, new_height))
-                    cv2.imwrite(save_path, resized_frame)
-                    yolo_logger.info(f"保存检测结果图片: {save_path}")
+                    if frame_dedup is not None and frame_dedup.is_duplicate(frame, save_path):
+                        yolo_logger.debug(f"跳过近重复图片: {save_path}")
+                    else:
+                        # 调整图片大小为宽度800像素，保持宽高比
+                        resized_frame = frame_pool.resize_for_save(annotated_frame)
+                        cv2.imwrite(save_path, resized_frame)
+                        yolo_logger.info(f"保存检测结果图片: {save_path}")
 
                     end_time = time.time()  # 记录处理结束的时间
                     processing_time = end_time - start_time  # 计算处理时间
                     yolo_logger.info(f"处理 {rtsp_yolo_config.rtsp_url} 的一帧图像用时: {processing_time:.4f} 秒")
+                    if cascade is not None and frame_count % 100 == 0:
+                        yolo_logger.info(f"{rtsp_yolo_config.camera_id} 级联统计: {cascade.stats}")
 
                     last_process_time = current_time
 
@@ -106,6 +201,10 @@ def process_rtsp_stream(rtsp_yolo_config):
 
         cap.release()
         cv2.destroyAllWindows()
+        if trace_recorder is not None:
+            trace_recorder.close()
+        if quality_gate is not None:
+            yolo_logger.info(f"{rtsp_yolo_config.camera_id} 帧质量统计: {quality_gate.stats}")
     except Exception as e:
         yolo_logger.error(f"处理 {rtsp_yolo_config.rtsp_url} 时出现错误: {e}")
 
@@ -114,14 +213,35 @@ def process_rtsp_stream(rtsp_yolo_config):
 
 if __name__=='__main__':
     yolo_logger.info("启动RTSP视频流处理")
+
+    # 按需性能分析：kill -USR1/-USR2 <pid> 或 http://127.0.0.1:8765/profile?camera=1&duration=10，运行统计见 /metrics
+    # 同机运行多个进程时用环境变量 PROFILE_PORT 指定不同端口，设为0不启动HTTP接口
+    profile_manager = ProfileManager(os.path.join(parent_dir, 'video', 'profiles'))
+    profile_manager.install_signal_handler()
+    profile_port = int(os.environ.get('PROFILE_PORT', 8765))
+    if profile_port:
+        profile_manager.start_http_server(profile_port)
+
+    # 所有摄像头共享一个本地事件存储
+    event_store = EventStore(os.path.join(parent_dir, 'video', 'events.db'))
     
     # 创建两个RTSP配置
     rtsp_config1 = RtspYoloConfig('admin', '123456','192.168.1.64', '554',
-                                '1',r'E:\project\multi_rtsp_yolo_mq\yolo_rtsp\yolo11n.pt','1')
+                                '1',r'E:\project\multi_rtsp_yolo_mq\yolo_rtsp\yolo11n.pt','1', event_store)
     
     rtsp_config2 = RtspYoloConfig('admin', '123456','192.168.1.65', '554',  # 第二个摄像头使用不同的IP
-                                '2',r'E:\project\multi_rtsp_yolo_mq\yolo_rtsp\yolo11n.pt','2')
+                                '2',r'E:\project\multi_rtsp_yolo_mq\yolo_rtsp\yolo11n.pt','2', event_store)
     
+    # 每路摄像头一个线程同时调用模型，按摄像头数划分推理线程，避免各库线程池超额订阅
+    resources = configure_shared_process(2)
+    yolo_logger.info(f"线程分配: {resources}")
+
+    # 两路摄像头共享一个模型管理器（每个线程一个副本），model_path 的新权重通过黄金帧验证后不停机替换
+    model_manager = ModelManager(rtsp_config1.model_path, replicas=2, device=0,
+                                 golden_dir=os.path.join(parent_dir, 'video', 'golden')).start()
+    rtsp_config1.model_manager = model_manager
+    rtsp_config2.model_manager = model_manager
+
     # 创建两个线程处理不同的RTSP流
     thread1 = threading.Thread(target=process_rtsp_stream, args=(rtsp_config1,))
     thread2 = threading.Thread(target=process_rtsp_stream, args=(rtsp_config2,))
@@ -133,4 +253,9 @@ if __name__=='__main__':
     # 等待线程结束
     thread1.join()
     thread2.join()
+    model_manager.stop()
+    yolo_logger.info(f"模型版本: {model_manager.summary()}")
+    if hasattr(rtsp_config1.transport, 'log_summary'):
+        rtsp_config1.transport.log_summary()  # 启用分级发布时各通道的排队延迟
+    event_store.close()
     
\ No newline at end of file
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from yolo_rtsp.DetectionResult import DetectionResult
+from yolo_rtsp.DetectionTrace import DetectionTrace, replay
+
+'''事件逻辑回放基准
+    python replay_benchmark.py --trace cam1.npz --expected cam1.events.json           回放录制数据并校验事件序列
+    python replay_benchmark.py --trace cam1.npz --expected cam1.events.json --update  用当前逻辑的输出更新期望事件
+    python replay_benchmark.py                                                        使用内置合成场景
+'''
+
+NAMES = {0: 'cabin_cover_on', 1: 'cabin_cover_off', 2: 'air_crew', 3: 'red_on', 4: 'red_off', 5: 'aviator'}
+
+# 合成场景的期望事件 [帧号, 字段, 值]
+SCENARIO_EVENTS = [
+    [10, 'plane_sliding_status', 1],   # 飞机入库
+    [30, 'cabin_cover_state', 1],      # 座舱开启
+    [41, 'pilot_boarding_status', 2],  # 飞行员下机
+    [50, 'cabin_cover_state', 2],      # 座舱关闭
+    [60, 'plane_sliding_status', 2],   # 飞机出库
+]
+
+
+def synthetic_scenario(repeat=1, start_time=1700000000.0):
+    """合成一段机库场景（每秒一帧）：空库 -> 飞机入库 -> 开舱 -> 飞行员在座舱 -> 下机 -> 关舱 -> 出库"""
+    frames = []
+    cabin = [200, 150, 400, 300]
+    for cycle in range(repeat):
+        for step in range(70):
+            xyxy, cls = [], []
+            if 10 <= step < 60:
+                xyxy.append([100, 100, 700, 500])
+                cls.append(3)  # red_on
+                xyxy.append(cabin)
+                cls.append(0 if 30 <= step < 50 else 1)
+                if 35 <= step < 41:
+                    xyxy.append([250, 180, 320, 280])  # 飞行员在座舱内
+                    cls.append(5)
+                elif 41 <= step < 46:
+                    xyxy.append([500, 350, 560, 480])  # 飞行员在座舱外
+                    cls.append(5)
+            conf = np.full(len(cls), 0.9)
+            timestamp = start_time + cycle * 70 + step
+            frames.append((timestamp, [DetectionResult.from_arrays(np.array(xyxy, dtype=np.float32).reshape(-1, 4),
+                                                                   cls, conf, NAMES)]))
+    return frames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='不依赖模型回放检测结果，校验事件序列并测量事件逻辑吞吐')
+    parser.add_argument('--trace', help='TraceRecorder 录制路径（读取全部分段）或单个 .npz 文件，不指定时使用合成场景')
+    parser.add_argument('--expected', help='期望事件序列 JSON 文件')
+    parser.add_argument('--update', action='store_true', help='把本次回放的事件写入 --expected')
+    parser.add_argument('--repeat', type=int, default=200, help='吞吐测试时合成场景/录制数据重复次数')
+    args = parser.parse_args()
+
+    if args.trace:
+        frames = DetectionTrace.load(args.trace).results()
+        expected = None
+        if args.expected and os.path.exists(args.expected) and not args.update:
+            with open(args.expected, 'r', encoding='utf-8') as file:
+                expected = json.load(file)
+    else:
+        frames = synthetic_scenario()
+        expected = SCENARIO_EVENTS
+
+    events, _ = replay(frames)
+    if args.update:
+        if not args.expected:
+            parser.error('--update requires --expected')
+        with open(args.expected, 'w', encoding='utf-8') as file:
+            json.dump(events, file, ensure_ascii=False, indent=1)
+        print(f"Wrote {len(events)} expected events to {args.expected}")
+    elif expected is not None:
+        if events != expected:
+            print("Event sequence mismatch")
+            print(f"  expected: {expected}")
+            print(f"  actual:   {events}")
+            sys.exit(1)
+        print(f"Event sequence OK ({len(events)} events over {len(frames)} frames)")
+
+    # 吞吐：重复回放，只计事件逻辑
+    benchmark_frames = frames * args.repeat if args.trace else synthetic_scenario(args.repeat)
+    _, frames_per_second = replay(benchmark_frames)
+    print(f"Detector logic: {frames_per_second:,.0f} frames/s ({len(benchmark_frames)} frames)")
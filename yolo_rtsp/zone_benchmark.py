@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# 获取当前文件所在目录的父目录路径
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from yolo_rtsp.ZoneMap import ZoneMap
+
+'''区域判断基准：逐框逐区域多边形测试 vs 栅格化掩码查表
+    同时统计两者结果不一致的比例（只会出现在区域边界附近一两个格子内）
+    python zone_benchmark.py --zones zones.example.json --boxes 10000
+'''
+
+
+def polygon_lookup(zone_map, xyxy):
+    """对照实现：每个框的锚点对每个区域做一次 pointPolygonTest"""
+    contours = [np.asarray(zone['polygon'], dtype=np.float32) for zone in zone_map.zones]
+    bits = np.zeros(len(xyxy), dtype=np.uint32)
+    for index, (x1, y1, x2, y2) in enumerate(xyxy):
+        point = (float((x1 + x2) / 2), float(y2))
+        for bit, contour in enumerate(contours):
+            if cv2.pointPolygonTest(contour, point, False) >= 0:
+                bits[index] |= np.uint32(1 << bit)
+    return bits
+
+
+def edge_distance(zone_map, xyxy):
+    """锚点到最近区域边界的距离"""
+    contours = [np.asarray(zone['polygon'], dtype=np.float32) for zone in zone_map.zones]
+    return np.array([min(abs(cv2.pointPolygonTest(contour, (float((x1 + x2) / 2), float(y2)), True))
+                         for contour in contours) for x1, y1, x2, y2 in xyxy])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='比较多边形测试与掩码查表的区域判断耗时和一致性')
+    parser.add_argument('--zones', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zones.example.json'))
+    parser.add_argument('--boxes', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    zone_map = ZoneMap.load(args.zones)
+    compile_ms = (time.perf_counter() - start) * 1000
+    width, height = zone_map.frame_size
+    rng = np.random.default_rng(args.seed)
+    corner = rng.uniform(0, 1, (args.boxes, 2)) * (width, height)
+    size = rng.uniform(20, 200, (args.boxes, 2))
+    xyxy = np.hstack([corner, corner + size]).astype(np.float32)
+
+    start = time.perf_counter()
+    expected = polygon_lookup(zone_map, xyxy)
+    polygon_s = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = zone_map.lookup(xyxy)
+    mask_s = time.perf_counter() - start
+
+    differ = np.flatnonzero(expected != actual)
+    max_edge = edge_distance(zone_map, xyxy[differ]).max() if len(differ) else 0.0
+    print(f"{len(zone_map.zones)} zones, mask {zone_map.mask.shape[1]}x{zone_map.mask.shape[0]} "
+          f"({zone_map.mask.nbytes / 1024:.0f} KiB, compiled in {compile_ms:.1f} ms)")
+    print(f"polygon tests: {polygon_s * 1e6 / args.boxes:8.2f} us/box | mask lookup: {mask_s * 1e6 / args.boxes:8.3f} us/box"
+          f" | {polygon_s / mask_s:,.0f}x")
+    print(f"disagreements: {len(differ)}/{args.boxes} ({len(differ) / args.boxes:.2%}), "
+          f"all within {max_edge:.1f} px of a zone edge (cell {zone_map.cell} px)")